@@ -1,14 +1,55 @@
 # app_single_file.py - Application Flask/JSON Thème Sombre MODERNE
 
+import argparse
+import asyncio
+import bisect
+import csv
+import gc
+import gzip
+import hashlib
+import heapq
 import json
+import math
+import mmap
+import multiprocessing
 import os
-from datetime import datetime, timedelta
+import random
+import re
+import secrets
+import shutil
+import signal
+import socket
+import socketserver
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import unicodedata
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from functools import wraps
+from io import BytesIO
+from urllib.parse import quote, unquote, urlsplit
 
 # Imports Flask et outils de sécurité
-from flask import Flask, render_template, request, redirect, url_for, session, flash, get_flashed_messages 
+from flask import Flask, request, redirect, url_for, session, flash, get_flashed_messages, make_response, abort, g, has_app_context, has_request_context, Response
+from flask import render_template as flask_render_template
+from werkzeug.exceptions import InternalServerError
+from werkzeug.http import HTTP_STATUS_CODES
 from werkzeug.security import generate_password_hash, check_password_hash
 from jinja2 import Environment, DictLoader 
 
+try:
+    import fcntl
+except ImportError:  # Windows : pas de mode MULTIPROCESS
+    fcntl = None
+
 # #################################################################
 # 0. CONFIGURATION ET UTILITAIRES
 # #################################################################
@@ -17,12 +58,358 @@ from jinja2 import Environment, DictLoader
 DATA_FILE = r'heracraft/data.json'
 DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
+# MODE DE STOCKAGE : 'json' (réécriture complète à chaque modification),
+# 'journal' (chaque modification est ajoutée à JOURNAL_FILE, le fichier complet
+# n'est réécrit que toutes les JOURNAL_COMPACT_EVERY entrées), 'sqlite'
+# (mise à jour ligne par ligne dans SQLITE_FILE) ou 'shards' (un fichier par
+# collection dans SHARD_DIR, seuls les fichiers modifiés sont réécrits)
+STORAGE_MODE = 'json'
+STORAGE_MODES = ('json', 'journal', 'sqlite', 'shards')
+JOURNAL_FILE = DATA_FILE + '.wal'
+JOURNAL_COMPACT_EVERY = 1000
+# Base utilisée avec STORAGE_MODE = 'sqlite' (voir la commande `import-json`)
+SQLITE_FILE = r'heracraft/data.sqlite3'
+# Dossier utilisé avec STORAGE_MODE = 'shards' (créé depuis DATA_FILE au premier
+# lancement). Une collection listée dans SHARD_BUCKETS est répartie en N fichiers
+# selon id % N : modifier un solde ne réécrit alors qu'une fraction des utilisateurs.
+SHARD_DIR = r'heracraft/data'
+SHARD_BUCKETS = {'users': 1}
+# MULTIPROCESS : plusieurs processus servent les mêmes données (commande
+# `serve-workers`, ou gunicorn -w N). Les écritures sont alors sérialisées par un
+# verrou fcntl et chaque processus ne relit les données que si un autre les a modifiées.
+MULTIPROCESS = False
+# VALIDATION GROUPÉE : une écriture n'est confirmée qu'une fois sur disque (fsync).
+# Les modifications arrivées pendant GROUP_COMMIT_WINDOW secondes (ou pendant
+# l'écriture du lot précédent) sont persistées ensemble, avec un seul fsync.
+GROUP_COMMIT_WINDOW = 0.002
+# SAUVEGARDES (commandes `backup` et `restore`) : une restauration enregistre un
+# point de reprise tous les BACKUP_BATCH_SIZE enregistrements
+BACKUP_BATCH_SIZE = 1000
+
+COLLECTIONS = ('users', 'articles', 'shop_items', 'deliveries')
+# Compteur du dernier id attribué dans chaque collection
+ID_COUNTERS = {'users': 'last_user_id', 'articles': 'last_article_id', 'shop_items': 'last_shop_item_id',
+               'deliveries': 'last_delivery_id'}
+ARTICLES_PER_PAGE = 10
+# Délai maximal (secondes) entre deux vérifications des fins de suspension, même
+# sans suspension proche (utile si un autre processus modifie les données)
+SUSPENSION_CHECK_INTERVAL = 60
+
+# LIVRAISON DES ACHATS EN JEU : chaque achat ajoute une livraison à la file d'attente
+# (collection `deliveries`), envoyée au serveur de jeu par DELIVERY_WORKERS threads.
+# DELIVERY_TRANSPORT : ex. 'rcon://motdepasse@127.0.0.1:25575' ; None = les
+# livraisons restent en attente. DELIVERY_COMMAND est la commande envoyée (un article
+# de boutique peut définir sa propre `commande`) ; {delivery_id} permet au serveur de
+# jeu d'ignorer un doublon, un envoi interrompu étant toujours retenté.
+DELIVERY_TRANSPORT = None
+DELIVERY_COMMAND = 'heracraft deliver {pseudo} {item_id} {delivery_id}'
+DELIVERY_WORKERS = 2
+DELIVERY_BATCH_SIZE = 20
+DELIVERY_TIMEOUT = 5
+# Nouvel essai après DELIVERY_RETRY_BASE secondes, délai doublé à chaque échec
+DELIVERY_RETRY_BASE = 5
+DELIVERY_RETRY_MAX = 600
+DELIVERY_MAX_ATTEMPTS = 8
+# Attente maximale (en secondes) d'un thread de livraison sans rien à envoyer ; il est
+# réveillé plus tôt par un achat ou par la prochaine tentative prévue
+DELIVERY_POLL_INTERVAL = 60
+DELIVERY_STATUSES = ('En attente', 'Livrée', 'Échec')
+
+# MODE ASYNCHRONE (commande `serve-async`, ou `asgi_app` pour uvicorn/hypercorn) :
+# les connexions sont gérées par une boucle asyncio et le traitement des requêtes
+# (lecture/écriture des données, hachage, rendu) par ASYNC_WORKERS threads.
+ASYNC_WORKERS = 32
+ASYNC_HEADER_TIMEOUT = 30
+ASYNC_MAX_BODY = 16 * 1024 * 1024
+
+# HACHAGE DES MOTS DE PASSE : méthode/coût passés à werkzeug (ex. 'scrypt:32768:8:1'
+# ou 'pbkdf2:sha256:600000'). Les anciens hachages sont mis à niveau à la connexion.
+PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+PASSWORD_POOL_WORKERS = os.cpu_count() or 2
+PASSWORD_POOL_MAX_PENDING = 64
+PASSWORD_POOL_TIMEOUT = 5
+
+def parse_date(value):
+    """Convertit une date au format DATE_FORMAT en datetime (None si absente ou invalide)."""
+    if isinstance(value, datetime):
+        return value
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, DATE_FORMAT)
+    except ValueError:
+        return None
+
+# --- Mesures de performance ---
+
+# Bornes (en secondes) des histogrammes de latence exposés sur /admin/metrics
+METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Les requêtes plus longues sont journalisées avec le détail par phase
+SLOW_REQUEST_THRESHOLD = 0.5
+# Jeton optionnel (en-tête "Authorization: Bearer ...") pour qu'un Prometheus lise /admin/metrics sans session
+METRICS_TOKEN = None
+
+METRICS_HELP = {
+    'heracraft_request_duration_seconds': ('histogram', "Durée de traitement des requêtes par route."),
+    'heracraft_phase_duration_seconds': ('histogram', "Durée des phases : lecture/écriture des données, rendu, hachage."),
+    'heracraft_requests_total': ('counter', "Nombre de requêtes par route et code HTTP."),
+    'heracraft_slow_requests_total': ('counter', "Nombre de requêtes au-delà de SLOW_REQUEST_THRESHOLD."),
+    'heracraft_delivery_latency_seconds': ('histogram', "Délai entre l'achat et la livraison en jeu."),
+    'heracraft_delivery_batch_seconds': ('histogram', "Durée d'envoi d'un lot de livraisons au serveur de jeu."),
+    'heracraft_delivery_attempts_total': ('counter', "Tentatives de livraison par résultat."),
+}
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels) + '}'
+
+class Metrics:
+    """Histogrammes et compteurs en mémoire, rendus au format texte de Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, name, labels, seconds):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * len(METRICS_BUCKETS), 'sum': 0.0, 'count': 0}
+            position = bisect.bisect_left(METRICS_BUCKETS, seconds)
+            if position < len(METRICS_BUCKETS):
+                histogram['buckets'][position] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    def increment(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, phase):
+        """Mesure une phase (load, save, render, password) et l'ajoute au détail de la requête en cours."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe('heracraft_phase_duration_seconds', {'phase': phase}, elapsed)
+            if has_app_context() and g.get('phases') is not None:
+                g.phases[phase] += elapsed
+
+    def render(self, gauges=()):
+        """Texte au format d'exposition Prometheus ; `gauges` = [(nom, aide, labels, valeur)]."""
+        with self._lock:
+            histograms = {key: (list(h['buckets']), h['sum'], h['count']) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+        lines = []
+        declared = set()
+
+        def declare(name, kind, help_text):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+            declare(name, *METRICS_HELP[name])
+            cumulative = 0
+            for bound, bucket in zip(METRICS_BUCKETS, buckets):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for (name, labels), value in sorted(counters.items()):
+            declare(name, *METRICS_HELP[name])
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for name, help_text, labels, value in gauges:
+            declare(name, 'gauge', help_text)
+            lines.append(f"{name}{_format_labels(tuple(labels.items()))} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+
+# --- Enregistrements typés ---
+
+def current_time():
+    """Heure courante à la seconde près (la précision de DATE_FORMAT)."""
+    return datetime.now().replace(microsecond=0)
+
+class TextEnum(str, Enum):
+    """Énumération dont chaque membre se compare, se hache et s'affiche comme son texte."""
+    __str__ = str.__str__
+    __format__ = str.__format__
+    __hash__ = str.__hash__
+
+class Grade(TextEnum):
+    MEMBRE = 'Membre'
+    ADMINISTRATEUR = 'Administrateur'
+
+class UserStatus(TextEnum):
+    ACTIF = 'Actif'
+    SUSPENDU = 'Suspendu'
+    BANNI = 'Banni'
+
+class DeliveryStatus(TextEnum):
+    EN_ATTENTE = 'En attente'
+    LIVREE = 'Livrée'
+    ECHEC = 'Échec'
+
+class Record:
+    """Enregistrement à champs fixes (__slots__), bien plus compact en mémoire qu'un dict.
+
+    Les dates (DATES) sont converties en datetime et les champs énumérés (ENUMS) en
+    TextEnum une seule fois, à la création ; to_dict() redonne la forme stockée.
+    Une valeur illisible est gardée telle quelle, et les champs inconnus (ajoutés à la
+    main dans le fichier) sont conservés dans `extra`.
+
+    `stored` garde des valeurs de référence des champs, d'où changes() déduit ce qui a
+    été modifié : celles de l'original pour une copie faite par edit_record, et en mode
+    MULTIPROCESS celles lues ou écrites en dernier par DataStore.
+    """
+
+    __slots__ = ('extra', 'stored')
+    FIELDS = ()
+    DATES = ()
+    ENUMS = {}
+    # Champs omis de la forme stockée quand ils sont vides
+    OPTIONAL = ()
+    # Champs obligatoires et leur type, vérifiés à la restauration d'une sauvegarde
+    REQUIRED = {}
+
+    def __init__(self, **values):
+        pop = values.pop
+        for name in self.FIELDS:
+            setattr(self, name, pop(name, None))
+        for name in self.DATES:
+            value = getattr(self, name)
+            if value is not None:
+                setattr(self, name, parse_date(value) or value)
+        for name, enum in self.ENUMS.items():
+            member = enum._value2member_map_.get(getattr(self, name))
+            if member is not None:
+                setattr(self, name, member)
+        self.extra = values or None
+        self.stored = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={self.id!r})"
+
+    @classmethod
+    def validate(cls, values):
+        """Renvoie ce qui empêche `values` (forme stockée) d'être un enregistrement valide, ou None."""
+        if not isinstance(values, dict):
+            return "un objet JSON est attendu"
+        for name, kind in cls.REQUIRED.items():
+            value = values.get(name)
+            if not isinstance(value, kind) or isinstance(value, bool):
+                return f"champ '{name}' absent ou invalide"
+        if values['id'] <= 0:
+            return "id invalide"
+        for name in cls.DATES:
+            if values.get(name) is not None and parse_date(values[name]) is None:
+                return f"date '{name}' invalide"
+        for name, enum in cls.ENUMS.items():
+            if values.get(name) not in enum._value2member_map_:
+                return f"valeur de '{name}' inconnue"
+        return None
+
+    def to_dict(self):
+        values = {name: getattr(self, name) for name in self.FIELDS}
+        for name in self.DATES:
+            if isinstance(values[name], datetime):
+                values[name] = values[name].strftime(DATE_FORMAT)
+        for name in self.ENUMS:
+            if isinstance(values[name], Enum):
+                values[name] = values[name].value
+        for name in self.OPTIONAL:
+            if values[name] is None:
+                del values[name]
+        if self.extra:
+            values.update(self.extra)
+        return values
+
+    def assign(self, other):
+        """Recopie tous les champs de `other` (du même type) dans cet enregistrement."""
+        for name in self.FIELDS:
+            setattr(self, name, getattr(other, name))
+        self.extra = dict(other.extra) if other.extra else None
+
+    def copy(self):
+        record = type(self).__new__(type(self))
+        record.assign(self)
+        record.stored = self.stored
+        return record
+
+    def values(self):
+        return tuple(getattr(self, name) for name in self.FIELDS)
+
+    def changes(self):
+        """Champs modifiés depuis `stored` : {nom: valeur}, ou None s'il n'est pas suivi."""
+        if self.stored is None:
+            return None
+        return {name: value for name, value, old in zip(self.FIELDS, self.values(), self.stored) if value != old}
+
+class User(Record):
+    __slots__ = FIELDS = ('id', 'pseudo', 'email', 'password_hash', 'grade', 'status', 'suspension_reason',
+                          'suspension_end_date', 'gemmes', 'session_version')
+    DATES = ('suspension_end_date',)
+    ENUMS = {'grade': Grade, 'status': UserStatus}
+    # Incrémenté quand le grade ou le statut change : les sessions ouvertes avant sont fermées
+    OPTIONAL = ('session_version',)
+    REQUIRED = {'id': int, 'pseudo': str, 'email': str, 'gemmes': int}
+
+class Article(Record):
+    __slots__ = FIELDS = ('id', 'titre', 'contenu', 'auteur_id', 'date_publication')
+    DATES = ('date_publication',)
+    REQUIRED = {'id': int, 'titre': str, 'contenu': str, 'auteur_id': int}
+
+class ShopItem(Record):
+    __slots__ = FIELDS = ('id', 'nom', 'description', 'prix_gemmes', 'date_ajout', 'commande')
+    DATES = ('date_ajout',)
+    OPTIONAL = ('commande',)
+    REQUIRED = {'id': int, 'nom': str, 'prix_gemmes': int}
+
+class Delivery(Record):
+    __slots__ = FIELDS = ('id', 'user_id', 'shop_item_id', 'commande', 'status', 'tentatives', 'date_creation',
+                          'prochaine_tentative', 'date_livraison', 'derniere_erreur')
+    DATES = ('date_creation', 'prochaine_tentative', 'date_livraison')
+    ENUMS = {'status': DeliveryStatus}
+    REQUIRED = {'id': int, 'user_id': int, 'shop_item_id': int, 'commande': str, 'tentatives': int}
+
+RECORD_TYPES = {'users': User, 'articles': Article, 'shop_items': ShopItem, 'deliveries': Delivery}
+
+def decode_records(data):
+    """Remplace (sur place) les dictionnaires lus sur le support par des enregistrements typés."""
+    for collection, record_type in RECORD_TYPES.items():
+        data[collection] = [record if isinstance(record, Record) else record_type(**record)
+                            for record in data.get(collection, [])]
+    return data
+
+def _json_default(value):
+    """Sérialisation JSON des enregistrements et des dates (json.dump(..., default=_json_default))."""
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, datetime):
+        return value.strftime(DATE_FORMAT)
+    raise TypeError(f"{type(value).__name__} n'est pas sérialisable en JSON")
+
 def create_initial_data():
     """Crée la structure de données initiale avec un SuperAdmin par défaut."""
-    admin_hash = generate_password_hash("password123") 
+    admin_hash = generate_password_hash("password123", PASSWORD_HASH_METHOD) 
     now_str = datetime.now().strftime(DATE_FORMAT)
     return {
-        "last_user_id": 1, "last_article_id": 1, "last_shop_item_id": 1,
+        "schema_version": SCHEMA_VERSION,
+        "last_user_id": 1, "last_article_id": 1, "last_shop_item_id": 1, "last_delivery_id": 0,
         "users": [{ 
             "id": 1, 
             "pseudo": "SuperAdmin", 
@@ -47,11 +434,94 @@ def create_initial_data():
             "description": "Une clé pour ouvrir une caisse de récompenses standard en jeu.",
             "prix_gemmes": 50,
             "date_ajout": now_str
-        }]
+        }],
+        "deliveries": []
     }
 
-def load_data():
-    """Charge les données depuis le fichier JSON ou le crée/met à jour si nécessaire. (Fonction inchangée)"""
+# --- Migrations du schéma ---
+# Les données portent leur version (`schema_version`, 0 si absente). Au chargement,
+# les migrations de version supérieure sont appliquées une seule fois, dans l'ordre,
+# après une sauvegarde, puis les données migrées sont réécrites : les chargements
+# suivants ne corrigent plus rien. Une nouvelle migration s'ajoute en fin de MIGRATIONS.
+
+def _upgrade_legacy_user(user):
+    if 'status' not in user:
+        user['status'] = 'Actif'
+        user['suspension_reason'] = None
+        user['suspension_end_date'] = None
+    if 'gemmes' not in user:
+        user['gemmes'] = 0
+    return user
+
+def _migrate_users_status(data):
+    for user in data.get('users', []):
+        _upgrade_legacy_user(user)
+
+def _migrate_shop_items(data):
+    data.setdefault('shop_items', [])
+    data.setdefault('last_shop_item_id', len(data['shop_items']))
+
+def _migrate_deliveries(data):
+    data.setdefault('deliveries', [])
+    data.setdefault('last_delivery_id', 0)
+
+# (version atteinte, description, fonction modifiant les données sur place)
+MIGRATIONS = [
+    (1, "statut, suspension et gemmes des utilisateurs", _migrate_users_status),
+    (2, "boutique (shop_items)", _migrate_shop_items),
+    (3, "livraisons en jeu (deliveries)", _migrate_deliveries),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+# Sauvegarde (commande `restore` pour revenir en arrière) prise avant chaque migration
+MIGRATION_BACKUP_DIR = r'heracraft/sauvegardes'
+
+def apply_migrations(data):
+    """Applique à `data` les migrations qui lui manquent ; renvoie leurs descriptions."""
+    version = data.get('schema_version', 0)
+    applied = []
+    for target, description, migrate in MIGRATIONS:
+        if target > version:
+            migrate(data)
+            applied.append(f"{target} : {description}")
+    data['schema_version'] = SCHEMA_VERSION
+    return applied
+
+def migrate_data(data, storage):
+    """Sauvegarde les données de `storage` puis migre `data` (lu depuis ce support) ; False si déjà à jour.
+
+    L'appelant réécrit ensuite les données migrées.
+    """
+    version = data.get('schema_version', 0)
+    if version == SCHEMA_VERSION:
+        return False
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Données en version {version}, plus récente que ce code (version {SCHEMA_VERSION}).")
+    destination = os.path.join(MIGRATION_BACKUP_DIR, f"avant-schema-{SCHEMA_VERSION}-{datetime.now():%Y%m%d-%H%M%S}")
+    print(f"Migration des données de la version {version} à {SCHEMA_VERSION} (sauvegarde dans {destination}).")
+    backup_data(destination, compress=True, storage=storage)
+    for description in apply_migrations(data):
+        print(f"✅ Migration {description}")
+    return True
+
+def _fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _write_json_file(path, value):
+    """Écrit `value` dans un fichier temporaire, sur disque (fsync), puis le renomme : le fichier est complet ou absent."""
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(value, f, indent=2, ensure_ascii=False, default=_json_default)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+    # Le renommage lui-même doit survivre à une coupure
+    _fsync_path(os.path.dirname(path) or '.')
+
+def _read_data_file():
+    """Lit le fichier JSON depuis le disque ou le crée/met à jour si nécessaire."""
     dir_name = os.path.dirname(DATA_FILE)
     if dir_name and not os.path.exists(dir_name):
         try:
@@ -60,50 +530,2027 @@ def load_data():
             print(f"ERREUR : Impossible de créer le répertoire {dir_name}. Détail: {e}")
             return create_initial_data() 
 
-    if not os.path.exists(DATA_FILE) or os.path.getsize(DATA_FILE) == 0:
-        data = create_initial_data()
-        save_data(data)
-        return data
-    try:
-        with open(DATA_FILE, 'r') as f:
-            data = json.load(f)
-            # MAJ de la structure pour les anciens utilisateurs
-            for user in data.get('users', []):
-                if 'status' not in user:
-                    user['status'] = 'Actif'
-                    user['suspension_reason'] = None
-                    user['suspension_end_date'] = None
-                if 'gemmes' not in user:
-                    user['gemmes'] = 0
-            if 'shop_items' not in data:
-                 data['shop_items'] = []
-            if 'last_shop_item_id' not in data:
-                 data['last_shop_item_id'] = len(data['shop_items']) 
-            return data
-    except json.JSONDecodeError:
-        print(f"ATTENTION : Le fichier {DATA_FILE} est corrompu. Recréation de la structure initiale.")
-        data = create_initial_data()
-        save_data(data)
-        return data
-    except Exception as e:
-        print(f"ERREUR INCONNUE lors du chargement de {DATA_FILE}: {e}")
-        return create_initial_data()
+    if not os.path.exists(DATA_FILE) or os.path.getsize(DATA_FILE) == 0:
+        data = create_initial_data()
+        _write_data_file(data)
+        return data
+    try:
+        with open(DATA_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        # Surtout ne pas repartir des données initiales : la prochaine écriture effacerait tout
+        print(f"ERREUR FATALE : Le fichier {DATA_FILE} est illisible ({e}). Il n'a pas été modifié ; "
+              f"corrigez-le ou restaurez une sauvegarde (commande `restore`).")
+        raise RuntimeError(f"{DATA_FILE} illisible") from e
+
+def _write_data_file(data):
+    """Écrit les données dans le fichier JSON (fichier temporaire, fsync, renommage).
+
+    Une erreur d'écriture (disque plein...) est propagée : le fichier garde son
+    contenu précédent et l'appelant ne doit pas confirmer la modification.
+    """
+    _write_json_file(DATA_FILE, data)
+
+
+class JsonStreamReader:
+    """Lit un fichier au format data.json par morceaux, sans le charger en entier.
+
+    entries() renvoie les données sous forme d'entrées du journal : {'op': 'set', 'k', 'v'}
+    pour chaque valeur simple de premier niveau et {'op': 'put', 'c', 'r'} pour chaque
+    élément d'une liste. Seul l'élément en cours de lecture est gardé en mémoire.
+    """
+
+    def __init__(self, f, chunk_size=1 << 16):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def _peek(self):
+        """Prochain caractère significatif ('' en fin de fichier), sans le consommer."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                return ''
+            self._fill()
+
+    def _take(self, expected):
+        char = self._peek()
+        if not char or char not in expected:
+            raise json.JSONDecodeError(f"{' ou '.join(expected)} attendu", self.buffer, self.pos)
+        self.pos += 1
+        return char
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # Un nombre coupé en fin de tampon continue dans le morceau suivant
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in '0123456789.eE+-'):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def entries(self):
+        self._take('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._value()
+            self._take(':')
+            if self._peek() == '[':
+                self.pos += 1
+                if self._peek() == ']':
+                    self.pos += 1
+                else:
+                    while True:
+                        yield {'op': 'put', 'c': key, 'r': self._value()}
+                        if self._take(',]') == ']':
+                            break
+            else:
+                yield {'op': 'set', 'k': key, 'v': self._value()}
+            if self._take(',}') == '}':
+                return
+
+
+# --- Backends de stockage ---
+# Chaque backend expose : signature() (change quand les données ont été modifiées
+# sur le support), read_all() -> dict complet, write_all(data) et apply(data, entries)
+# qui persiste une liste de modifications déjà appliquées en mémoire. Les entrées
+# sont de la forme {'op': 'set', 'k', 'v'}, {'op': 'put', 'c', 'r'} ou {'op': 'del', 'c', 'id'}.
+# read_changes() renvoie les entrées écrites par un autre processus depuis la
+# dernière lecture, ou None s'il faut tout relire. stream() parcourt toutes les
+# données sous forme d'entrées 'set' et 'put', une collection après l'autre et sans
+# les charger en mémoire (sauvegardes).
+
+class JsonStorage:
+    """Stockage dans DATA_FILE, avec journal d'ajouts optionnel (JOURNAL_FILE).
+
+    En mode journal, chaque modification est ajoutée en fin de JOURNAL_FILE sous
+    forme d'une ligne JSON ; au chargement, le journal est rejoué sur le fichier
+    complet. Les entrées sont idempotentes (remplacement par id, suppression par id,
+    affectation de compteur), donc rejouer un journal déjà intégré est sans effet.
+    """
+
+    def __init__(self, journal=False):
+        self.journal = journal
+        self._journal_entries = 0
+        # Position de JOURNAL_FILE déjà intégrée, et état de DATA_FILE correspondant
+        self._journal_offset = 0
+        self._data_stat = None
+
+    def signature(self):
+        signature = []
+        for path in (DATA_FILE, JOURNAL_FILE):
+            try:
+                st = os.stat(path)
+            except OSError:
+                signature.append(None)
+                continue
+            signature.append((st.st_mtime_ns, st.st_size, st.st_ino))
+        return tuple(signature)
+
+    def read_all(self):
+        data = _read_data_file()
+        self._journal_entries = self._replay_journal(data)
+        self._remember_position()
+        return data
+
+    def write_all(self, data):
+        _write_data_file(data)
+        if os.path.exists(JOURNAL_FILE):
+            open(JOURNAL_FILE, 'w').close()
+        self._journal_entries = 0
+        self._remember_position()
+
+    def _remember_position(self):
+        self._data_stat = self.signature()[0]
+        try:
+            self._journal_offset = os.path.getsize(JOURNAL_FILE)
+        except OSError:
+            self._journal_offset = 0
+
+    def read_changes(self):
+        # Seul le journal permet une relecture partielle, et seulement s'il n'a pas été compacté depuis
+        if not self.journal or self.signature()[0] != self._data_stat:
+            return None
+        try:
+            with open(JOURNAL_FILE, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() < self._journal_offset:
+                    return None
+                f.seek(self._journal_offset)
+                chunk = f.read()
+        except OSError:
+            return None
+        # Une dernière ligne sans fin de ligne est en cours d'écriture : elle sera lue la fois suivante
+        complete = chunk[:chunk.rfind(b'\n') + 1]
+        entries = [json.loads(line) for line in complete.decode('utf-8').splitlines() if line.strip()]
+        self._journal_offset += len(complete)
+        self._journal_entries += len(entries)
+        return entries
+
+    def apply(self, data, entries):
+        if not self.journal or self._journal_entries + len(entries) >= JOURNAL_COMPACT_EVERY:
+            self.write_all(data)
+            return
+        try:
+            with open(JOURNAL_FILE, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(entry, ensure_ascii=False, separators=(',', ':'), default=_json_default) + '\n'
+                                for entry in entries))
+                f.flush()
+                os.fsync(f.fileno())
+                self._journal_offset = os.fstat(f.fileno()).st_size
+        except OSError:
+            # Des lignes ont pu être écrites sans être sur disque : elles ne doivent pas être relues
+            try:
+                os.truncate(JOURNAL_FILE, self._journal_offset)
+            except OSError:
+                pass
+            raise
+        self._journal_entries += len(entries)
+
+    def stream(self):
+        if not os.path.exists(DATA_FILE) or os.path.getsize(DATA_FILE) == 0:
+            _read_data_file()
+        while True:
+            # Le journal (au plus JOURNAL_COMPACT_EVERY entrées) est superposé au fichier complet
+            data_stat = self.signature()[0]
+            sets, puts, deleted = {}, defaultdict(dict), defaultdict(set)
+            for entry in self._journal():
+                if entry['op'] == 'set':
+                    sets[entry['k']] = entry['v']
+                elif entry['op'] == 'put':
+                    puts[entry['c']][entry['r']['id']] = entry['r']
+                elif entry['op'] == 'del':
+                    puts[entry['c']].pop(entry['id'], None)
+                    deleted[entry['c']].add(entry['id'])
+            f = open(DATA_FILE, 'r', encoding='utf-8')
+            st = os.fstat(f.fileno())
+            if (st.st_mtime_ns, st.st_size, st.st_ino) == data_stat:
+                break
+            # Compacté entre la lecture du journal et l'ouverture : on recommence
+            f.close()
+        current = None
+        with f:
+            for entry in JsonStreamReader(f).entries():
+                if current is not None and entry.get('c') != current:
+                    # Fin de la liste : les enregistrements ajoutés depuis sont dans le journal
+                    yield from ({'op': 'put', 'c': current, 'r': r} for r in puts.pop(current, {}).values())
+                    current = None
+                if entry['op'] == 'set':
+                    if entry['k'] not in sets:
+                        yield entry
+                    continue
+                current, record = entry['c'], entry['r']
+                if record['id'] in deleted[current]:
+                    continue
+                yield {'op': 'put', 'c': current, 'r': puts[current].pop(record['id'], record)}
+        if current is not None:
+            yield from ({'op': 'put', 'c': current, 'r': r} for r in puts.pop(current, {}).values())
+        for collection, records in puts.items():
+            yield from ({'op': 'put', 'c': collection, 'r': r} for r in records.values())
+        yield from ({'op': 'set', 'k': key, 'v': value} for key, value in sets.items())
+
+    def _journal(self):
+        if not os.path.exists(JOURNAL_FILE):
+            return
+        with open(JOURNAL_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Dernière ligne tronquée par un arrêt brutal : on l'ignore
+                    print(f"ATTENTION : Entrée illisible ignorée dans {JOURNAL_FILE}.")
+
+    def _replay_journal(self, data):
+        if not os.path.exists(JOURNAL_FILE):
+            return 0
+        records = {collection: {r['id']: r for r in data.setdefault(collection, [])} for collection in COLLECTIONS}
+        count = 0
+        for entry in self._journal():
+            op = entry['op']
+            if op == 'set':
+                data[entry['k']] = entry['v']
+            elif op == 'put':
+                record = entry['r']
+                existing = records[entry['c']].get(record['id'])
+                if existing is None:
+                    data[entry['c']].append(record)
+                    records[entry['c']][record['id']] = record
+                else:
+                    existing.clear()
+                    existing.update(record)
+            elif op == 'del':
+                existing = records[entry['c']].pop(entry['id'], None)
+                if existing is not None:
+                    data[entry['c']].remove(existing)
+            count += 1
+        return count
+
+
+SQLITE_COLUMNS = {
+    'users': ('id', 'pseudo', 'email', 'password_hash', 'grade', 'status', 'suspension_reason', 'suspension_end_date', 'gemmes'),
+    'articles': ('id', 'titre', 'contenu', 'auteur_id', 'date_publication'),
+    'shop_items': ('id', 'nom', 'description', 'prix_gemmes', 'date_ajout'),
+    'deliveries': ('id', 'user_id', 'shop_item_id', 'commande', 'status', 'tentatives', 'date_creation',
+                   'prochaine_tentative', 'date_livraison', 'derniere_erreur'),
+}
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY, pseudo TEXT NOT NULL, email TEXT NOT NULL, password_hash TEXT,
+    grade TEXT, status TEXT, suspension_reason TEXT, suspension_end_date TEXT,
+    gemmes INTEGER NOT NULL DEFAULT 0, extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_users_pseudo ON users (pseudo COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users (email COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY, titre TEXT, contenu TEXT, auteur_id INTEGER, date_publication TEXT, extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_articles_auteur ON articles (auteur_id);
+CREATE TABLE IF NOT EXISTS shop_items (
+    id INTEGER PRIMARY KEY, nom TEXT, description TEXT, prix_gemmes INTEGER, date_ajout TEXT, extra TEXT
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    id INTEGER PRIMARY KEY, user_id INTEGER, shop_item_id INTEGER, commande TEXT, status TEXT,
+    tentatives INTEGER NOT NULL DEFAULT 0, date_creation TEXT, prochaine_tentative TEXT,
+    date_livraison TEXT, derniere_erreur TEXT, extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_deliveries_status ON deliveries (status);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+class SQLiteStorage:
+    """Stockage dans une base SQLite (mode WAL) avec mise à jour ligne par ligne.
+
+    Les champs connus de chaque collection ont leur colonne ; les éventuels champs
+    supplémentaires sont conservés en JSON dans la colonne `extra`. Les compteurs
+    (`last_*_id`) et autres clés de premier niveau sont stockés dans `meta`, avec un
+    compteur `generation` incrémenté à chaque écriture pour détecter les
+    modifications faites par un autre processus.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or SQLITE_FILE
+        self._conn = None
+        self._pid = None
+
+    def _connect(self):
+        if self._conn is None or self._pid != os.getpid():
+            # Une connexion SQLite ne doit pas être réutilisée dans un processus fils
+            self._pid = os.getpid()
+            dir_name = os.path.dirname(self.path)
+            if dir_name and not os.path.exists(dir_name):
+                os.makedirs(dir_name)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # FULL : chaque transaction validée est sur disque (NORMAL peut perdre les dernières)
+            conn.execute('PRAGMA synchronous=FULL')
+            conn.executescript(SQLITE_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def signature(self):
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return row[0] if row else None
+
+    def read_all(self):
+        conn = self._connect()
+        meta = conn.execute("SELECT key, value FROM meta WHERE key != 'generation'").fetchall()
+        if not meta:
+            data = create_initial_data()
+            self.write_all(data)
+            return data
+        data = {key: json.loads(value) for key, value in meta}
+        for collection, columns in SQLITE_COLUMNS.items():
+            rows = conn.execute(f"SELECT {', '.join(columns)}, extra FROM {collection} ORDER BY id")
+            data[collection] = [self._from_row(columns, row) for row in rows]
+        return data
+
+    def read_changes(self):
+        return None
+
+    def stream(self):
+        if self.signature() is None:
+            self.write_all(create_initial_data())
+        # Connexion dédiée et une seule transaction de lecture : instantané cohérent même si le serveur écrit
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        try:
+            conn.execute("BEGIN")
+            for key, value in conn.execute("SELECT key, value FROM meta WHERE key != 'generation'"):
+                yield {'op': 'set', 'k': key, 'v': json.loads(value)}
+            for collection, columns in SQLITE_COLUMNS.items():
+                for row in conn.execute(f"SELECT {', '.join(columns)}, extra FROM {collection} ORDER BY id"):
+                    yield {'op': 'put', 'c': collection, 'r': self._from_row(columns, row)}
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def write_all(self, data):
+        def write(conn):
+            for collection, columns in SQLITE_COLUMNS.items():
+                conn.execute(f"DELETE FROM {collection}")
+                conn.executemany(self._upsert_sql(collection), (self._to_row(columns, r) for r in data.get(collection, [])))
+            conn.execute("DELETE FROM meta WHERE key != 'generation'")
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                             ((key, json.dumps(value)) for key, value in data.items() if key not in SQLITE_COLUMNS))
+        self._transaction(write)
+
+    def apply(self, data, entries):
+        def write(conn):
+            for entry in entries:
+                if entry['op'] == 'set':
+                    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (entry['k'], json.dumps(entry['v'])))
+                elif entry['op'] == 'put':
+                    conn.execute(self._upsert_sql(entry['c']), self._to_row(SQLITE_COLUMNS[entry['c']], entry['r']))
+                elif entry['op'] == 'del':
+                    conn.execute(f"DELETE FROM {entry['c']} WHERE id = ?", (entry['id'],))
+        self._transaction(write)
+
+    def _transaction(self, write):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            write(conn)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('generation', 1) "
+                         "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _upsert_sql(collection):
+        columns = SQLITE_COLUMNS[collection] + ('extra',)
+        return f"INSERT OR REPLACE INTO {collection} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+    @staticmethod
+    def _to_row(columns, record):
+        if isinstance(record, Record):
+            record = record.to_dict()
+        extra = {key: value for key, value in record.items() if key not in columns}
+        return tuple(record.get(column) for column in columns) + (json.dumps(extra) if extra else None,)
+
+    @staticmethod
+    def _from_row(columns, row):
+        record = dict(zip(columns, row))
+        if row[-1]:
+            record.update(json.loads(row[-1]))
+        return record
+
+
+class ShardedStorage:
+    """Stockage en plusieurs fichiers JSON dans SHARD_DIR : counters.json et une ou plusieurs parts par collection.
+
+    Une modification ne réécrit que les fichiers qu'elle touche : un achat réécrit la
+    part de `users` du joueur, `deliveries` et les compteurs, jamais les articles ni
+    la boutique. Après une modification par un autre processus, seuls les fichiers
+    changés sont relus (read_changes). Chaque fichier est écrit sous un nom
+    temporaire puis renommé ; quand une écriture touche plusieurs fichiers, la liste
+    des renommages est d'abord notée dans COMMIT, et une écriture interrompue est
+    terminée au chargement suivant.
+
+    La signature ne regarde que le dossier et counters.json : un fichier modifié à la main doit être
+    remplacé (écrit à côté puis renommé), ou le dossier touché (`touch`), pour être relu.
+    """
+
+    COUNTERS = 'counters'
+
+    def __init__(self, directory=None):
+        self.directory = directory or SHARD_DIR
+        # Par fichier : état (os.stat) et ids des enregistrements lors de la dernière lecture/écriture
+        self._stats = {}
+        self._ids = {}
+
+    @staticmethod
+    def shard_names(collection):
+        buckets = SHARD_BUCKETS.get(collection, 1)
+        return [collection] if buckets == 1 else [f"{collection}-{bucket}" for bucket in range(buckets)]
+
+    @staticmethod
+    def shard_of(collection, record_id):
+        buckets = SHARD_BUCKETS.get(collection, 1)
+        return collection if buckets == 1 else f"{collection}-{record_id % buckets}"
+
+    def _names(self):
+        return [self.COUNTERS] + [name for collection in COLLECTIONS for name in self.shard_names(collection)]
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + '.json')
+
+    def _present(self):
+        if not os.path.isdir(self.directory):
+            return set()
+        return {entry[:-5] for entry in os.listdir(self.directory) if entry.endswith('.json')}
+
+    def _stat(self, name):
+        try:
+            st = os.stat(self._path(name))
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def signature(self):
+        # Chaque écriture renomme un fichier dans le dossier, ce qui change sa date de modification
+        try:
+            st = os.stat(self.directory)
+        except OSError:
+            return None
+        return ((st.st_mtime_ns, st.st_ino), self._stat(self.COUNTERS))
+
+    def _read(self, name):
+        with open(self._path(name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def read_all(self):
+        self._recover()
+        if not os.path.exists(self._path(self.COUNTERS)):
+            return self._create()
+        present = self._present()
+        if present != set(self._names()):
+            # SHARD_BUCKETS a changé : on relit tous les fichiers présents et on les répartit à nouveau
+            print(f"Répartition des fichiers de {self.directory} modifiée : réécriture complète.")
+            data = self._read(self.COUNTERS)
+            for collection in COLLECTIONS:
+                records = {}
+                for name in present:
+                    if name.split('-')[0] == collection:
+                        records.update((record['id'], record) for record in self._read(name))
+                data[collection] = sorted(records.values(), key=lambda record: record['id'])
+            self.write_all(data)
+            return data
+        data = {}
+        for name in self._names():
+            stat = self._stat(name)
+            content = self._read(name)
+            self._stats[name] = stat
+            if name == self.COUNTERS:
+                data.update(content)
+                continue
+            collection = name.split('-')[0]
+            data.setdefault(collection, []).extend(content)
+            self._ids[name] = {record['id'] for record in content}
+        for collection in COLLECTIONS:
+            if len(self.shard_names(collection)) > 1:
+                data[collection].sort(key=lambda record: record['id'])
+        return data
+
+    def _create(self):
+        """Premier lancement : reprend DATA_FILE (et son journal) s'il existe, sinon les données initiales."""
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(DATA_FILE):
+            print(f"Conversion de {DATA_FILE} en fichiers séparés dans {self.directory}.")
+            source = JsonStorage(journal=True)
+            data = source.read_all()
+            migrate_data(data, source)
+        else:
+            data = create_initial_data()
+        self.write_all(data)
+        return data
+
+    def read_changes(self):
+        if os.path.exists(os.path.join(self.directory, 'COMMIT')) or self._present() != set(self._names()):
+            return None
+        entries = []
+        for name in self._names():
+            stat = self._stat(name)
+            if stat == self._stats.get(name):
+                continue
+            content = self._read(name)
+            self._stats[name] = stat
+            if name == self.COUNTERS:
+                entries += [{'op': 'set', 'k': key, 'v': value} for key, value in content.items()]
+                continue
+            collection = name.split('-')[0]
+            ids = {record['id'] for record in content}
+            entries += [{'op': 'del', 'c': collection, 'id': record_id} for record_id in self._ids.get(name, set()) - ids]
+            entries += [{'op': 'put', 'c': collection, 'r': record} for record in content]
+            self._ids[name] = ids
+        return entries
+
+    def write_all(self, data):
+        decode_records(data)
+        self._write(data, self._names(), removals=self._present() - set(self._names()))
+
+    def apply(self, data, entries):
+        names = []
+        for entry in entries:
+            if entry['op'] == 'set':
+                name = self.COUNTERS
+            else:
+                name = self.shard_of(entry['c'], entry['r'].id if entry['op'] == 'put' else entry['id'])
+            if name not in names:
+                names.append(name)
+        self._write(data, names)
+
+    def _write(self, data, names, removals=()):
+        os.makedirs(self.directory, exist_ok=True)
+        renames = []
+        for name in names:
+            if name == self.COUNTERS:
+                content = {key: value for key, value in data.items() if key not in COLLECTIONS}
+            else:
+                collection = name.split('-')[0]
+                content = data[collection]
+                if len(self.shard_names(collection)) > 1:
+                    content = [record for record in content if self.shard_of(collection, record.id) == name]
+                self._ids[name] = {record.id for record in content}
+            path = self._path(name)
+            # En cas d'erreur, les fichiers en place ne sont pas touchés (les .tmp seront réécrits)
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(json.dumps(content, ensure_ascii=False, separators=(',', ':'), default=_json_default))
+                f.flush()
+                os.fsync(f.fileno())
+            renames.append((path + '.tmp', path))
+        self._commit(renames, [self._path(name) for name in removals])
+        for name in names:
+            self._stats[name] = self._stat(name)
+
+    def _commit(self, renames, removals=()):
+        """Renomme les fichiers écrits (et supprime `removals`) ; à plusieurs fichiers, via COMMIT."""
+        if len(renames) + len(removals) > 1:
+            commit_path = os.path.join(self.directory, 'COMMIT')
+            _write_json_file(commit_path, {'renames': renames, 'removals': list(removals)})
+            self._recover()
+        elif renames:
+            os.replace(*renames[0])
+        elif removals:
+            os.remove(removals[0])
+        _fsync_path(self.directory)
+
+    def _recover(self):
+        """Termine une écriture en plusieurs fichiers interrompue (ou venant d'être notée dans COMMIT)."""
+        commit_path = os.path.join(self.directory, 'COMMIT')
+        if not os.path.exists(commit_path):
+            return
+        with open(commit_path, 'r', encoding='utf-8') as f:
+            commit = json.load(f)
+        for source, destination in commit['renames']:
+            if os.path.exists(source):
+                os.replace(source, destination)
+        for path in commit['removals']:
+            if os.path.exists(path):
+                os.remove(path)
+        _fsync_path(self.directory)
+        os.remove(commit_path)
+
+    def stream(self):
+        self._recover()
+        if not os.path.exists(self._path(self.COUNTERS)) or self._present() != set(self._names()):
+            # Premier lancement ou SHARD_BUCKETS modifié : fichiers créés ou répartis à nouveau
+            self.read_all()
+        while True:
+            # Tous les fichiers sont ouverts d'un coup : un renommage ultérieur ne change plus ce qui est lu
+            stats = [self._stat(name) for name in self._names()]
+            if os.path.exists(os.path.join(self.directory, 'COMMIT')):
+                time.sleep(0.01)
+                continue
+            files = [open(self._path(name), 'r', encoding='utf-8') for name in self._names()]
+            if all((st.st_mtime_ns, st.st_size, st.st_ino) == expected
+                   for st, expected in zip((os.fstat(f.fileno()) for f in files), stats)):
+                break
+            for f in files:
+                f.close()
+        for name, f in zip(self._names(), files):
+            with f:
+                content = json.load(f)
+            if name == self.COUNTERS:
+                yield from ({'op': 'set', 'k': key, 'v': value} for key, value in content.items())
+            else:
+                yield from ({'op': 'put', 'c': name.split('-')[0], 'r': record} for record in content)
+
+
+# --- Recherche ---
+
+SEARCH_RESULTS_LIMIT = 50
+TOKEN_RE = re.compile(r'\w+')
+
+def fold_text(text):
+    """Minuscules sans accents ni ligatures, pour comparer « Événement » et « evenement »."""
+    text = text.lower().replace('œ', 'oe').replace('æ', 'ae')
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+def tokenize(text):
+    return set(TOKEN_RE.findall(fold_text(text)))
+
+
+class SearchIndex:
+    """Index de recherche en mémoire, mis à jour en même temps que les index du DataStore.
+
+    - utilisateurs : liste triée de (pseudo ou email replié, id), parcourue par
+      bisect pour une recherche par préfixe ;
+    - articles : index inversé mot -> ids (titre et contenu, accents repliés), plus
+      un vocabulaire trié pour compléter le dernier mot tapé comme un préfixe.
+    """
+
+    def __init__(self):
+        self.user_keys = []
+        self.article_postings = {}
+        self.vocabulary = []
+        self._user_entries = {}
+        self._article_tokens = {}
+
+    def add(self, collection, record, bulk=False):
+        """Indexe un enregistrement ; avec bulk=True, le tri est différé à finish_bulk()."""
+        insert = list.append if bulk else bisect.insort
+        if collection == 'users':
+            keys = {fold_text(record.pseudo), fold_text(record.email)}
+            self._user_entries[record.id] = keys
+            for key in keys:
+                insert(self.user_keys, (key, record.id))
+        elif collection == 'articles':
+            tokens = tokenize(f"{record.titre} {record.contenu}")
+            self._article_tokens[record.id] = tokens
+            for token in tokens:
+                article_ids = self.article_postings.get(token)
+                if article_ids is None:
+                    article_ids = self.article_postings[token] = set()
+                    insert(self.vocabulary, token)
+                article_ids.add(record.id)
+
+    def finish_bulk(self):
+        self.user_keys.sort()
+        self.vocabulary.sort()
+
+    def remove(self, collection, record_id):
+        if collection == 'users':
+            for key in self._user_entries.pop(record_id, ()):
+                _remove_sorted(self.user_keys, (key, record_id))
+        elif collection == 'articles':
+            for token in self._article_tokens.pop(record_id, ()):
+                article_ids = self.article_postings[token]
+                article_ids.discard(record_id)
+                if not article_ids:
+                    del self.article_postings[token]
+                    _remove_sorted(self.vocabulary, token)
+
+    def find_users(self, query, limit=SEARCH_RESULTS_LIMIT):
+        """Ids des utilisateurs dont le pseudo ou l'email commence par `query`."""
+        prefix = fold_text(query.strip())
+        user_ids = []
+        if not prefix:
+            return user_ids
+        position = bisect.bisect_left(self.user_keys, (prefix,))
+        while position < len(self.user_keys) and len(user_ids) < limit:
+            key, user_id = self.user_keys[position]
+            if not key.startswith(prefix):
+                break
+            if user_id not in user_ids:
+                user_ids.append(user_id)
+            position += 1
+        return user_ids
+
+    def find_articles(self, query):
+        """Ids des articles contenant tous les mots de `query` (le dernier pouvant être incomplet)."""
+        tokens = TOKEN_RE.findall(fold_text(query))
+        result = set()
+        for i, token in enumerate(tokens):
+            if i == len(tokens) - 1:
+                matches = set()
+                position = bisect.bisect_left(self.vocabulary, token)
+                while position < len(self.vocabulary) and self.vocabulary[position].startswith(token):
+                    matches |= self.article_postings[self.vocabulary[position]]
+                    position += 1
+            else:
+                matches = self.article_postings.get(token, set())
+            result = set(matches) if i == 0 else result & matches
+            if not result:
+                break
+        return result
+
+
+# --- Listes d'utilisateurs (admin) ---
+
+ADMIN_USERS_PER_PAGE = 50
+USER_SORT_KEYS = ('id', 'pseudo', 'gemmes', 'status')
+USER_STATUSES = ('Actif', 'Suspendu', 'Banni')
+USER_GRADES = ('Membre', 'Administrateur')
+
+
+class UserViews:
+    """Vues triées des utilisateurs pour les listes admin paginées.
+
+    Chaque clé de tri a sa liste triée de (clé, id), tenue à jour par bisect à
+    chaque modification : une page se lit par tranche, sans trier la table. Les
+    filtres (statut, grade) s'appuient sur des ensembles d'ids ; un filtre
+    sélectif trie seulement les ids retenus, sinon la vue est parcourue dans l'ordre.
+    """
+
+    def __init__(self):
+        self.sorted = {sort: [] for sort in USER_SORT_KEYS}
+        self.by_status = {}
+        self.by_grade = {}
+        self._entries = {}
+
+    @staticmethod
+    def _entry_of(record):
+        sort_keys = {
+            'id': (record.id,),
+            'pseudo': (record.pseudo.lower(), record.id),
+            'gemmes': (record.gemmes, record.id),
+            'status': (record.status, record.id),
+        }
+        return sort_keys, record.status, record.grade
+
+    def add(self, record, bulk=False):
+        """Ajoute un utilisateur ; avec bulk=True, le tri est différé à finish_bulk()."""
+        insert = list.append if bulk else bisect.insort
+        entry = self._entries[record.id] = self._entry_of(record)
+        sort_keys, status, grade = entry
+        for sort, key in sort_keys.items():
+            insert(self.sorted[sort], key)
+        self.by_status.setdefault(status, set()).add(record.id)
+        self.by_grade.setdefault(grade, set()).add(record.id)
+
+    def finish_bulk(self):
+        for view in self.sorted.values():
+            view.sort()
+
+    def remove(self, record_id):
+        sort_keys, status, grade = self._entries.pop(record_id)
+        for sort, key in sort_keys.items():
+            _remove_sorted(self.sorted[sort], key)
+        for index, value in ((self.by_status, status), (self.by_grade, grade)):
+            index[value].discard(record_id)
+            if not index[value]:
+                del index[value]
+
+    def refresh(self, record):
+        """Replace l'utilisateur dans les vues si un champ trié ou filtré a changé."""
+        if self._entries.get(record.id) != self._entry_of(record):
+            self.remove(record.id)
+            self.add(record)
+
+    def page(self, sort, descending, status, grade, offset, limit):
+        """Renvoie les ids de la page demandée et le nombre total d'utilisateurs retenus."""
+        view = self.sorted[sort]
+        candidates = None
+        for index, value in ((self.by_status, status), (self.by_grade, grade)):
+            if value:
+                ids = index.get(value, set())
+                candidates = ids if candidates is None else candidates & ids
+        if candidates is None:
+            total = len(view)
+            if descending:
+                end = max(total - offset, 0)
+                keys = view[max(end - limit, 0):end][::-1]
+            else:
+                keys = view[offset:offset + limit]
+            return [key[-1] for key in keys], total
+        if len(candidates) * 8 < len(view):
+            keys = sorted((self._entries[user_id][0][sort] for user_id in candidates), reverse=descending)
+            return [key[-1] for key in keys[offset:offset + limit]], len(candidates)
+        user_ids = []
+        matched = 0
+        for key in (reversed(view) if descending else view):
+            if key[-1] in candidates:
+                matched += 1
+                if matched > offset:
+                    user_ids.append(key[-1])
+                    if len(user_ids) == limit:
+                        break
+        return user_ids, len(candidates)
+
+
+class DueQueue:
+    """Tas de (échéance, id) : fins de suspension, prochaines tentatives de livraison...
+
+    `due` garde l'échéance courante de chaque id ; quand elle
+    change, la nouvelle entrée est ajoutée au tas et l'ancienne, devenue périmée, est
+    ignorée au moment où elle remonte. `changed` est signalé quand une échéance plus
+    proche que toutes les autres est planifiée, pour réveiller le thread qui attend.
+    """
+
+    def __init__(self):
+        self.changed = threading.Event()
+        self.reset()
+
+    def reset(self):
+        self.heap = []
+        self.due = {}
+
+    def __len__(self):
+        return len(self.due)
+
+    def schedule(self, record_id, when, bulk=False):
+        """Planifie `record_id` à la date `when` (None ou date invalide : déplanifie)."""
+        when = parse_date(when)
+        if self.due.get(record_id) == when:
+            return
+        if when is None:
+            self.due.pop(record_id, None)
+            return
+        self.due[record_id] = when
+        if bulk:
+            self.heap.append((when, record_id))
+            return
+        heapq.heappush(self.heap, (when, record_id))
+        if self.heap[0] == (when, record_id):
+            self.changed.set()
+        if len(self.heap) > 2 * len(self.due) + 64:
+            self.heap = [(when, record_id) for record_id, when in self.due.items()]
+            heapq.heapify(self.heap)
+
+    def discard(self, record_id):
+        self.due.pop(record_id, None)
+
+    def finish_bulk(self):
+        heapq.heapify(self.heap)
+        self.changed.set()
+
+    def _is_current(self, entry):
+        return self.due.get(entry[1]) == entry[0]
+
+    def next_due(self):
+        """Prochaine échéance (None si la file est vide)."""
+        while self.heap and not self._is_current(self.heap[0]):
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now, limit=None):
+        """Retire et renvoie les ids arrivés à échéance (au plus `limit`), du plus ancien au plus récent."""
+        record_ids = []
+        while self.heap and self.heap[0][0] <= now and (limit is None or len(record_ids) < limit):
+            entry = heapq.heappop(self.heap)
+            if self._is_current(entry):
+                del self.due[entry[1]]
+                record_ids.append(entry[1])
+        return record_ids
+
+
+def _remove_sorted(values, value):
+    position = bisect.bisect_left(values, value)
+    if position < len(values) and values[position] == value:
+        del values[position]
+
+
+class ProcessCoordinator:
+    """Coordination des processus qui partagent les mêmes données (MULTIPROCESS).
+
+    Un fichier annexe de 8 octets, projeté en mémoire (mmap), contient un numéro de
+    version incrémenté à chaque écriture, et un verrou fcntl.flock sur ce même
+    fichier sérialise les écritures (exclusif) et les relectures (partagé). Comparer
+    ce numéro à celui de la copie en mémoire ne coûte qu'un accès mémoire par requête.
+    Le fichier est rouvert après un fork : un verrou flock hérité serait partagé.
+    """
+
+    def __init__(self, path):
+        if fcntl is None:
+            raise RuntimeError("Le mode MULTIPROCESS nécessite fcntl (Linux, macOS).")
+        self.path = path
+        self._pid = None
+        self._fd = None
+        self._map = None
+        self._depth = 0
+
+    def _open(self):
+        if self._pid == os.getpid():
+            return
+        dir_name = os.path.dirname(self.path)
+        if dir_name and not os.path.exists(dir_name):
+            os.makedirs(dir_name, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(fd).st_size < 8:
+            os.ftruncate(fd, 8)
+        self._fd, self._map, self._pid, self._depth = fd, mmap.mmap(fd, 8), os.getpid(), 0
+
+    def version(self):
+        self._open()
+        return struct.unpack_from('<Q', self._map)[0]
+
+    @contextmanager
+    def locked(self, exclusive=True):
+        """Verrou entre processus, réentrant (un appel imbriqué ne fait rien)."""
+        self._open()
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def bump(self):
+        """Incrémente la version (à appeler sous le verrou exclusif) et la renvoie."""
+        version = self.version() + 1
+        struct.pack_into('<Q', self._map, 0, version)
+        return version
+
+
+def _create_storage():
+    """Instancie le backend correspondant à STORAGE_MODE."""
+    if STORAGE_MODE == 'sqlite':
+        return SQLiteStorage()
+    if STORAGE_MODE == 'shards':
+        return ShardedStorage()
+    return JsonStorage(journal=STORAGE_MODE == 'journal')
+
+
+class DataStore:
+    """Garde les données en mémoire et ne les relit que si elles ont changé sur le support.
+
+    La persistance est déléguée à un backend (JsonStorage ou SQLiteStorage) dont la
+    signature est comparée à chaque accès : une modification manuelle par un admin
+    est donc prise en compte, sans tout relire à chaque requête. En mode
+    MULTIPROCESS, c'est le numéro de version partagé (ProcessCoordinator) qui est
+    comparé, et les écritures se font sous le verrou commun aux processus.
+
+    Les backends lisent et écrivent des dictionnaires ; en mémoire, chaque
+    enregistrement est un objet typé (User, Article, ShopItem, Delivery).
+
+    Des index (dictionnaires) sont tenus à jour à chaque modification : utilisateurs
+    par id, pseudo et email (en minuscules), enregistrements par id pour chaque
+    collection, et ids d'articles par auteur. Les articles sont aussi gardés triés
+    par date de publication (date analysée une seule fois, à l'écriture).
+
+    Validation groupée : une modification est appliquée en mémoire tout de suite,
+    puis la méthode appelante attend que son lot soit persisté (fsync compris) avant
+    de rendre la main. Le premier thread qui attend écrit, après GROUP_COMMIT_WINDOW,
+    toutes les modifications en attente en une seule écriture ; les suivantes
+    forment le lot d'après. En mode MULTIPROCESS, chaque modification est persistée
+    sous le verrou commun, avant qu'un autre processus puisse relire les données.
+    Si l'écriture échoue, chaque thread du lot reçoit l'erreur et les données en
+    mémoire sont abandonnées, pour être relues du support au prochain accès.
+
+    `generations` compte les modifications par collection (plus 'profiles' pour le
+    pseudo/grade des auteurs d'articles, affichés publiquement) : le cache de pages s'en
+    sert pour savoir si une page rendue est encore valide.
+
+    Quand une modification faite par ce processus change le grade ou le statut d'un
+    utilisateur, son `session_version` est incrémenté dans la même écriture : les
+    sessions ouvertes avec l'ancienne version sont refusées (voir SessionStore).
+    """
+
+    def __init__(self):
+        self.data = None
+        self.version = 0
+        self.storage = None
+        self.coordinator = None
+        self._signature = None
+        self._seen_version = None
+        self._lock = threading.RLock()
+        self.by_id = {}
+        self.users_by_pseudo = {}
+        self.users_by_email = {}
+        self.articles_by_author = {}
+        self.articles_by_date = []
+        self.search = SearchIndex()
+        self.user_views = UserViews()
+        self.suspensions = DueQueue()
+        self.pending_deliveries = DueQueue()
+        self.deliveries_by_status = {}
+        # Livraisons en cours d'envoi par un thread de ce processus
+        self._delivery_claims = set()
+        self._index_keys = {}
+        # (grade, statut) de chaque utilisateur tel qu'indexé : un changement invalide ses sessions
+        self._access = {}
+        self.generations = dict.fromkeys(COLLECTIONS + ('profiles',), 0)
+        # Validation groupée : modifications pas encore persistées, numéro du lot en
+        # cours (`_batch`) et du dernier lot sur disque, et attente d'un thread écrivain
+        self._pending = []
+        self._batch = 1
+        self._durable_batch = 0
+        self._flushing = False
+        # Erreurs des derniers lots dont l'écriture a échoué, par numéro de lot
+        self._flush_errors = {}
+        self._durable = threading.Condition(self._lock)
+        self._local = threading.local()
+
+    def _storage(self):
+        if self.storage is None:
+            self.storage = _create_storage()
+        return self.storage
+
+    def _coordinator(self):
+        if not MULTIPROCESS:
+            return None
+        if self.coordinator is None:
+            path = {'sqlite': SQLITE_FILE, 'shards': SHARD_DIR}.get(STORAGE_MODE, DATA_FILE)
+            self.coordinator = ProcessCoordinator(path + '.version')
+        return self.coordinator
+
+    def load(self):
+        """Renvoie les données en mémoire, relues si le support a changé.
+
+        Pendant une requête, le support n'est contrôlé qu'au premier appel : les
+        suivants renvoient les mêmes données, modifications de la requête comprises.
+        Les écritures, elles, revérifient toujours (_writing).
+        """
+        request_scoped = has_request_context()
+        if request_scoped and g.get('loaded_store') is self and self.data is not None:
+            return self.data
+        data = self._refresh()
+        if request_scoped:
+            g.loaded_store = self
+        return data
+
+    def _refresh(self):
+        with self._lock:
+            storage = self._storage()
+            coordinator = self._coordinator()
+            if coordinator is not None:
+                stale = coordinator.version() != self._seen_version
+            else:
+                stale = storage.signature() != self._signature
+            if self.data is None or stale:
+                # Les modifications en attente sont persistées avant de relire le support
+                self._flush_for_reader()
+                with ExitStack() as stack:
+                    if coordinator is not None:
+                        # Verrou partagé : pas de relecture pendant qu'un autre processus écrit
+                        stack.enter_context(coordinator.locked(exclusive=False))
+                        self._seen_version = coordinator.version()
+                    with METRICS.timer('load'):
+                        changes = storage.read_changes() if self.data is not None else None
+                        if changes is None:
+                            data = storage.read_all()
+                            if migrate_data(data, storage):
+                                storage.write_all(data)
+                            self.data = decode_records(data)
+                    self._signature = storage.signature()
+                if changes is None:
+                    self._build_indexes(self.data)
+                else:
+                    # Seules les modifications des autres processus sont rejouées, index compris
+                    for entry in changes:
+                        self._apply(self.data, entry)
+                self.version += 1
+            return self.data
+
+    @contextmanager
+    def _writing(self):
+        """Verrou des modifications, lecture-modification-écriture comprise.
+
+        En mode MULTIPROCESS, il est aussi pris entre processus, et les données sont
+        relues d'abord si un autre processus les a modifiées. En sortie du bloc le plus
+        extérieur, le verrou relâché, attend que les modifications faites soient sur disque.
+        """
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        try:
+            with self._lock:
+                coordinator = self._coordinator()
+                if coordinator is None:
+                    yield
+                else:
+                    with coordinator.locked():
+                        self._refresh()
+                        yield
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                ticket = self._local.__dict__.pop('ticket', None)
+                if ticket is not None:
+                    self._wait_durable(ticket)
+
+    def _wait_durable(self, ticket):
+        """Attend que le lot `ticket` soit persisté, en l'écrivant soi-même si aucun thread ne s'en charge."""
+        with self._durable:
+            while self._durable_batch < ticket:
+                if self._flushing:
+                    self._durable.wait()
+                    continue
+                self._flushing = True
+                try:
+                    # Les modifications arrivant pendant cette attente rejoignent le lot
+                    self._durable.wait(GROUP_COMMIT_WINDOW)
+                    self._flush()
+                finally:
+                    self._flushing = False
+                    self._durable.notify_all()
+            error = self._flush_errors.get(ticket)
+            if error is not None:
+                raise error
+
+    def _flush(self):
+        """Persiste en une seule écriture toutes les modifications en attente (sous self._lock)."""
+        if not self._pending:
+            return
+        entries, self._pending = self._pending, []
+        batch = self._batch
+        self._batch += 1
+        storage = self._storage()
+        try:
+            with METRICS.timer('save'):
+                storage.apply(self.data, entries)
+            self._written(storage)
+        except Exception as e:
+            print(f"ERREUR FATALE : Impossible d'écrire {len(entries)} modification(s) ({STORAGE_MODE}). Détail : {e}")
+            self._flush_errors[batch] = e
+            if len(self._flush_errors) > 100:
+                del self._flush_errors[min(self._flush_errors)]
+            # Les modifications du lot ne sont pas confirmées : on repart de ce qui est sur le support
+            self.data = None
+            raise
+        finally:
+            self._durable_batch = batch
+            self._durable.notify_all()
+
+    def _flush_for_reader(self):
+        """Comme _flush, mais un échec n'est signalé qu'aux threads qui attendent le lot.
+
+        _flush a alors abandonné les données en mémoire : le lecteur les relit du support.
+        """
+        try:
+            self._flush()
+        except Exception:
+            pass
+
+    def _written(self, storage):
+        self._signature = storage.signature()
+        if self.coordinator is not None and MULTIPROCESS:
+            self._seen_version = self.coordinator.bump()
+        self.version += 1
+
+    def save(self, data):
+        """Réécrit l'intégralité des données sur le support."""
+        with self._writing():
+            self._flush()
+            storage = self._storage()
+            with METRICS.timer('save'):
+                storage.write_all(data)
+            if data is not self.data:
+                self._build_indexes(decode_records(data))
+            self.data = data
+            self._written(storage)
+
+    def invalidate(self):
+        """Force une relecture du support au prochain accès."""
+        with self._lock:
+            self._flush_for_reader()
+            self.data = None
+
+    # --- Lectures indexées ---
+
+    def get(self, collection, record_id):
+        self.load()
+        return self.by_id[collection].get(record_id)
+
+    def find_user(self, pseudo=None, email=None):
+        """Cherche un utilisateur par pseudo ou email, sans tenir compte de la casse."""
+        self.load()
+        user = self.users_by_pseudo.get(pseudo.lower()) if pseudo else None
+        if user is None and email:
+            user = self.users_by_email.get(email.lower())
+        return user
+
+    def articles_of(self, user_id):
+        self.load()
+        return [self.by_id['articles'][article_id] for article_id in sorted(self.articles_by_author.get(user_id, ()))]
+
+    def search_users(self, query, limit=SEARCH_RESULTS_LIMIT):
+        """Utilisateurs dont le pseudo ou l'email commence par `query` (ou d'id `query`)."""
+        self.load()
+        users = [self.by_id['users'][user_id] for user_id in self.search.find_users(query, limit)]
+        if query.strip().isdigit():
+            user = self.by_id['users'].get(int(query))
+            if user is not None and user not in users:
+                users.insert(0, user)
+        return users
+
+    def search_articles(self, query, limit=SEARCH_RESULTS_LIMIT):
+        """Articles contenant les mots de `query`, du plus récent au plus ancien, et leur nombre total."""
+        self.load()
+        article_ids = self.search.find_articles(query)
+        dates = self._index_keys['articles']
+        ordered = heapq.nlargest(limit, article_ids, key=lambda article_id: self._date_key(article_id, dates[article_id][1]))
+        return [self.by_id['articles'][article_id] for article_id in ordered], len(article_ids)
+
+    def users_page(self, sort='id', descending=False, status=None, grade=None, offset=0, limit=ADMIN_USERS_PER_PAGE):
+        """Renvoie une page d'utilisateurs triée et filtrée, et le nombre total d'utilisateurs retenus."""
+        self.load()
+        user_ids, total = self.user_views.page(sort, descending, status, grade, offset, limit)
+        return [self.by_id['users'][user_id] for user_id in user_ids], total
+
+    def generation_of(self, dependencies):
+        """Renvoie les compteurs de modification des collections listées."""
+        self.load()
+        return tuple(self.generations[dependency] for dependency in dependencies)
+
+    def recent_articles(self, offset, limit):
+        """Renvoie `limit` articles à partir du `offset`-ième plus récent, et le nombre total d'articles."""
+        self.load()
+        total = len(self.articles_by_date)
+        end = max(total - offset, 0)
+        keys = self.articles_by_date[max(end - limit, 0):end]
+        return [self.by_id['articles'][article_id] for _, article_id in reversed(keys)], total
+
+    # --- Modifications ciblées ---
+
+    def insert(self, collection, record, counter):
+        """Ajoute un enregistrement avec le prochain id du compteur et le renvoie."""
+        with self._writing():
+            data = self.load()
+            data[counter] += 1
+            record.id = data[counter]
+            self._commit(data, [
+                {'op': 'set', 'k': counter, 'v': data[counter]},
+                {'op': 'put', 'c': collection, 'r': record},
+            ])
+            return record
+
+    def insert_user(self, user):
+        """Ajoute un utilisateur si son pseudo et son email sont libres ; renvoie None sinon."""
+        with self._writing():
+            if self.find_user(pseudo=user.pseudo) or self.find_user(email=user.email):
+                return None
+            return self.insert('users', user, 'last_user_id')
+
+    def update(self, collection, record):
+        """Enregistre un enregistrement existant modifié sur place."""
+        self.commit_changes([{'op': 'put', 'c': collection, 'r': record}])
+
+    def delete(self, collection, record_ids):
+        """Supprime les enregistrements dont l'id figure dans record_ids."""
+        self.commit_changes([{'op': 'del', 'c': collection, 'id': record_id} for record_id in record_ids])
+
+    def commit_changes(self, entries):
+        """Enregistre en une seule écriture des entrées 'put' (modifications faites sur place) et 'del'.
+
+        En mode MULTIPROCESS, la relecture faite sous le verrou peut remplacer ou
+        écraser les enregistrements modifiés (écritures d'un autre processus) : seuls
+        les champs qu'on a changés, notés avant, sont reportés sur la version relue.
+        """
+        changes = [entry['r'].changes() if entry['op'] == 'put' else None for entry in entries]
+        with self._writing():
+            if entries:
+                data = self.load()
+                self._commit(data, [self._rebase(entry, fields) for entry, fields in zip(entries, changes)])
+
+    def _rebase(self, entry, fields):
+        current = self.by_id[entry['c']].get(entry['r'].id) if fields is not None else None
+        if current is None:
+            return entry
+        for name, value in fields.items():
+            setattr(current, name, value)
+        return {'op': 'put', 'c': entry['c'], 'r': current}
+
+    def revoke_sessions(self, user_id):
+        """Ferme toutes les sessions d'un utilisateur, dans tous les processus. Renvoie False s'il n'existe pas."""
+        with self._writing():
+            data = self.load()
+            user = self.by_id['users'].get(user_id)
+            if user is None:
+                return False
+            user.session_version = (user.session_version or 0) + 1
+            self._commit(data, [{'op': 'put', 'c': 'users', 'r': user}])
+            return True
+
+    # --- Solde de gemmes ---
+    # La lecture, la vérification et la modification du solde se font sous le verrou
+    # des modifications (_writing), qui n'est tenu que le temps de la mise à jour en
+    # mémoire : la persistance se fait après, par lots. En mode MULTIPROCESS en
+    # revanche, chaque modification est persistée sous ce verrou.
+    # Pas de verrou par joueur : _commit touche des index et un lot communs à tous,
+    # le verrou global resterait donc nécessaire, et il n'est tenu que quelques
+    # dizaines de microsecondes par opération ; le reste du temps va à l'écriture des
+    # lots, elle aussi commune à tous les joueurs.
+
+    def debit_gemmes(self, user_id, amount, clamp=False):
+        """Retire `amount` gemmes si le solde suffit (ou jusqu'à zéro avec clamp=True).
+
+        Renvoie (succès, nouveau solde).
+        """
+        with self._writing():
+            user = self.get('users', user_id)
+            if user is None:
+                return False, 0
+            if user.gemmes < amount and not clamp:
+                return False, user.gemmes
+            user.gemmes = max(0, user.gemmes - amount)
+            self.update('users', user)
+            return True, user.gemmes
+
+    def credit_gemmes(self, user_id, amount):
+        """Ajoute `amount` gemmes et renvoie le nouveau solde (None si l'utilisateur n'existe pas)."""
+        with self._writing():
+            user = self.get('users', user_id)
+            if user is None:
+                return None
+            user.gemmes += amount
+            self.update('users', user)
+            return user.gemmes
+
+    def bulk_adjust_gemmes(self, adjustments):
+        """Applique [(user_id, variation), ...] en une seule écriture (soldes bornés à zéro).
+
+        Renvoie [(ancien solde, nouveau solde)] ligne par ligne. Si un utilisateur
+        n'existe plus, sa ligne vaut None et rien n'est appliqué.
+        """
+        with self._writing():
+            data = self.load()
+            users = [self.by_id['users'].get(user_id) for user_id, _ in adjustments]
+            if None in users:
+                return [None if user is None else (user.gemmes, user.gemmes) for user in users]
+            # Tous les soldes sont calculés avant de modifier le moindre enregistrement
+            balances = {}
+            results = []
+            for user, (_, delta) in zip(users, adjustments):
+                before = balances.get(user.id, user.gemmes)
+                balances[user.id] = max(0, before + delta)
+                results.append((before, balances[user.id]))
+            touched = [self.by_id['users'][user_id] for user_id in balances]
+            for user in touched:
+                user.gemmes = balances[user.id]
+            if touched:
+                self._commit(data, [{'op': 'put', 'c': 'users', 'r': user} for user in touched])
+            return results
+
+    def next_due(self, queue):
+        """Prochaine échéance de la file `queue` (self.suspensions ou self.pending_deliveries)."""
+        with self._lock:
+            self.load()
+            return queue.next_due()
+
+    def expire_suspensions(self, now=None):
+        """Réactive en une seule écriture les comptes dont la suspension est terminée ; renvoie leurs ids."""
+        now = now or datetime.now()
+        with self._writing():
+            data = self.load()
+            expired = [self.by_id['users'][user_id] for user_id in self.suspensions.pop_due(now)]
+            for user in expired:
+                user.status = UserStatus.ACTIF
+                user.suspension_reason = None
+                user.suspension_end_date = None
+            if expired:
+                self._commit(data, [{'op': 'put', 'c': 'users', 'r': user} for user in expired])
+            return [user.id for user in expired]
+
+    # --- Livraisons en jeu ---
+
+    def purchase(self, user_id, item, command_template=DELIVERY_COMMAND):
+        """Débite le prix de `item` et met sa livraison en file d'attente, dans la même écriture.
+
+        Renvoie (succès, nouveau solde, livraison ou None).
+        """
+        with self._writing():
+            data = self.load()
+            user = self.by_id['users'].get(user_id)
+            if user is None:
+                return False, 0, None
+            if user.gemmes < item.prix_gemmes:
+                return False, user.gemmes, None
+            user.gemmes -= item.prix_gemmes
+            data['last_delivery_id'] += 1
+            now = current_time()
+            delivery = Delivery(
+                id=data['last_delivery_id'], user_id=user_id, shop_item_id=item.id,
+                commande=command_template.format(pseudo=user.pseudo, item_id=item.id, nom=item.nom,
+                                                 delivery_id=data['last_delivery_id']),
+                status=DeliveryStatus.EN_ATTENTE, tentatives=0, date_creation=now, prochaine_tentative=now
+            )
+            self._commit(data, [
+                {'op': 'set', 'k': 'last_delivery_id', 'v': data['last_delivery_id']},
+                {'op': 'put', 'c': 'users', 'r': user},
+                {'op': 'put', 'c': 'deliveries', 'r': delivery},
+            ])
+            return True, user.gemmes, delivery
+
+    def claim_deliveries(self, limit, now=None):
+        """Réserve pour un envoi jusqu'à `limit` livraisons arrivées à échéance et les renvoie."""
+        with self._lock:
+            self.load()
+            deliveries = []
+            for delivery_id in self.pending_deliveries.pop_due(now or datetime.now(), limit):
+                if delivery_id not in self._delivery_claims:
+                    self._delivery_claims.add(delivery_id)
+                    deliveries.append(self.by_id['deliveries'][delivery_id].copy())
+            return deliveries
+
+    def finish_deliveries(self, results, now=None):
+        """Enregistre en une écriture le résultat d'un lot [(id, succès, message)] et libère les livraisons.
+
+        Les échecs sont replanifiés avec un délai doublé à chaque tentative (et un peu
+        d'aléa), jusqu'à DELIVERY_MAX_ATTEMPTS ; une livraison non envoyée (succès None)
+        est remise en file sans compter de tentative. Renvoie les livraisons réussies.
+        """
+        now = now or current_time()
+        with self._writing():
+            data = self.load()
+            finished, delivered = [], []
+            for delivery_id, success, message in results:
+                self._delivery_claims.discard(delivery_id)
+                delivery = self.by_id['deliveries'].get(delivery_id)
+                if delivery is None or delivery.status != 'En attente':
+                    continue
+                if success is None:
+                    delivery.prochaine_tentative = now
+                    finished.append(delivery)
+                    continue
+                delivery.tentatives += 1
+                if success:
+                    delivery.status, delivery.date_livraison = DeliveryStatus.LIVREE, now
+                    delivery.prochaine_tentative = delivery.derniere_erreur = None
+                    delivered.append(delivery)
+                elif delivery.tentatives >= DELIVERY_MAX_ATTEMPTS:
+                    delivery.status, delivery.prochaine_tentative, delivery.derniere_erreur = DeliveryStatus.ECHEC, None, message[:200]
+                else:
+                    delay = min(DELIVERY_RETRY_BASE * 2 ** (delivery.tentatives - 1), DELIVERY_RETRY_MAX) * random.uniform(0.8, 1.2)
+                    delivery.prochaine_tentative = (now + timedelta(seconds=delay)).replace(microsecond=0)
+                    delivery.derniere_erreur = message[:200]
+                finished.append(delivery)
+            if finished:
+                self._commit(data, [{'op': 'put', 'c': 'deliveries', 'r': delivery} for delivery in finished])
+            return delivered
+
+    def retry_delivery(self, delivery_id):
+        """Remet une livraison en échec dans la file d'attente ; renvoie False si elle n'est pas en échec."""
+        with self._writing():
+            data = self.load()
+            delivery = self.by_id['deliveries'].get(delivery_id)
+            if delivery is None or delivery.status != 'Échec':
+                return False
+            delivery.status, delivery.tentatives, delivery.prochaine_tentative = DeliveryStatus.EN_ATTENTE, 0, current_time()
+            self._commit(data, [{'op': 'put', 'c': 'deliveries', 'r': delivery}])
+            return True
+
+    def recent_deliveries(self, status=None, limit=SEARCH_RESULTS_LIMIT):
+        """Les `limit` dernières livraisons (d'un statut donné), de la plus récente à la plus ancienne."""
+        self.load()
+        delivery_ids = self.deliveries_by_status.get(status, ()) if status else self.by_id['deliveries']
+        return [self.by_id['deliveries'][delivery_id] for delivery_id in heapq.nlargest(limit, delivery_ids)]
+
+    def _commit(self, data, entries):
+        """Applique `entries` en mémoire et les ajoute au lot en cours (persisté en sortie de _writing)."""
+        for entry in entries:
+            if entry['op'] == 'put' and entry['c'] == 'users':
+                self._revoke_sessions_on_access_change(entry['r'])
+            self._apply(data, entry)
+        self._pending.extend(entries)
+        self._local.ticket = self._batch
+        if self.coordinator is not None and MULTIPROCESS:
+            self._flush()
+
+    def _revoke_sessions_on_access_change(self, user):
+        # Seulement pour les modifications locales : celles relues d'un autre processus ont déjà leur version
+        access = self._access.get(user.id)
+        if access is not None and access != (user.grade, user.status):
+            user.session_version = (user.session_version or 0) + 1
+
+    def _apply(self, data, entry):
+        op = entry['op']
+        if op == 'set':
+            data[entry['k']] = entry['v']
+        elif op == 'put':
+            collection, record = entry['c'], entry['r']
+            if not isinstance(record, Record):
+                # Entrée relue dans le journal d'un autre processus
+                record = RECORD_TYPES[collection](**record)
+            self.generations[collection] += 1
+            existing = self.by_id[collection].get(record.id)
+            if existing is None:
+                data[collection].append(record)
+                self._index(collection, record)
+            else:
+                if existing is not record:
+                    # Copie obtenue avant un rechargement : on garde l'objet en place
+                    existing.assign(record)
+                self._reindex(collection, existing)
+        elif op == 'del':
+            collection = entry['c']
+            existing = self.by_id[collection].get(entry['id'])
+            if existing is not None:
+                self.generations[collection] += 1
+                data[collection].remove(existing)
+                self._unindex(collection, existing.id)
+
+    # --- Index ---
+
+    def _build_indexes(self, data):
+        self.by_id = {collection: {} for collection in COLLECTIONS}
+        self.users_by_pseudo = {}
+        self.users_by_email = {}
+        self.articles_by_author = {}
+        self.articles_by_date = []
+        self.search = SearchIndex()
+        self.user_views = UserViews()
+        self.suspensions.reset()
+        self.pending_deliveries.reset()
+        self.deliveries_by_status = {}
+        self._index_keys = {collection: {} for collection in self.by_id}
+        self._access = {}
+        for key in self.generations:
+            self.generations[key] += 1
+        for collection in self.by_id:
+            for record in data.get(collection, []):
+                self._index(collection, record, bulk=True)
+        self.articles_by_date.sort()
+        self.search.finish_bulk()
+        self.user_views.finish_bulk()
+        self.suspensions.finish_bulk()
+        self.pending_deliveries.finish_bulk()
+
+    @staticmethod
+    def _keys_of(collection, record):
+        if collection == 'users':
+            # Pseudo et grade tels qu'affichés : un changement invalide les pages publiques
+            return (record.pseudo.lower(), record.email.lower(), record.pseudo, record.grade)
+        if collection == 'articles':
+            # L'empreinte du texte suffit à savoir s'il faut réindexer l'article pour la recherche
+            return (record.auteur_id, record.date_publication, hash((record.titre, record.contenu)))
+        if collection == 'deliveries':
+            return (record.status,)
+        return ()
+
+    @staticmethod
+    def _date_key(record_id, date):
+        return (parse_date(date) or datetime.min, record_id)
+
+    def _index(self, collection, record, bulk=False):
+        self._track(record)
+        keys = self._keys_of(collection, record)
+        self.by_id[collection][record.id] = record
+        self._index_keys[collection][record.id] = keys
+        self.search.add(collection, record, bulk)
+        if collection == 'users':
+            self.users_by_pseudo.setdefault(keys[0], record)
+            self.users_by_email.setdefault(keys[1], record)
+            self.user_views.add(record, bulk)
+            self._access[record.id] = (record.grade, record.status)
+            self._touch_profile(record.id)
+        elif collection == 'articles':
+            self.articles_by_author.setdefault(keys[0], set()).add(record.id)
+            date_key = self._date_key(record.id, keys[1])
+            if bulk:
+                self.articles_by_date.append(date_key)
+            else:
+                bisect.insort(self.articles_by_date, date_key)
+        elif collection == 'deliveries':
+            self.deliveries_by_status.setdefault(keys[0], set()).add(record.id)
+        self._schedule(collection, record, bulk)
+
+    def _unindex(self, collection, record_id):
+        record = self.by_id[collection].pop(record_id)
+        keys = self._index_keys[collection].pop(record_id)
+        self.search.remove(collection, record_id)
+        if collection == 'users':
+            for index, key in zip((self.users_by_pseudo, self.users_by_email), keys):
+                if index.get(key) is record:
+                    del index[key]
+            self.user_views.remove(record_id)
+            self.suspensions.discard(record_id)
+            del self._access[record_id]
+            self._touch_profile(record_id)
+        elif collection == 'articles':
+            article_ids = self.articles_by_author[keys[0]]
+            article_ids.discard(record_id)
+            if not article_ids:
+                del self.articles_by_author[keys[0]]
+            _remove_sorted(self.articles_by_date, self._date_key(record_id, keys[1]))
+        elif collection == 'deliveries':
+            delivery_ids = self.deliveries_by_status[keys[0]]
+            delivery_ids.discard(record_id)
+            if not delivery_ids:
+                del self.deliveries_by_status[keys[0]]
+            self.pending_deliveries.discard(record_id)
+
+    @staticmethod
+    def _track(record):
+        # Valeurs de référence de Record.changes(), inutiles sans autre processus pour relire les données
+        if MULTIPROCESS:
+            record.stored = record.values()
+
+    def _touch_profile(self, user_id):
+        # Seuls les auteurs d'articles ont leur pseudo et leur grade affichés sur les pages publiques
+        if user_id in self.articles_by_author:
+            self.generations['profiles'] += 1
+
+    def _reindex(self, collection, record):
+        """Met à jour les index si un champ indexé (pseudo, email, grade, auteur, date, texte) a changé."""
+        self._track(record)
+        if self._index_keys[collection].get(record.id) != self._keys_of(collection, record):
+            self._unindex(collection, record.id)
+            self._index(collection, record)
+        else:
+            if collection == 'users':
+                # Solde et statut ne touchent pas les pages publiques, seulement les vues admin
+                self.user_views.refresh(record)
+                self._access[record.id] = (record.grade, record.status)
+            self._schedule(collection, record)
+
+    def _schedule(self, collection, record, bulk=False):
+        """Replanifie la fin de suspension d'un utilisateur ou la prochaine tentative d'une livraison."""
+        if collection == 'users':
+            self.suspensions.schedule(record.id, record.suspension_end_date if record.status == 'Suspendu' else None, bulk)
+        elif collection == 'deliveries':
+            self.pending_deliveries.schedule(record.id, record.prochaine_tentative if record.status == 'En attente' else None, bulk)
+
+
+STORE = DataStore()
+
+def load_data():
+    """Renvoie les données en mémoire (relues seulement si le fichier a changé)."""
+    return STORE.load()
+
+def save_data(data):
+    """Réécrit intégralement les données et met à jour la copie en mémoire."""
+    STORE.save(data)
+
+def insert_record(collection, record, counter):
+    """Ajoute un enregistrement (son id est tiré du compteur) et le renvoie."""
+    return STORE.insert(collection, record, counter)
+
+def edit_record(record):
+    """Copie de `record` à modifier puis passer à update_record.
+
+    L'original, partagé entre les requêtes, n'est modifié qu'à l'enregistrement, sous
+    le verrou, et seulement sur les champs changés dans la copie.
+    """
+    copy = record.copy()
+    copy.stored = record.values()
+    return copy
+
+def update_record(collection, record):
+    """Persiste un enregistrement modifié (à la fin de la requête en cours, le cas échéant)."""
+    if has_request_context():
+        request_changes().update(collection, record)
+    else:
+        STORE.update(collection, record)
+
+def delete_records(collection, record_ids):
+    """Supprime des enregistrements par id (à la fin de la requête en cours, le cas échéant)."""
+    if has_request_context():
+        request_changes().delete(collection, record_ids)
+    else:
+        STORE.delete(collection, record_ids)
+
+class UnitOfWork:
+    """Modifications d'une requête, notées au fil de la vue et enregistrées en une seule écriture.
+
+    Les vues modifient des copies (edit_record) : les autres requêtes ne voient les
+    changements qu'une fois reportés, sous le verrou, à l'enregistrement, et une vue
+    qui échoue n'en laisse aucun (discard_request_changes). Un enregistrement modifié
+    plusieurs fois n'est écrit qu'une fois, et une suppression annule sa modification.
+    Les ajouts (insert_record) et les opérations sur les gemmes restent immédiats : ils
+    attribuent un id ou vérifient un solde.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.dirty = {}
+        self.deleted = {}
+
+    def update(self, collection, record):
+        self.dirty[(collection, record.id)] = record
+
+    def delete(self, collection, record_ids):
+        for record_id in record_ids:
+            self.dirty.pop((collection, record_id), None)
+            self.deleted[(collection, record_id)] = True
+
+    def commit(self):
+        entries = [{'op': 'put', 'c': collection, 'r': record} for (collection, _), record in self.dirty.items()]
+        entries += [{'op': 'del', 'c': collection, 'id': record_id} for collection, record_id in self.deleted]
+        self.dirty, self.deleted = {}, {}
+        self.store.commit_changes(entries)
+
+def request_changes():
+    """Unité de travail de la requête en cours (créée au premier appel, validée par commit_request_changes)."""
+    if 'unit_of_work' not in g:
+        g.unit_of_work = UnitOfWork(STORE)
+    return g.unit_of_work
+
+def debit_gemmes(user_id, amount, clamp=False):
+    """Débite un solde de façon atomique ; renvoie (succès, nouveau solde)."""
+    return STORE.debit_gemmes(user_id, amount, clamp)
+
+def credit_gemmes(user_id, amount):
+    """Crédite un solde de façon atomique ; renvoie le nouveau solde."""
+    return STORE.credit_gemmes(user_id, amount)
+
+def read_gem_adjustments(content, filename=''):
+    """Lit un lot d'ajustements de gemmes en JSON ([{"utilisateur": ..., "montant": ...}])
+    ou en CSV (colonnes utilisateur et montant, séparateur , ou ;)."""
+    if filename.lower().endswith('.json') or content.lstrip().startswith('['):
+        rows = json.loads(content)
+        if not isinstance(rows, list):
+            raise ValueError("une liste d'ajustements est attendue")
+        return rows
+    lines = content.splitlines()
+    delimiter = ';' if lines and lines[0].count(';') > lines[0].count(',') else ','
+    return list(csv.DictReader(lines, delimiter=delimiter))
+
+def apply_gem_adjustments(rows, dry_run=False):
+    """Valide puis applique un lot d'ajustements en une seule écriture.
+
+    `utilisateur` est un id, un pseudo ou un email ; `montant` un entier signé (les
+    retraits sont bornés au solde disponible). Si une ligne est invalide, rien n'est
+    appliqué. Renvoie (appliqué, rapport ligne par ligne).
+    """
+    report = []
+    adjustments = []
+    for number, row in enumerate(rows, start=1):
+        row = row if isinstance(row, dict) else {}
+        identifier = str(row.get('utilisateur') or '').strip()
+        line = {'ligne': number, 'utilisateur': identifier, 'montant': row.get('montant'), 'erreur': None}
+        report.append(line)
+        if identifier.isdigit():
+            user = get_user_by_id(int(identifier))
+        else:
+            user = get_user_by_login(identifier) if identifier else None
+        try:
+            amount = int(str(row.get('montant')).strip())
+        except ValueError:
+            amount = None
+        if user is None:
+            line['erreur'] = 'Utilisateur introuvable'
+        elif amount is None or amount == 0:
+            line['erreur'] = 'Montant invalide (entier non nul attendu)'
+        else:
+            line['pseudo'] = user.pseudo
+            adjustments.append((line, user.id, amount))
+
+    if any(line['erreur'] for line in report) or dry_run:
+        return False, report
+    results = STORE.bulk_adjust_gemmes([(user_id, amount) for _, user_id, amount in adjustments])
+    if None in results:
+        # Compte supprimé entre la validation et l'application : rien n'a été appliqué
+        for (line, _, _), result in zip(adjustments, results):
+            if result is None:
+                line['erreur'] = 'Utilisateur introuvable'
+        return False, report
+    for (line, _, _), (before, after) in zip(adjustments, results):
+        line['avant'], line['apres'] = before, after
+    return True, report
+
+def get_user_by_id(user_id):
+    """Récupère un utilisateur par son ID."""
+    return STORE.get('users', user_id)
+
+def get_user_by_login(identifier):
+    """Récupère un utilisateur par son pseudo ou son email."""
+    return STORE.find_user(pseudo=identifier, email=identifier)
+
+def get_shop_item_by_id(item_id):
+    """Récupère un article de la boutique par son ID."""
+    return STORE.get('shop_items', item_id)
+
+def get_articles_by_author(user_id):
+    """Récupère les articles publiés par un utilisateur."""
+    return STORE.articles_of(user_id)
+
+# --- Mots de passe ---
+
+class PasswordPoolBusy(Exception):
+    """Levée quand trop de hachages sont déjà en attente dans le pool."""
+
+
+class PasswordHasher:
+    """Exécute les hachages de mots de passe dans un pool borné de threads.
+
+    scrypt/pbkdf2 libèrent le GIL : les hachages avancent en parallèle sans bloquer
+    les autres requêtes. Au-delà de `workers + max_pending` demandes en cours, les
+    nouvelles attendent au plus PASSWORD_POOL_TIMEOUT secondes puis sont refusées
+    (PasswordPoolBusy) plutôt que de s'accumuler.
+    """
+
+    def __init__(self, workers=None, max_pending=None, method=None):
+        self.workers = workers or PASSWORD_POOL_WORKERS
+        self.method = method or PASSWORD_HASH_METHOD
+        self._slots = threading.BoundedSemaphore(self.workers + (PASSWORD_POOL_MAX_PENDING if max_pending is None else max_pending))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password')
+        self._prefix = None
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(timeout=PASSWORD_POOL_TIMEOUT):
+            raise PasswordPoolBusy()
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        with METRICS.timer('password'):
+            return future.result()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Vrai si le hachage n'a pas été produit avec la méthode et le coût configurés."""
+        if self._prefix is None:
+            # werkzeug complète la méthode avec ses paramètres par défaut : on prend la forme réelle
+            self._prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._prefix
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+PASSWORDS = PasswordHasher()
+
+def hash_password(password):
+    """Hache un mot de passe dans le pool dédié."""
+    return PASSWORDS.hash(password)
+
+def verify_password(password_hash, password):
+    """Vérifie un mot de passe dans le pool dédié."""
+    return PASSWORDS.check(password_hash, password)
+
+def password_needs_rehash(password_hash):
+    """Indique si un hachage doit être refait avec la méthode courante."""
+    return PASSWORDS.needs_rehash(password_hash)
+
+# --- Livraison en jeu (transports) ---
+
+# Un transport expose send_batch(commandes) -> [(succès, réponse ou erreur)] et
+# close() ; succès vaut None pour une commande qui n'a pas pu être envoyée. Il est choisi d'après le schéma de DELIVERY_TRANSPORT (voir DELIVERY_TRANSPORTS).
+
+class DeliveryError(Exception):
+    """Réponse invalide ou refus du serveur de jeu."""
+
+
+def _rcon_packet(request_id, kind, payload):
+    body = struct.pack('<ii', request_id, kind) + payload.encode('utf-8') + b'\x00\x00'
+    return struct.pack('<i', len(body)) + body
+
+def _rcon_read(sock):
+    """Lit un paquet RCON et renvoie (id, type, texte)."""
+    def read_exactly(size):
+        chunks = b''
+        while len(chunks) < size:
+            chunk = sock.recv(size - len(chunks))
+            if not chunk:
+                raise DeliveryError("connexion fermée par le serveur de jeu")
+            chunks += chunk
+        return chunks
+    length = struct.unpack('<i', read_exactly(4))[0]
+    if not 10 <= length <= 4110:
+        raise DeliveryError(f"paquet RCON invalide ({length} octets)")
+    body = read_exactly(length)
+    request_id, kind = struct.unpack('<ii', body[:8])
+    return request_id, kind, body[8:-2].decode('utf-8', 'replace')
+
+
+class RconTransport:
+    """Client RCON (protocole Source, celui du serveur Minecraft) : une connexion authentifiée par lot."""
+
+    LOGIN, COMMAND, RESPONSE = 3, 2, 0
+
+    def __init__(self, host, port=25575, password='', timeout=DELIVERY_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+
+    @classmethod
+    def from_url(cls, url):
+        return cls(url.hostname or '127.0.0.1', url.port or 25575, unquote(url.password or url.username or ''))
+
+    def send_batch(self, commands):
+        """Envoie les commandes dans l'ordre ; après une erreur réseau, les suivantes ne sont pas envoyées."""
+        results = []
+        try:
+            with socket.create_connection((self.host, self.port), timeout=self.timeout) as sock:
+                sock.sendall(_rcon_packet(1, self.LOGIN, self.password))
+                if _rcon_read(sock)[0] == -1:
+                    raise DeliveryError("mot de passe RCON refusé")
+                for request_id, command in enumerate(commands, start=2):
+                    sock.sendall(_rcon_packet(request_id, self.COMMAND, command))
+                    response_id, _, text = _rcon_read(sock)
+                    if response_id != request_id:
+                        raise DeliveryError(f"réponse RCON inattendue (id {response_id} au lieu de {request_id})")
+                    results.append((True, text))
+        except (OSError, DeliveryError) as e:
+            if len(results) < len(commands):
+                results.append((False, str(e) or type(e).__name__))
+            results += [(None, "non envoyée")] * (len(commands) - len(results))
+        return results
+
+    def close(self):
+        pass
+
+
+DELIVERY_TRANSPORTS = {'rcon': RconTransport.from_url}
+
+def create_delivery_transport(url=None):
+    """Construit le transport décrit par `url` (DELIVERY_TRANSPORT par défaut) ; None si aucun."""
+    url = url or DELIVERY_TRANSPORT
+    if not url:
+        return None
+    parsed = urlsplit(url)
+    factory = DELIVERY_TRANSPORTS.get(parsed.scheme)
+    if factory is None:
+        raise ValueError(f"Transport de livraison inconnu : {url}")
+    return factory(parsed)
+
+
+class FakeRconServer:
+    """Serveur RCON local pour les tests : enregistre les commandes reçues.
+
+    Avec failure_rate > 0, une partie des commandes fait fermer la connexion avant
+    d'être exécutée, comme un serveur de jeu qui redémarre.
+    """
 
-def save_data(data):
-    """Sauvegarde les données dans le fichier JSON. (Fonction inchangée)"""
-    try:
-        with open(DATA_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
-    except IOError as e:
-        print(f"ERREUR FATALE: Impossible d'écrire dans le fichier {DATA_FILE}. Détail: {e}")
+    def __init__(self, password='test', host='127.0.0.1', port=0, failure_rate=0.0, seed=None):
+        self.password = password
+        self.failure_rate = failure_rate
+        self.commands = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        fake = self
 
-def get_user_by_id(user_id):
-    """Récupère un utilisateur par son ID. (Fonction inchangée)"""
-    data = load_data()
-    for user in data['users']:
-        if user['id'] == user_id:
-            return user
-    return None
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                try:
+                    while True:
+                        request_id, kind, payload = _rcon_read(self.request)
+                        if kind == RconTransport.LOGIN:
+                            accepted = payload == fake.password
+                            self.request.sendall(_rcon_packet(request_id if accepted else -1, RconTransport.COMMAND, ''))
+                            continue
+                        with fake._lock:
+                            if fake._rng.random() < fake.failure_rate:
+                                return
+                            fake.commands.append(payload)
+                        self.request.sendall(_rcon_packet(request_id, RconTransport.RESPONSE, 'OK'))
+                except (OSError, DeliveryError):
+                    return
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        self._server = Server((host, port), Handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"rcon://{quote(self.password)}@{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-rcon', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
 
 # #################################################################
 # 1. DEFINITION DES TEMPLATES HTML EN PYTHON
@@ -118,109 +2565,8 @@ TEMPLATES = {
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>{% block title %}HeraCraft - Modern Dark{% endblock %}</title>
-    <style>
-        :root {
-            --primary-color: #39ff14; /* Vert Néon/Cyber */
-            --secondary-color: #909090; 
-            --success-color: #4CAF50;
-            --error-color: #FF4444;
-            --bg-color: #0d1117; /* Fond très sombre */
-            --container-bg: #161b22; /* Contenant légèrement plus clair */
-            --text-color: #f0f6fc; /* Texte blanc cassé */
-            --header-bg: #010409; 
-            --accent-color: #ffd700; /* Jaune Or */
-            --warning-color: #ffaa00; 
-            --gemme-color: #66CCFF; /* Bleu Ciel pour les Gemmes */
-            --shop-bg: #21262d; 
-            --border-color: #30363d;
-        }
-        body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; margin: 0; padding: 0; background-color: var(--bg-color); color: var(--text-color); min-height: 100vh; }
-        header { background-color: var(--header-bg); color: white; padding: 1em 0; box-shadow: 0 4px 8px rgba(0,0,0,0.4); border-bottom: 2px solid var(--border-color); }
-        .header-content { width: 90%; max-width: 1200px; margin: 0 auto; display: flex; justify-content: space-between; align-items: center; }
-        header a { color: var(--text-color); margin: 0 10px; text-decoration: none; transition: color 0.3s, transform 0.2s; font-weight: 500; }
-        header a:hover { color: var(--primary-color); transform: translateY(-1px); }
-        
-        /* Conteneur principal modernisé */
-        .container { 
-            width: 90%; 
-            max-width: 800px; 
-            margin: 40px auto; 
-            background-color: var(--container-bg); 
-            padding: 30px 40px; 
-            border-radius: 12px; 
-            box-shadow: 0 8px 25px rgba(0,0,0,0.5); 
-            border: 1px solid var(--border-color); 
-        }
-        
-        /* Titres */
-        h2 { color: var(--primary-color); border-bottom: 2px solid var(--border-color); padding-bottom: 10px; margin-bottom: 25px; font-weight: 600; }
-        
-        /* Articles/Sections */
-        .article, .shop-item, .user-list-item { 
-            background-color: var(--shop-bg); 
-            border: 1px solid var(--border-color); 
-            padding: 20px; 
-            margin-bottom: 15px; 
-            border-radius: 8px; 
-            box-shadow: 0 2px 5px rgba(0,0,0,0.3);
-        }
-        .article h3 { color: var(--accent-color); margin-top: 0; }
-        
-        /* Flash Messages */
-        .flash { padding: 15px; margin-bottom: 20px; border-radius: 6px; font-weight: bold; border: 1px solid; animation: fadeIn 0.5s; }
-        .flash.success { background-color: #1c3a1c; color: var(--success-color); border-color: #387c38; }
-        .flash.error { background-color: #4a1c1c; color: var(--error-color); border-color: #8c3838; }
-        
-        /* Formulaires */
-        input[type="text"], input[type="email"], input[type="password"], textarea, select, input[type="date"], input[type="time"], input[type="number"] { 
-            width: 100%; padding: 12px; 
-            border: 1px solid var(--border-color); 
-            border-radius: 6px; 
-            box-sizing: border-box; 
-            background-color: #21262d; /* Champ de saisie */
-            color: var(--text-color); 
-            margin-bottom: 15px;
-            transition: border-color 0.3s, box-shadow 0.3s;
-        }
-        input:focus, textarea:focus, select:focus {
-            border-color: var(--primary-color);
-            box-shadow: 0 0 5px rgba(57, 255, 20, 0.5);
-            outline: none;
-        }
-        label { display: block; margin-bottom: 5px; color: var(--secondary-color); font-size: 0.9em; }
-        
-        /* Boutons */
-        button[type="submit"], .shop-buy-btn { 
-            background-color: var(--primary-color); 
-            color: #0d1117; /* Texte sombre sur bouton clair */
-            padding: 12px 25px; 
-            border: none; 
-            border-radius: 6px; 
-            cursor: pointer; 
-            font-weight: bold;
-            transition: background-color 0.3s, transform 0.2s, box-shadow 0.3s;
-            box-shadow: 0 4px 6px rgba(0,0,0,0.3);
-        }
-        button[type="submit"]:hover { 
-            background-color: #6eff33; 
-            transform: translateY(-2px);
-            box-shadow: 0 6px 10px rgba(0,0,0,0.4);
-        }
-        
-        /* Shop */
-        .shop-item { display: flex; justify-content: space-between; align-items: center; }
-        .shop-price { font-size: 1.2em; font-weight: bold; color: var(--gemme-color); }
-        .shop-buy-btn { background-color: var(--gemme-color); color: var(--header-bg); text-decoration: none; padding: 10px 20px; }
-        .shop-buy-btn:hover { background-color: #99FFFF; }
-
-        /* Statuts */
-        .status-actif { color: var(--success-color); }
-        .status-banni { color: var(--error-color); font-weight: bold; }
-        .status-suspendu { color: var(--warning-color); font-weight: bold; }
-        
-        /* Animation */
-        @keyframes fadeIn { from { opacity: 0; } to { opacity: 1; } }
-    </style>
+    <link rel="stylesheet" href="{{ asset_url('layout.css') }}">
+    {% block head %}{% endblock %}
 </head>
 <body>
     <header>
@@ -230,6 +2576,7 @@ TEMPLATES = {
                 <a href="{{ url_for('accueil') }}">Accueil</a>
                 <a href="{{ url_for('wiki') }}">📚 Wiki</a>
                 <a href="{{ url_for('shop') }}">🛒 Shop</a>
+                <a href="{{ url_for('recherche') }}">🔍 Recherche</a>
                 
                 {% if session.get('loggedin') %}
                     {% if session.get('grade') == 'Administrateur' %}
@@ -237,6 +2584,8 @@ TEMPLATES = {
                         <a href="{{ url_for('gestion_utilisateurs') }}" style="color: var(--accent-color);">⚙️ Grades</a>
                         <a href="{{ url_for('gestion_gemmes') }}" style="color: var(--gemme-color);">💎 Gemmes</a> 
                         <a href="{{ url_for('gerer_comptes_admin') }}" style="color: var(--error-color);">🚫 Bans/Susp.</a>
+                        <a href="{{ url_for('gestion_livraisons') }}" style="color: var(--accent-color);">📦 Livraisons</a>
+                        <a href="{{ url_for('gestion_sessions') }}" style="color: var(--error-color);">🔑 Sessions</a>
                     {% endif %}
                     <a href="{{ url_for('mon_compte') }}">👤 Mon Compte</a>
                     <a href="{{ url_for('deconnexion') }}" style="color: var(--secondary-color);">Déconnexion</a>
@@ -285,19 +2634,31 @@ TEMPLATES = {
     </div>
     
     <h2 style="color: var(--primary-color);">📰 Dernières Actualités</h2>
+
+    <form method="GET" action="{{ url_for('recherche') }}" style="display: flex; gap: 10px; margin-bottom: 20px;">
+        <input type="search" name="q" placeholder="Rechercher un article..." style="margin-bottom: 0;">
+        <button type="submit">🔍</button>
+    </form>
     
     {% if articles %}
-        {% for article in articles %}
+        {% for article, author in articles %}
             <div class="article">
                 <h3>{{ article.titre }}</h3>
                 <p>
                     <small style="color: var(--secondary-color);">
-                        Publié par {{ article.nom_auteur }} (Grade: {{ article.grade_auteur }}) le {{ article.date_publication }}
+                        Publié par {{ author.pseudo }} (Grade: {{ author.grade }}) le {{ article.date_publication }}
                     </small>
                 </p>
                 <p>{{ article.contenu | truncate(300, true) }}</p>
             </div>
         {% endfor %}
+        {% if page_count > 1 %}
+            <div style="display: flex; justify-content: space-between; margin-top: 20px;">
+                <span>{% if page > 1 %}<a href="{{ url_for('accueil', page=page - 1) }}" style="color: var(--primary-color);">← Plus récents</a>{% endif %}</span>
+                <span style="color: var(--secondary-color);">Page {{ page }} / {{ page_count }}</span>
+                <span>{% if page < page_count %}<a href="{{ url_for('accueil', page=page + 1) }}" style="color: var(--primary-color);">Plus anciens →</a>{% endif %}</span>
+            </div>
+        {% endif %}
     {% else %}
         <p>Aucun article n'a été trouvé.</p>
         {% if session.get('grade') == 'Administrateur' %}
@@ -386,14 +2747,22 @@ TEMPLATES = {
     <h2 style="color: var(--accent-color);">⚙️ Gérer les Grades des Utilisateurs</h2>
     <p style="color: var(--secondary-color);">Cliquez sur "Modifier" pour changer le grade d'un membre.</p>
 
+    {% include 'recherche_utilisateurs.html' %}
+
     {% for user in users %}
         <div class="user-list-item" style="display: flex; justify-content: space-between; align-items: center;">
             <span>
                 Pseudo: {{ user.pseudo }} (ID: {{ user.id }}) - Grade actuel: <span style="color: {{ 'red' if user.grade == 'Administrateur' else 'var(--primary-color)' }}; font-weight: bold;">{{ user.grade }}</span>
             </span>
+            {% if user.id != session.get('id') %}
             <a href="{{ url_for('modifier_utilisateur', user_id=user.id) }}" style="color: var(--accent-color); text-decoration: none; padding: 5px 10px; background-color: #30363d; border-radius: 4px; transition: background-color 0.2s;">Modifier</a>
+            {% else %}
+            <span style="color: var(--secondary-color);"> (Vous) </span>
+            {% endif %}
         </div>
     {% endfor %}
+
+    {% include 'pagination_utilisateurs.html' %}
 {% endblock %}
 """,
     
@@ -478,50 +2847,8 @@ TEMPLATES = {
     'wiki.html': """
 {% extends 'layout.html' %}
 {% block title %}HeraCraft Wiki{% endblock %}
+{% block head %}<link rel="stylesheet" href="{{ asset_url('wiki.css') }}">{% endblock %}
 {% block content %}
-    <style>
-        .wiki-layout { 
-            display: flex; 
-            max-width: 1200px; 
-            margin: 0 auto; 
-            background-color: var(--container-bg); 
-            box-shadow: 0 0 15px rgba(0, 0, 0, 0.4); 
-            border-radius: 10px;
-        }
-        .sidebar-nav { 
-            width: 250px; 
-            background-color: #10141b; 
-            padding: 20px 0; 
-            flex-shrink: 0; 
-            border-right: 1px solid var(--border-color);
-            border-top-left-radius: 10px;
-            border-bottom-left-radius: 10px;
-        }
-        .sidebar-nav label { 
-            display: block; 
-            padding: 12px 20px; 
-            color: #d0d0d0; 
-            text-decoration: none; 
-            cursor: pointer; 
-            border-left: 3px solid transparent; 
-            transition: background-color 0.2s, border-left-color 0.2s; 
-        }
-        .sidebar-nav label:hover {
-            background-color: #161b22;
-        }
-        .tab-radio { display: none; }
-        .wiki-section { display: none; }
-        #radio-index:checked ~ .wiki-layout .sidebar-nav label[for="radio-index"], #radio-intro:checked ~ .wiki-layout .sidebar-nav label[for="radio-intro"], #radio-commands:checked ~ .wiki-layout .sidebar-nav label[for="radio-commands"], #radio-grades:checked ~ .wiki-layout .sidebar-nav label[for="radio-grades"], #radio-claim:checked ~ .wiki-layout .sidebar-nav label[for="radio-claim"], #radio-shops:checked ~ .wiki-layout .sidebar-nav label[for="radio-shops"] { 
-            border-left-color: var(--primary-color); 
-            background-color: var(--container-bg); 
-            color: var(--text-color); 
-            font-weight: bold; 
-        }
-        .content-wrapper { flex-grow: 1; padding: 40px; min-height: calc(100vh - 58px - 80px); }
-        .code-example { background-color: #21262d; padding: 10px; border-radius: 4px; color: var(--primary-color); font-family: monospace; }
-        .wiki-layout h3 { color: var(--accent-color); margin-top: 25px; border-top: 1px solid var(--border-color); padding-top: 15px; }
-    </style>
-    
     <input type="radio" id="radio-index" name="wiki-tab" class="tab-radio" checked>
     <input type="radio" id="radio-intro" name="wiki-tab" class="tab-radio">
     <input type="radio" id="radio-commands" name="wiki-tab" class="tab-radio">
@@ -565,6 +2892,8 @@ TEMPLATES = {
     <h2 style="color: var(--error-color);">🚫 Gestion des Comptes (Suspension / Ban)</h2>
     <p style="color: var(--secondary-color);">Cliquez sur "Gérer" pour modifier le statut (actif, suspendu, banni).</p>
 
+    {% include 'recherche_utilisateurs.html' %}
+
     {% for user in users %}
         <div class="user-list-item" style="display: flex; justify-content: space-between; align-items: center;">
             <span>
@@ -582,6 +2911,8 @@ TEMPLATES = {
             {% endif %}
         </div>
     {% endfor %}
+
+    {% include 'pagination_utilisateurs.html' %}
 {% endblock %}
 """,
 
@@ -615,8 +2946,8 @@ TEMPLATES = {
                 <textarea id="suspension_reason" name="suspension_reason" rows="3" required>{{ user.suspension_reason if user.suspension_reason else '' }}</textarea>
                 
                 <label for="suspension_end_date">Date de fin de suspension :</label>
-                <input type="date" id="suspension_date" name="suspension_date" value="{{ user.suspension_end_date.split(' ')[0] if user.suspension_end_date and user.status == 'Suspendu' else '' }}">
-                <input type="time" id="suspension_time" name="suspension_time" value="{{ user.suspension_end_date.split(' ')[1] if user.suspension_end_date and user.status == 'Suspendu' else '00:00:00' }}" step="1">
+                <input type="date" id="suspension_date" name="suspension_date" value="{{ (user.suspension_end_date | string)[:10] if user.suspension_end_date and user.status == 'Suspendu' else '' }}">
+                <input type="time" id="suspension_time" name="suspension_time" value="{{ (user.suspension_end_date | string)[11:] if user.suspension_end_date and user.status == 'Suspendu' else '00:00:00' }}" step="1">
             </div>
 
             <button type="submit">Appliquer le Statut</button>
@@ -630,19 +2961,7 @@ TEMPLATES = {
         <button type="submit" name="action" value="delete_account" style="background-color: var(--error-color);">SUPPRIMER DÉFINITIVEMENT</button>
     </form>
     
-    <script>
-        function toggleSuspensionFields(status) {
-            var fields = document.getElementById('suspension-fields');
-            if (status === 'Suspendu') {
-                fields.style.display = 'block';
-            } else {
-                fields.style.display = 'none';
-            }
-        }
-        document.addEventListener('DOMContentLoaded', function() {
-            toggleSuspensionFields(document.getElementById('status').value);
-        });
-    </script>
+    <script src="{{ asset_url('admin.js') }}"></script>
 {% endblock %}
 """,
 
@@ -653,6 +2972,9 @@ TEMPLATES = {
 {% block content %}
     <h2 style="color: var(--gemme-color);">💎 Gérer le Solde de Gemmes des Utilisateurs</h2>
     <p style="color: var(--secondary-color);">Cliquez sur "Ajuster" pour ajouter ou retirer des Gemmes.</p>
+    <p><a href="{{ url_for('gemmes_en_masse') }}" style="color: var(--gemme-color); font-weight: bold;">📦 Créditer / débiter des Gemmes en masse (CSV / JSON)</a></p>
+
+    {% include 'recherche_utilisateurs.html' %}
 
     {% for user in users %}
         <div class="user-list-item" style="display: flex; justify-content: space-between; align-items: center;">
@@ -662,6 +2984,8 @@ TEMPLATES = {
             <a href="{{ url_for('gerer_gemmes_detail', user_id=user.id) }}" style="color: var(--gemme-color); text-decoration: none; padding: 5px 10px; background-color: #30363d; border-radius: 4px; transition: background-color 0.2s;">Ajuster</a>
         </div>
     {% endfor %}
+
+    {% include 'pagination_utilisateurs.html' %}
 {% endblock %}
 """,
 
@@ -778,61 +3102,887 @@ TEMPLATES = {
             <label for="prix_gemmes">Prix en Gemmes (💎) :</label>
             <input type="number" id="prix_gemmes" name="prix_gemmes" min="1" required>
         </div>
+        <div>
+            <label for="commande">Commande de livraison en jeu (optionnelle) :</label>
+            <input type="text" id="commande" name="commande" placeholder="{{ default_command }}">
+            <small style="color: var(--secondary-color);">Variables : {pseudo}, {item_id}, {nom}, {delivery_id}. Vide : commande par défaut.</small>
+        </div>
         <button type="submit">Ajouter à la Boutique</button>
     </form>
 {% endblock %}
+""",
+
+    # 16. TEMPLATE : GEMMES EN MASSE (Admin)
+    'gemmes_en_masse.html': """
+{% extends 'layout.html' %}
+{% block title %}Gemmes en masse{% endblock %}
+{% block content %}
+    <h2 style="color: var(--gemme-color);">💎 Créditer / Débiter des Gemmes en masse</h2>
+    <p style="color: var(--secondary-color);">Fichier CSV (colonnes <code>utilisateur</code> et <code>montant</code>) ou JSON (<code>[{"utilisateur": "Pseudo", "montant": 50}]</code>). L'utilisateur peut être un ID, un pseudo ou un email ; un montant négatif retire des Gemmes. Le lot est appliqué en une seule fois, et rien n'est appliqué si une ligne est invalide.</p>
+
+    <form method="POST" enctype="multipart/form-data">
+        <div>
+            <label for="fichier">Fichier :</label>
+            <input type="file" id="fichier" name="fichier" accept=".csv,.json" style="margin-bottom: 15px;">
+        </div>
+        <div>
+            <label for="contenu">... ou contenu collé :</label>
+            <textarea id="contenu" name="contenu" rows="6" placeholder="utilisateur;montant"></textarea>
+        </div>
+        <label><input type="checkbox" name="simulation" value="1"> Simulation (valider sans appliquer)</label>
+        <button type="submit" style="margin-top: 15px;">Appliquer le lot</button>
+    </form>
+
+    {% if report %}
+        <h3 style="margin-top: 30px; color: var(--primary-color);">Résultat ({{ report | length }} lignes)</h3>
+        {% for line in report %}
+            <div class="user-list-item" style="padding: 10px;">
+                Ligne {{ line.ligne }} : {{ line.utilisateur }} ({{ line.montant }})
+                {% if line.erreur %}
+                    - <span class="status-banni">{{ line.erreur }}</span>
+                {% elif line.apres is defined %}
+                    - <span class="status-actif">{{ line.pseudo }} : {{ line.avant }} → {{ line.apres }} 💎</span>
+                {% else %}
+                    - <span class="status-actif">{{ line.pseudo }} : valide</span>
+                {% endif %}
+            </div>
+        {% endfor %}
+    {% endif %}
+
+    <p style="margin-top: 20px;"><a href="{{ url_for('gestion_gemmes') }}" style="color: var(--secondary-color);">← Retour à la liste des Gemmes</a></p>
+{% endblock %}
+""",
+
+    # 17. TEMPLATE : RECHERCHE D'ARTICLES
+    'recherche.html': """
+{% extends 'layout.html' %}
+{% block title %}Recherche - HeraCraft{% endblock %}
+{% block content %}
+    <h2 style="color: var(--accent-color);">🔍 Rechercher un article</h2>
+
+    <form method="GET" style="display: flex; gap: 10px; margin-bottom: 20px;">
+        <input type="search" name="q" value="{{ query }}" placeholder="Mots du titre ou du contenu" autofocus style="margin-bottom: 0;">
+        <button type="submit">Rechercher</button>
+    </form>
+
+    {% if query %}
+        <p style="color: var(--secondary-color);">{{ total }} article(s) trouvé(s) pour « {{ query }} »{% if total > articles | length %} ({{ articles | length }} plus récents affichés){% endif %}.</p>
+        {% for article, author in articles %}
+            <div class="article">
+                <h3>{{ article.titre }}</h3>
+                <p>
+                    <small style="color: var(--secondary-color);">
+                        Publié par {{ author.pseudo }} (Grade: {{ author.grade }}) le {{ article.date_publication }}
+                    </small>
+                </p>
+                <p>{{ article.contenu | truncate(300, true) }}</p>
+            </div>
+        {% endfor %}
+    {% endif %}
+{% endblock %}
+""",
+
+    # 18. TEMPLATE : RECHERCHE, TRI ET FILTRES DES LISTES D'UTILISATEURS (inclus dans les listes admin)
+    'recherche_utilisateurs.html': """
+    <form method="GET" style="display: flex; flex-wrap: wrap; gap: 10px; margin-bottom: 20px;">
+        <input type="search" name="q" value="{{ query }}" placeholder="ID, début du pseudo ou de l'email" style="margin-bottom: 0; flex: 1 1 200px;">
+        <select name="tri" style="margin-bottom: 0; width: auto;">
+            {% for value, label in [('id', 'ID'), ('pseudo', 'Pseudo'), ('gemmes', 'Gemmes'), ('status', 'Statut')] %}
+                <option value="{{ value }}" {% if value == listing.tri %}selected{% endif %}>Trier par {{ label }}</option>
+            {% endfor %}
+        </select>
+        <select name="ordre" style="margin-bottom: 0; width: auto;">
+            <option value="asc">Croissant</option>
+            <option value="desc" {% if listing.ordre == 'desc' %}selected{% endif %}>Décroissant</option>
+        </select>
+        <select name="statut" style="margin-bottom: 0; width: auto;">
+            <option value="">Tous les statuts</option>
+            {% for status in statuses %}<option value="{{ status }}" {% if status == listing.statut %}selected{% endif %}>{{ status }}</option>{% endfor %}
+        </select>
+        <select name="grade" style="margin-bottom: 0; width: auto;">
+            <option value="">Tous les grades</option>
+            {% for grade in grades %}<option value="{{ grade }}" {% if grade == listing.grade %}selected{% endif %}>{{ grade }}</option>{% endfor %}
+        </select>
+        <button type="submit">🔍</button>
+        {% if listing %}<a href="{{ request.path }}" style="color: var(--secondary-color); align-self: center;">Tout afficher</a>{% endif %}
+    </form>
+    <p style="color: var(--secondary-color);">{{ total }} utilisateur(s){% if query %} correspondant à « {{ query }} »{% endif %}.</p>
+""",
+
+    # 19. TEMPLATE : PAGINATION DES LISTES D'UTILISATEURS (incluse dans les listes admin)
+    'pagination_utilisateurs.html': """
+    {% if page_count > 1 %}
+        <div style="display: flex; justify-content: space-between; margin-top: 20px;">
+            <span>{% if page > 1 %}<a href="{{ url_for(request.endpoint, page=page - 1, **listing) }}" style="color: var(--primary-color);">← Précédents</a>{% endif %}</span>
+            <span style="color: var(--secondary-color);">Page {{ page }} / {{ page_count }}</span>
+            <span>{% if page < page_count %}<a href="{{ url_for(request.endpoint, page=page + 1, **listing) }}" style="color: var(--primary-color);">Suivants →</a>{% endif %}</span>
+        </div>
+    {% endif %}
+""",
+
+    # 20. TEMPLATE : LIVRAISONS EN JEU (Admin)
+    'gestion_livraisons.html': """
+{% extends 'layout.html' %}
+{% block title %}Livraisons en jeu{% endblock %}
+{% block content %}
+    <h2 style="color: var(--accent-color);">📦 Livraisons des achats en jeu</h2>
+    <p style="color: var(--secondary-color);">
+        {% for status, count in counts %}{{ status }} : <strong>{{ count }}</strong>{% if not loop.last %} | {% endif %}{% endfor %}
+        {% if not transport %}<br><span class="status-suspendu">Aucun transport configuré (DELIVERY_TRANSPORT) : les livraisons restent en attente.</span>{% endif %}
+    </p>
+
+    <form method="GET" style="display: flex; gap: 10px; margin-bottom: 20px;">
+        <select name="statut" style="margin-bottom: 0; width: auto;">
+            <option value="">Tous les statuts</option>
+            {% for status, _ in counts %}<option value="{{ status }}" {% if status == current_status %}selected{% endif %}>{{ status }}</option>{% endfor %}
+        </select>
+        <button type="submit">Filtrer</button>
+    </form>
+
+    {% for delivery, pseudo in deliveries %}
+        <div class="user-list-item" style="display: flex; justify-content: space-between; align-items: center;">
+            <span>
+                #{{ delivery.id }} - {{ pseudo }} - <code>{{ delivery.commande }}</code> - {{ delivery.date_creation }}
+                - <span class="status-{{ 'actif' if delivery.status == 'Livrée' else ('banni' if delivery.status == 'Échec' else 'suspendu') }}">{{ delivery.status }}</span>
+                ({{ delivery.tentatives }} tentative(s){% if delivery.prochaine_tentative %}, prochaine : {{ delivery.prochaine_tentative }}{% endif %})
+                {% if delivery.derniere_erreur %}<br><small style="color: var(--error-color);">{{ delivery.derniere_erreur }}</small>{% endif %}
+            </span>
+            {% if delivery.status == 'Échec' %}
+            <form method="POST" style="margin: 0;">
+                <input type="hidden" name="delivery_id" value="{{ delivery.id }}">
+                <button type="submit" name="action" value="retry">Relancer</button>
+            </form>
+            {% endif %}
+        </div>
+    {% else %}
+        <p>Aucune livraison.</p>
+    {% endfor %}
+{% endblock %}
+""",
+
+    # 21. TEMPLATE : SESSIONS OUVERTES (Admin)
+    'sessions.html': """
+{% extends 'layout.html' %}
+{% block title %}Sessions ouvertes{% endblock %}
+{% block content %}
+    <h2 style="color: var(--error-color);">🔑 Sessions ouvertes</h2>
+    <p style="color: var(--secondary-color);">
+        {{ total }} session(s) ouverte(s) sur ce serveur{% if total > sessions|length %}, {{ sessions|length }} plus récemment actives affichées{% endif %}.
+        « Déconnecter partout » ferme aussi les sessions ouvertes sur les autres processus.
+    </p>
+
+    {% for session_id, state, user in sessions %}
+        <div class="user-list-item" style="display: flex; justify-content: space-between; align-items: center;">
+            <span>
+                {% if user %}<strong>{{ user.pseudo }}</strong> ({{ user.grade }}){% else %}Compte supprimé{% endif %}
+                - connecté le {{ state.created }} - vu le {{ state.last_seen }} - {{ state.ip or 'IP inconnue' }}
+                <br><small style="color: var(--secondary-color);">{{ state.user_agent|truncate(80) }}</small>
+            </span>
+            <form method="POST" style="margin: 0; display: flex; gap: 5px;">
+                <input type="hidden" name="session_id" value="{{ session_id }}">
+                <input type="hidden" name="user_id" value="{{ state.user_id }}">
+                <button type="submit" name="action" value="close">Fermer</button>
+                <button type="submit" name="action" value="close_user" style="background-color: var(--error-color);">Déconnecter partout</button>
+            </form>
+        </div>
+    {% else %}
+        <p>Aucune session ouverte.</p>
+    {% endfor %}
+{% endblock %}
+""",
+}
+
+# Feuilles de style et scripts servis comme fichiers statiques (voir build_assets) :
+# ils sont téléchargés une fois puis gardés en cache par le navigateur.
+MINIFY_ASSETS = True
+STATIC_ASSETS = {
+    'layout.css': """
+:root {
+    --primary-color: #39ff14; /* Vert Néon/Cyber */
+    --secondary-color: #909090; 
+    --success-color: #4CAF50;
+    --error-color: #FF4444;
+    --bg-color: #0d1117; /* Fond très sombre */
+    --container-bg: #161b22; /* Contenant légèrement plus clair */
+    --text-color: #f0f6fc; /* Texte blanc cassé */
+    --header-bg: #010409; 
+    --accent-color: #ffd700; /* Jaune Or */
+    --warning-color: #ffaa00; 
+    --gemme-color: #66CCFF; /* Bleu Ciel pour les Gemmes */
+    --shop-bg: #21262d; 
+    --border-color: #30363d;
+}
+body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; margin: 0; padding: 0; background-color: var(--bg-color); color: var(--text-color); min-height: 100vh; }
+header { background-color: var(--header-bg); color: white; padding: 1em 0; box-shadow: 0 4px 8px rgba(0,0,0,0.4); border-bottom: 2px solid var(--border-color); }
+.header-content { width: 90%; max-width: 1200px; margin: 0 auto; display: flex; justify-content: space-between; align-items: center; }
+header a { color: var(--text-color); margin: 0 10px; text-decoration: none; transition: color 0.3s, transform 0.2s; font-weight: 500; }
+header a:hover { color: var(--primary-color); transform: translateY(-1px); }
+
+/* Conteneur principal modernisé */
+.container { 
+    width: 90%; 
+    max-width: 800px; 
+    margin: 40px auto; 
+    background-color: var(--container-bg); 
+    padding: 30px 40px; 
+    border-radius: 12px; 
+    box-shadow: 0 8px 25px rgba(0,0,0,0.5); 
+    border: 1px solid var(--border-color); 
+}
+
+/* Titres */
+h2 { color: var(--primary-color); border-bottom: 2px solid var(--border-color); padding-bottom: 10px; margin-bottom: 25px; font-weight: 600; }
+
+/* Articles/Sections */
+.article, .shop-item, .user-list-item { 
+    background-color: var(--shop-bg); 
+    border: 1px solid var(--border-color); 
+    padding: 20px; 
+    margin-bottom: 15px; 
+    border-radius: 8px; 
+    box-shadow: 0 2px 5px rgba(0,0,0,0.3);
+}
+.article h3 { color: var(--accent-color); margin-top: 0; }
+
+/* Flash Messages */
+.flash { padding: 15px; margin-bottom: 20px; border-radius: 6px; font-weight: bold; border: 1px solid; animation: fadeIn 0.5s; }
+.flash.success { background-color: #1c3a1c; color: var(--success-color); border-color: #387c38; }
+.flash.error { background-color: #4a1c1c; color: var(--error-color); border-color: #8c3838; }
+
+/* Formulaires */
+input[type="text"], input[type="email"], input[type="password"], textarea, select, input[type="date"], input[type="time"], input[type="number"] { 
+    width: 100%; padding: 12px; 
+    border: 1px solid var(--border-color); 
+    border-radius: 6px; 
+    box-sizing: border-box; 
+    background-color: #21262d; /* Champ de saisie */
+    color: var(--text-color); 
+    margin-bottom: 15px;
+    transition: border-color 0.3s, box-shadow 0.3s;
+}
+input:focus, textarea:focus, select:focus {
+    border-color: var(--primary-color);
+    box-shadow: 0 0 5px rgba(57, 255, 20, 0.5);
+    outline: none;
+}
+label { display: block; margin-bottom: 5px; color: var(--secondary-color); font-size: 0.9em; }
+
+/* Boutons */
+button[type="submit"], .shop-buy-btn { 
+    background-color: var(--primary-color); 
+    color: #0d1117; /* Texte sombre sur bouton clair */
+    padding: 12px 25px; 
+    border: none; 
+    border-radius: 6px; 
+    cursor: pointer; 
+    font-weight: bold;
+    transition: background-color 0.3s, transform 0.2s, box-shadow 0.3s;
+    box-shadow: 0 4px 6px rgba(0,0,0,0.3);
+}
+button[type="submit"]:hover { 
+    background-color: #6eff33; 
+    transform: translateY(-2px);
+    box-shadow: 0 6px 10px rgba(0,0,0,0.4);
+}
+
+/* Shop */
+.shop-item { display: flex; justify-content: space-between; align-items: center; }
+.shop-price { font-size: 1.2em; font-weight: bold; color: var(--gemme-color); }
+.shop-buy-btn { background-color: var(--gemme-color); color: var(--header-bg); text-decoration: none; padding: 10px 20px; }
+.shop-buy-btn:hover { background-color: #99FFFF; }
+
+/* Statuts */
+.status-actif { color: var(--success-color); }
+.status-banni { color: var(--error-color); font-weight: bold; }
+.status-suspendu { color: var(--warning-color); font-weight: bold; }
+
+/* Animation */
+@keyframes fadeIn { from { opacity: 0; } to { opacity: 1; } }
+""",
+
+    'wiki.css': """
+.wiki-layout { 
+    display: flex; 
+    max-width: 1200px; 
+    margin: 0 auto; 
+    background-color: var(--container-bg); 
+    box-shadow: 0 0 15px rgba(0, 0, 0, 0.4); 
+    border-radius: 10px;
+}
+.sidebar-nav { 
+    width: 250px; 
+    background-color: #10141b; 
+    padding: 20px 0; 
+    flex-shrink: 0; 
+    border-right: 1px solid var(--border-color);
+    border-top-left-radius: 10px;
+    border-bottom-left-radius: 10px;
+}
+.sidebar-nav label { 
+    display: block; 
+    padding: 12px 20px; 
+    color: #d0d0d0; 
+    text-decoration: none; 
+    cursor: pointer; 
+    border-left: 3px solid transparent; 
+    transition: background-color 0.2s, border-left-color 0.2s; 
+}
+.sidebar-nav label:hover {
+    background-color: #161b22;
+}
+.tab-radio { display: none; }
+.wiki-section { display: none; }
+#radio-index:checked ~ .wiki-layout .sidebar-nav label[for="radio-index"], #radio-intro:checked ~ .wiki-layout .sidebar-nav label[for="radio-intro"], #radio-commands:checked ~ .wiki-layout .sidebar-nav label[for="radio-commands"], #radio-grades:checked ~ .wiki-layout .sidebar-nav label[for="radio-grades"], #radio-claim:checked ~ .wiki-layout .sidebar-nav label[for="radio-claim"], #radio-shops:checked ~ .wiki-layout .sidebar-nav label[for="radio-shops"] { 
+    border-left-color: var(--primary-color); 
+    background-color: var(--container-bg); 
+    color: var(--text-color); 
+    font-weight: bold; 
+}
+.content-wrapper { flex-grow: 1; padding: 40px; min-height: calc(100vh - 58px - 80px); }
+.code-example { background-color: #21262d; padding: 10px; border-radius: 4px; color: var(--primary-color); font-family: monospace; }
+.wiki-layout h3 { color: var(--accent-color); margin-top: 25px; border-top: 1px solid var(--border-color); padding-top: 15px; }
+""",
+
+    'admin.js': """
+function toggleSuspensionFields(status) {
+    var fields = document.getElementById('suspension-fields');
+    if (status === 'Suspendu') {
+        fields.style.display = 'block';
+    } else {
+        fields.style.display = 'none';
+    }
+}
+document.addEventListener('DOMContentLoaded', function() {
+    toggleSuspensionFields(document.getElementById('status').value);
+});
 """,
 }
 
 
-# #################################################################
-# 2. INITIALISATION ET ROUTES DE L'APPLICATION
-# #################################################################
+# #################################################################
+# 2. INITIALISATION ET ROUTES DE L'APPLICATION
+# #################################################################
+
+app = Flask(__name__)
+app.secret_key = 'votre_cle_secrete_longue_et_unique_pour_json' 
+app.jinja_env = Environment(loader=DictLoader(TEMPLATES))
+app.jinja_env.globals['url_for'] = url_for
+app.jinja_env.globals['session'] = session 
+app.jinja_env.globals['get_flashed_messages'] = get_flashed_messages
+
+def truncate(s, length, killwords=False):
+    if len(s) <= length:
+        return s
+    if killwords:
+        return s[:length] + '...'
+    words = s.split(' ')
+    result = ''
+    for word in words:
+        if len(result) + len(word) > length:
+            break
+        result += word + ' '
+    return result.strip() + '...'
+
+app.jinja_env.filters['truncate'] = truncate
+
+def render_template(template_name, **context):
+    """render_template de Flask, avec mesure du temps de rendu."""
+    with METRICS.timer('render'):
+        return flask_render_template(template_name, **context)
+
+# --- MESURES PAR REQUÊTE ---
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.phases = defaultdict(float)
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get('request_start')
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    endpoint = request.endpoint or 'inconnu'
+    METRICS.observe('heracraft_request_duration_seconds', {'endpoint': endpoint}, elapsed)
+    METRICS.increment('heracraft_requests_total', {'endpoint': endpoint, 'status': response.status_code})
+    if elapsed >= SLOW_REQUEST_THRESHOLD:
+        METRICS.increment('heracraft_slow_requests_total', {'endpoint': endpoint})
+        phases = ', '.join(f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in g.phases.items())
+        print(f"REQUÊTE LENTE : {request.method} {request.full_path.rstrip('?')} {elapsed * 1000:.1f} ms "
+              f"({phases or 'aucune phase mesurée'}, reste {(elapsed - sum(g.phases.values())) * 1000:.1f} ms)")
+    return response
+
+def discard_request_changes():
+    """Abandonne les modifications notées par la vue en cours (elle a échoué)."""
+    g.pop('unit_of_work', None)
+
+@app.errorhandler(InternalServerError)
+def internal_server_error(error):
+    # after_request s'exécute aussi sur la réponse d'erreur : les modifications de la vue ne sont pas enregistrées
+    discard_request_changes()
+    return error
+
+@app.after_request
+def commit_request_changes(response):
+    # Exécuté avant record_request_metrics (ordre inverse d'enregistrement) : l'écriture est mesurée
+    unit_of_work = g.pop('unit_of_work', None)
+    if unit_of_work is not None:
+        unit_of_work.commit()
+    return response
+
+# --- SESSIONS CÔTÉ SERVEUR ---
+
+SESSION_CACHE_SIZE = 10000
+
+class SessionStore:
+    """Sessions ouvertes dans ce processus (LRU), validées à chaque requête sans lecture disque.
+
+    Le cookie signé ne porte que l'id de session, l'id de l'utilisateur et la version
+    de ses droits (`session_version`) à la connexion. À chaque requête, l'utilisateur
+    est cherché dans STORE (en mémoire) : supprimé, banni, suspendu, ou dont la version
+    a changé (grade ou statut modifié, « déconnecter partout »), sa session est fermée.
+
+    Une session absente du cache (évincée, serveur redémarré, autre processus) est
+    réadmise si la version du cookie est toujours la bonne et qu'elle n'a pas été
+    fermée ici. Chaque processus ne connaît que ses sessions : fermer une session ne
+    vaut que pour ce processus, « déconnecter partout » (STORE.revoke_sessions) pour tous.
+    """
+
+    def __init__(self, max_entries=SESSION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._sessions = OrderedDict()
+        # Sessions fermées récemment : un cookie copié avant la fermeture n'est pas réadmis
+        self._closed = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def open(self, user):
+        """Ouvre une session pour `user` (pendant la requête de connexion) et renvoie son id."""
+        session_id = secrets.token_urlsafe(24)
+        with self._lock:
+            self._remember(session_id, user.id)
+        return session_id
+
+    def validate(self, session_id, user_id, version):
+        """Renvoie l'utilisateur de la session s'il y a toujours droit ; sinon ferme la session et renvoie None."""
+        user = STORE.get('users', user_id) if session_id else None
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if (user is None or user.status != UserStatus.ACTIF or version != (user.session_version or 0)
+                    or (state is None and session_id in self._closed)):
+                self._close(session_id)
+                return None
+            if state is None:
+                self._remember(session_id, user.id)
+            else:
+                self._sessions.move_to_end(session_id)
+                state['last_seen'], state['ip'] = current_time(), request.remote_addr
+        return user
+
+    def close(self, session_id):
+        """Ferme une session ; renvoie False si elle n'était pas ouverte dans ce processus."""
+        with self._lock:
+            return self._close(session_id)
+
+    def close_user(self, user_id):
+        """Ferme les sessions d'un utilisateur ouvertes dans ce processus et renvoie leur nombre."""
+        with self._lock:
+            session_ids = [session_id for session_id, state in self._sessions.items() if state['user_id'] == user_id]
+            for session_id in session_ids:
+                self._close(session_id)
+            return len(session_ids)
+
+    def recent(self, limit=SEARCH_RESULTS_LIMIT):
+        """Les `limit` sessions les plus récemment actives : [(id, état)], la plus récente d'abord."""
+        with self._lock:
+            items = reversed(self._sessions.items())
+            return [(session_id, dict(state)) for _, (session_id, state) in zip(range(limit), items)]
+
+    def _remember(self, session_id, user_id):
+        now = current_time()
+        self._sessions[session_id] = {
+            'user_id': user_id, 'created': now, 'last_seen': now,
+            'ip': request.remote_addr, 'user_agent': request.user_agent.string,
+        }
+        if len(self._sessions) > self.max_entries:
+            self._sessions.popitem(last=False)
+
+    def _close(self, session_id):
+        if session_id is None:
+            return False
+        self._closed[session_id] = True
+        if len(self._closed) > self.max_entries:
+            self._closed.popitem(last=False)
+        return self._sessions.pop(session_id, None) is not None
+
+SESSIONS = SessionStore()
+SESSION_KEYS = ('loggedin', 'id', 'grade', 'sid', 'version')
+
+def start_session(user):
+    """Connecte `user` : la session est ouverte côté serveur, le cookie n'en garde que l'id."""
+    session['loggedin'] = True
+    session['id'] = user.id
+    session['grade'] = user.grade
+    session['sid'] = SESSIONS.open(user)
+    session['version'] = user.session_version or 0
+
+def end_session():
+    SESSIONS.close(session.get('sid'))
+    for key in SESSION_KEYS:
+        session.pop(key, None)
+
+@app.before_request
+def check_session():
+    if not session.get('loggedin') or request.endpoint == 'static_asset':
+        return
+    user = SESSIONS.validate(session.get('sid'), session.get('id'), session.get('version'))
+    if user is None:
+        end_session()
+        flash('🔒 Votre session a été fermée (droits modifiés ou déconnexion par un administrateur). Reconnectez-vous.', 'error')
+    elif session.get('grade') != user.grade:
+        # Fichier de données modifié à la main : le grade en mémoire fait foi
+        session['grade'] = user.grade
+
+def _metrics_gauges():
+    gauges = []
+    for label, path in (('data', DATA_FILE), ('journal', JOURNAL_FILE), ('sqlite', SQLITE_FILE)):
+        if os.path.exists(path):
+            gauges.append(('heracraft_data_file_bytes', "Taille des fichiers de données.", {'file': label}, os.path.getsize(path)))
+    data = load_data()
+    for collection in COLLECTIONS:
+        gauges.append(('heracraft_records', "Nombre d'enregistrements par collection.", {'collection': collection}, len(data[collection])))
+    gauges.append(('heracraft_pending_suspensions', "Suspensions datées en attente d'expiration.", {}, len(STORE.suspensions)))
+    for status in DELIVERY_STATUSES:
+        gauges.append(('heracraft_deliveries', "Livraisons en jeu par statut (En attente = file d'attente).", {'status': status},
+                       len(STORE.deliveries_by_status.get(status, ()))))
+    gauges.append(('heracraft_delivery_oldest_pending_seconds', "Âge de la plus ancienne livraison en attente.", {}, _oldest_pending_delivery_age()))
+    return gauges
+
+def _oldest_pending_delivery_age():
+    pending = STORE.deliveries_by_status.get('En attente')
+    if not pending:
+        return 0
+    created = parse_date(STORE.get('deliveries', min(pending)).date_creation)
+    return max((datetime.now() - created).total_seconds(), 0) if created else 0
+
+# --- FICHIERS STATIQUES (CSS/JS) ---
+
+ASSET_MIMETYPES = {'.css': 'text/css', '.js': 'application/javascript'}
+
+def _minify_asset(name, source):
+    """Minification simple : commentaires, indentation et espaces autour de la ponctuation."""
+    if name.endswith('.css'):
+        source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+        source = re.sub(r'\s+', ' ', source)
+        source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+        return re.sub(r':\s+', ':', source).replace(';}', '}').strip()
+    return '\n'.join(line.strip() for line in source.splitlines() if line.strip())
+
+def build_assets(sources, minify=MINIFY_ASSETS):
+    """Prépare chaque fichier statique : nom avec empreinte du contenu, contenu et variante gzip."""
+    assets = {}
+    for name, source in sources.items():
+        body = (_minify_asset(name, source) if minify else source).encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        assets[name] = {
+            'filename': f"{stem}.{digest}{ext}",
+            'body': body,
+            'gzip': gzip.compress(body, 9),
+            'mimetype': ASSET_MIMETYPES.get(ext, 'application/octet-stream'),
+            'etag': digest,
+        }
+    return assets
+
+ASSETS = build_assets(STATIC_ASSETS)
+ASSETS_BY_FILENAME = {asset['filename']: asset for asset in ASSETS.values()}
+
+def asset_url(name):
+    """URL versionnée d'un fichier statique (change dès que son contenu change)."""
+    return url_for('static_asset', filename=ASSETS[name]['filename'])
+
+app.jinja_env.globals['asset_url'] = asset_url
+
+@app.route('/assets/<filename>')
+def static_asset(filename):
+    asset = ASSETS_BY_FILENAME.get(filename)
+    if asset is None:
+        abort(404)
+    use_gzip = request.accept_encodings['gzip'] > 0
+    response = make_response(asset['gzip'] if use_gzip else asset['body'])
+    response.mimetype = asset['mimetype']
+    if use_gzip:
+        response.content_encoding = 'gzip'
+    response.vary.add('Accept-Encoding')
+    # Le nom change avec le contenu : le navigateur peut garder le fichier indéfiniment
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.set_etag(asset['etag'])
+    return response.make_conditional(request)
+
+# --- CACHE DES PAGES RENDUES ---
+
+PAGE_CACHE_SIZE = 256
+
+class PageCache:
+    """Cache LRU des pages HTML rendues, clé = (chemin, connecté, grade).
+
+    Chaque entrée mémorise les compteurs de modification (STORE.generations) des
+    données dont elle dépend : elle n'est resservie que s'ils n'ont pas bougé, donc
+    une écriture concernée (nouvel article, nouvel objet de boutique, suppression
+    de compte...) l'invalide immédiatement.
+    """
+
+    def __init__(self, max_entries=PAGE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, versions):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['versions'] != versions:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, versions, body):
+        entry = {
+            'versions': versions,
+            'body': body,
+            'etag': hashlib.sha1(body.encode('utf-8')).hexdigest(),
+            'last_modified': datetime.now(timezone.utc).replace(microsecond=0),
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+PAGE_CACHE = PageCache()
+
+def cached_page(*dependencies, anonymous_only=False):
+    """Sert la page depuis PAGE_CACHE tant que les collections `dependencies` n'ont pas changé.
+
+    Les réponses portent un ETag et un Last-Modified : un navigateur qui renvoie
+    If-None-Match / If-Modified-Since reçoit un 304 sans corps.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Les messages flash et le contenu propre à un joueur connecté ne sont pas mis en cache
+            if request.method != 'GET' or session.get('_flashes') or (anonymous_only and session.get('loggedin')):
+                return view(*args, **kwargs)
+
+            key = (request.full_path, bool(session.get('loggedin')), session.get('grade'))
+            versions = STORE.generation_of(dependencies)
+            entry = PAGE_CACHE.get(key, versions)
+            if entry is None:
+                body = view(*args, **kwargs)
+                if not isinstance(body, str):
+                    return body
+                entry = PAGE_CACHE.put(key, versions, body)
+
+            response = make_response(entry['body'])
+            response.set_etag(entry['etag'])
+            response.last_modified = entry['last_modified']
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+def admin_user_listing():
+    """Variables communes des listes admin d'utilisateurs : recherche (?q=), tri, filtres et page."""
+    STORE.expire_suspensions()
+    query = request.args.get('q', '').strip()
+    sort = request.args.get('tri') if request.args.get('tri') in USER_SORT_KEYS else 'id'
+    descending = request.args.get('ordre') == 'desc'
+    status = request.args.get('statut') if request.args.get('statut') in USER_STATUSES else None
+    grade = request.args.get('grade') if request.args.get('grade') in USER_GRADES else None
+    page = max(request.args.get('page', 1, type=int), 1)
+    if query:
+        # La recherche renvoie au plus SEARCH_RESULTS_LIMIT utilisateurs : tri et filtres sur place
+        users = [u for u in STORE.search_users(query) if status in (None, u.status) and grade in (None, u.grade)]
+        users.sort(key=lambda u: UserViews._entry_of(u)[0][sort], reverse=descending)
+        total, page, page_count = len(users), 1, 1
+    else:
+        users, total = STORE.users_page(sort, descending, status, grade, (page - 1) * ADMIN_USERS_PER_PAGE, ADMIN_USERS_PER_PAGE)
+        page_count = max((total + ADMIN_USERS_PER_PAGE - 1) // ADMIN_USERS_PER_PAGE, 1)
+    # Seuls les paramètres différents des valeurs par défaut sont repris dans les liens de pagination
+    listing = {'q': query, 'tri': sort if sort != 'id' else '', 'ordre': 'desc' if descending else '', 'statut': status or '', 'grade': grade or ''}
+    listing = {key: value for key, value in listing.items() if value}
+    return {'users': users, 'query': query, 'listing': listing, 'total': total, 'page': page, 'page_count': page_count,
+            'statuses': USER_STATUSES, 'grades': USER_GRADES}
+
+def with_authors(articles):
+    """Associe chaque article à son auteur, pour afficher son pseudo et son grade."""
+    return [(article, get_user_by_id(article.auteur_id) or {'pseudo': 'Inconnu', 'grade': 'Visiteur'}) for article in articles]
+
+@app.errorhandler(PasswordPoolBusy)
+def password_pool_busy(error):
+    discard_request_changes()
+    flash('⏳ Le serveur est très sollicité, merci de réessayer dans quelques secondes.', 'error')
+    return redirect(request.path)
+
+# --- TÂCHES DE FOND ---
+
+class SuspensionScheduler:
+    """Thread qui réactive les comptes dès la fin de leur suspension.
+
+    Il dort jusqu'à la prochaine fin de suspension du tas de STORE (au plus
+    SUSPENSION_CHECK_INTERVAL secondes), et est réveillé quand une suspension plus
+    proche est posée.
+    """
+
+    def __init__(self, interval=SUSPENSION_CHECK_INTERVAL):
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='suspensions', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        STORE.suspensions.changed.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._stopping.clear()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            store = STORE
+            store.suspensions.changed.clear()
+            delay = self.interval
+            try:
+                expired = store.expire_suspensions()
+                if expired:
+                    print(f"Suspensions terminées, comptes réactivés : {', '.join(map(str, expired))}")
+                next_end = store.next_due(store.suspensions)
+                if next_end is not None:
+                    delay = min(delay, max((next_end - datetime.now()).total_seconds(), 0))
+            except Exception as e:
+                print(f"Erreur du planificateur de suspensions : {e}")
+            store.suspensions.changed.wait(delay)
+
+SUSPENSIONS = SuspensionScheduler()
+
+
+class DeliveryWorkers:
+    """Threads qui envoient les livraisons en attente au serveur de jeu, par lots.
+
+    Chaque thread réserve jusqu'à `batch_size` livraisons arrivées à échéance, les
+    envoie sur une seule connexion puis enregistre les résultats en une écriture ;
+    sans livraison à envoyer, il dort jusqu'à la prochaine tentative prévue ou
+    jusqu'au prochain achat. La réponse HTTP d'un achat n'attend jamais l'envoi.
+    """
+
+    def __init__(self, transport=None, workers=DELIVERY_WORKERS, batch_size=DELIVERY_BATCH_SIZE, interval=DELIVERY_POLL_INTERVAL):
+        self.transport = transport
+        self.workers = workers
+        self.batch_size = batch_size
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Démarre les threads ; renvoie False si aucun transport n'est configuré."""
+        if self._threads:
+            return True
+        if self.transport is None:
+            self.transport = create_delivery_transport()
+        if self.transport is None:
+            print("ATTENTION : DELIVERY_TRANSPORT n'est pas configuré, les achats restent en attente de livraison.")
+            return False
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'livraisons-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return True
+
+    def stop(self):
+        self._stopping.set()
+        STORE.pending_deliveries.changed.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._stopping.clear()
 
-app = Flask(__name__)
-app.secret_key = 'votre_cle_secrete_longue_et_unique_pour_json' 
-app.jinja_env = Environment(loader=DictLoader(TEMPLATES))
-app.jinja_env.globals['url_for'] = url_for
-app.jinja_env.globals['session'] = session 
-app.jinja_env.globals['get_flashed_messages'] = get_flashed_messages
+    def _run(self):
+        while not self._stopping.is_set():
+            store = STORE
+            store.pending_deliveries.changed.clear()
+            delay = self.interval
+            try:
+                if self._send_batch(store):
+                    continue
+                next_due = store.next_due(store.pending_deliveries)
+                if next_due is not None:
+                    delay = min(delay, max((next_due - datetime.now()).total_seconds(), 0.05))
+            except Exception as e:
+                print(f"Erreur de l'envoi des livraisons : {e}")
+            store.pending_deliveries.changed.wait(delay)
 
-def truncate(s, length, killwords=False):
-    if len(s) <= length:
-        return s
-    if killwords:
-        return s[:length] + '...'
-    words = s.split(' ')
-    result = ''
-    for word in words:
-        if len(result) + len(word) > length:
-            break
-        result += word + ' '
-    return result.strip() + '...'
+    def _send_batch(self, store):
+        batch = store.claim_deliveries(self.batch_size)
+        if not batch:
+            return False
+        start = time.perf_counter()
+        try:
+            results = self.transport.send_batch([delivery.commande for delivery in batch])
+        except Exception as e:
+            results = [(False, f"{type(e).__name__}: {e}")] * len(batch)
+        METRICS.observe('heracraft_delivery_batch_seconds', {}, time.perf_counter() - start)
+        delivered = store.finish_deliveries([(delivery.id, success, message)
+                                             for delivery, (success, message) in zip(batch, results)])
+        for result, label in ((True, 'ok'), (False, 'error')):
+            METRICS.increment('heracraft_delivery_attempts_total', {'result': label},
+                              sum(1 for success, _ in results if success is result))
+        now = datetime.now()
+        for delivery in delivered:
+            created = parse_date(delivery.date_creation)
+            if created is not None:
+                METRICS.observe('heracraft_delivery_latency_seconds', {}, max((now - created).total_seconds(), 0.0))
+        return True
 
-app.jinja_env.filters['truncate'] = truncate
+DELIVERIES = DeliveryWorkers()
+
+def start_background_tasks():
+    """Démarre les threads de fond du serveur (une seule fois, et dans un seul processus en mode MULTIPROCESS)."""
+    SUSPENSIONS.start()
+    DELIVERIES.start()
 
 # --- ROUTES PRINCIPALES (Fonctions inchangées) ---
 
 @app.route('/')
 @app.route('/accueil')
+@cached_page('articles', 'profiles')
 def accueil():
-    data = load_data() 
-    articles_display = []
-    users_map = {user['id']: user for user in data['users']}
-    articles_list = data['articles']
-    
-    for article in articles_list: 
-        author = users_map.get(article['auteur_id'], {'pseudo': 'Inconnu', 'grade': 'Visiteur'})
-        article_display = article.copy()
-        article_display['nom_auteur'] = author['pseudo']
-        article_display['grade_auteur'] = author['grade']
-        articles_display.append(article_display)
-        
-    articles_display.sort(key=lambda x: datetime.strptime(x['date_publication'], DATE_FORMAT), reverse=True)
-    
-    return render_template('accueil.html', articles=articles_display, page_id='accueil')
+    page = max(request.args.get('page', 1, type=int), 1)
+    articles_list, total = STORE.recent_articles((page - 1) * ARTICLES_PER_PAGE, ARTICLES_PER_PAGE)
+    page_count = max((total + ARTICLES_PER_PAGE - 1) // ARTICLES_PER_PAGE, 1)
+    return render_template('accueil.html', articles=with_authors(articles_list), page=page, page_count=page_count, page_id='accueil')
+
+@app.route('/recherche')
+def recherche():
+    query = request.args.get('q', '').strip()
+    articles_list, total = STORE.search_articles(query) if query else ([], 0)
+    return render_template('recherche.html', articles=with_authors(articles_list), total=total, query=query, page_id='recherche')
 
 @app.route('/wiki')
+@cached_page()
 def wiki():
     return render_template('wiki.html', page_id='wiki')
 
@@ -841,49 +3991,41 @@ def connexion():
     if request.method == 'POST':
         identifier = request.form['pseudo']
         password_attempt = request.form['mot_de_passe']
-        data = load_data()
-        
-        user = None
-        for u in data['users']:
-            if u['pseudo'] == identifier or u['email'] == identifier:
-                user = u
-                break
+        user = get_user_by_login(identifier)
         
-        if user and check_password_hash(user['password_hash'], password_attempt):
+        if user and verify_password(user.password_hash, password_attempt):
+            if password_needs_rehash(user.password_hash):
+                # Hachage d'une ancienne méthode/d'un coût différent : on le refait pendant qu'on a le mot de passe
+                user = edit_record(user)
+                user.password_hash = hash_password(password_attempt)
+                update_record('users', user)
+
             # VÉRIFICATION DU STATUT DU COMPTE
-            if user['status'] == 'Banni':
+            if user.status == 'Banni':
                 flash('❌ Votre compte est banni définitivement du site.', 'error')
                 return redirect(url_for('connexion'))
                 
-            if user['status'] == 'Suspendu':
-                end_date_str = user.get('suspension_end_date')
-                end_reason = user.get('suspension_reason', 'Raison non spécifiée.')
+            if user.status == 'Suspendu':
+                end_date = user.suspension_end_date
+                end_reason = user.suspension_reason or 'Raison non spécifiée.'
                 
-                if end_date_str:
-                    try:
-                        end_date = datetime.strptime(end_date_str, DATE_FORMAT)
-                        if datetime.now() < end_date:
-                            flash(f'⚠️ Votre compte est suspendu jusqu\'au {end_date_str} pour la raison suivante : "{end_reason}"', 'error')
-                            return redirect(url_for('connexion'))
-                        else:
-                            # La suspension est terminée, on réactive le compte
-                            user['status'] = 'Actif'
-                            user['suspension_reason'] = None
-                            user['suspension_end_date'] = None
-                            save_data(data)
-                            flash('✅ Votre suspension est terminée. Votre compte est réactivé.', 'success')
-                    except ValueError:
+                if end_date:
+                    # Normalement déjà fait par le planificateur ; sinon on réactive ici les suspensions échues
+                    if user.id in STORE.expire_suspensions():
+                        flash('✅ Votre suspension est terminée. Votre compte est réactivé.', 'success')
+                    elif parse_date(end_date) is None:
                         flash('⚠️ Votre compte est suspendu mais la date de fin est invalide. Contactez un administrateur.', 'error')
                         return redirect(url_for('connexion'))
+                    else:
+                        flash(f'⚠️ Votre compte est suspendu jusqu\'au {end_date} pour la raison suivante : "{end_reason}"', 'error')
+                        return redirect(url_for('connexion'))
                 else:
                     flash(f'⚠️ Votre compte est suspendu pour une durée indéterminée. Raison : "{end_reason}"', 'error')
                     return redirect(url_for('connexion'))
 
 
-            session['loggedin'] = True
-            session['id'] = user['id']
-            session['grade'] = user['grade']
-            flash(f"👋 Bienvenue ! Vous êtes connecté en tant que **{user['grade']}**.", 'success')
+            start_session(user)
+            flash(f"👋 Bienvenue ! Vous êtes connecté en tant que **{user.grade}**.", 'success')
             return redirect(url_for('accueil'))
         else:
             flash('❌ Pseudo/Email ou mot de passe incorrect.', 'error')
@@ -896,29 +4038,22 @@ def inscription():
         pseudo = request.form['pseudo']
         email = request.form['email']
         password = request.form['mot_de_passe']
-        hashed_password = generate_password_hash(password)
-        data = load_data()
-        
-        if any(u['pseudo'] == pseudo or u['email'] == email for u in data['users']):
+        # Vérifié avant le hachage (coûteux), puis de nouveau sous le verrou par insert_user
+        taken = STORE.find_user(pseudo=pseudo) or STORE.find_user(email=email)
+        if not taken:
+            hashed_password = hash_password(password)
+            new_user = User(
+                pseudo=pseudo,
+                email=email,
+                password_hash=hashed_password,
+                grade=Grade.MEMBRE,
+                status=UserStatus.ACTIF,
+                gemmes=0
+            )
+            taken = STORE.insert_user(new_user) is None
+        if taken:
             flash('❌ Ce pseudo ou cet email est déjà utilisé.', 'error')
         else:
-            data['last_user_id'] += 1
-            new_id = data['last_user_id']
-            
-            new_user = {
-                "id": new_id,
-                "pseudo": pseudo,
-                "email": email,
-                "password_hash": hashed_password,
-                "grade": "Membre",
-                "status": "Actif", 
-                "suspension_reason": None,
-                "suspension_end_date": None,
-                "gemmes": 0 
-            }
-            data['users'].append(new_user)
-            save_data(data)
-            
             flash('✅ Inscription réussie ! Vous pouvez vous connecter.', 'success')
             return redirect(url_for('connexion'))
             
@@ -926,9 +4061,7 @@ def inscription():
 
 @app.route('/deconnexion')
 def deconnexion():
-    session.pop('loggedin', None)
-    session.pop('id', None)
-    session.pop('grade', None)
+    end_session()
     flash('👋 Vous êtes déconnecté.', 'success')
     return redirect(url_for('accueil'))
 
@@ -948,7 +4081,7 @@ def mon_compte():
         new_password = request.form['nouveau_mot_de_passe']
         confirm_password = request.form['confirmation_nouveau_mot_de_passe']
 
-        if not check_password_hash(user['password_hash'], old_password_attempt):
+        if not verify_password(user.password_hash, old_password_attempt):
             flash('❌ Ancien mot de passe incorrect. Le mot de passe n\'a pas été modifié.', 'error')
             return redirect(url_for('mon_compte'))
 
@@ -956,15 +4089,11 @@ def mon_compte():
             flash('❌ Les nouveaux mots de passe ne correspondent pas.', 'error')
             return redirect(url_for('mon_compte'))
 
-        hashed_new_password = generate_password_hash(new_password)
-        
-        data = load_data()
-        for u in data['users']:
-            if u['id'] == user_id:
-                u['password_hash'] = hashed_new_password
-                break
+        hashed_new_password = hash_password(new_password)
         
-        save_data(data)
+        user = edit_record(user)
+        user.password_hash = hashed_new_password
+        update_record('users', user)
         
         flash('✅ Votre mot de passe a été mis à jour avec succès.', 'success')
         return redirect(url_for('mon_compte'))
@@ -982,20 +4111,14 @@ def creer_article():
         contenu = request.form['contenu']
         auteur_id = session['id']
         
-        data = load_data()
-        data['last_article_id'] += 1
-        new_id = data['last_article_id']
-
-        new_article = {
-            "id": new_id,
-            "titre": titre,
-            "contenu": contenu,
-            "auteur_id": auteur_id,
-            "date_publication": datetime.now().strftime(DATE_FORMAT)
-        }
+        new_article = Article(
+            titre=titre,
+            contenu=contenu,
+            auteur_id=auteur_id,
+            date_publication=current_time()
+        )
         
-        data['articles'].append(new_article)
-        save_data(data)
+        insert_record('articles', new_article, 'last_article_id')
         
         flash('✅ Article créé et publié !', 'success')
         return redirect(url_for('accueil'))
@@ -1005,11 +4128,12 @@ def creer_article():
 # --- ROUTES SHOP (Fonctions inchangées) ---
 
 @app.route('/shop')
+@cached_page('shop_items', anonymous_only=True)
 def shop():
     data = load_data()
     user = get_user_by_id(session.get('id')) if session.get('loggedin') else None
     
-    items_list = sorted(data['shop_items'], key=lambda x: x['id'])
+    items_list = sorted(data['shop_items'], key=lambda x: x.id)
     
     return render_template('shop.html', items=items_list, user=user, page_id='shop')
 
@@ -1019,36 +4143,93 @@ def acheter_article_shop(item_id):
         flash('⛔ Vous devez être connecté pour effectuer un achat.', 'error')
         return redirect(url_for('connexion'))
 
-    data = load_data()
-    user_id = session['id']
-    user_index = next((i for i, u in enumerate(data['users']) if u['id'] == user_id), -1)
-    user = data['users'][user_index]
-    
-    item = next((i for i in data['shop_items'] if i['id'] == item_id), None)
+    user = get_user_by_id(session['id'])
+    item = get_shop_item_by_id(item_id)
 
     if not item:
         flash('❌ Article non trouvé dans la boutique.', 'error')
         return redirect(url_for('shop'))
         
-    price = item['prix_gemmes']
+    price = item.prix_gemmes
     
-    if user['status'] != 'Actif':
+    if user.status != 'Actif':
         flash('❌ Vous ne pouvez pas acheter d\'articles si votre compte est Banni ou Suspendu.', 'error')
         return redirect(url_for('shop'))
 
-    if user['gemmes'] >= price:
-        user['gemmes'] -= price
-        
-        # LOGIQUE D'ATTRIBUTION D'OBJET ICI
-        
-        flash(f'✅ Achat réussi ! {item["nom"]} acheté pour {price} 💎. (Nouveau solde : {user["gemmes"]} Gemmes). L\'article vous sera livré en jeu sous peu.', 'success')
-        save_data(data)
+    # Le débit et la livraison en jeu sont enregistrés ensemble ; l'envoi est fait en arrière-plan
+    success, balance, _ = STORE.purchase(user.id, item, item.commande or DELIVERY_COMMAND)
+    if success:
+        flash(f'✅ Achat réussi ! {item.nom} acheté pour {price} 💎. (Nouveau solde : {balance} Gemmes). L\'article vous sera livré en jeu sous peu.', 'success')
     else:
-        flash(f'❌ Achat échoué. Solde de Gemmes insuffisant. Il vous manque {price - user["gemmes"]} 💎 pour acheter {item["nom"]}.', 'error')
+        flash(f'❌ Achat échoué. Solde de Gemmes insuffisant. Il vous manque {price - balance} 💎 pour acheter {item.nom}.', 'error')
     
     return redirect(url_for('shop'))
 
 
+# --- ROUTES ADMIN (MESURES) ---
+
+@app.route('/admin/metrics')
+def admin_metrics():
+    token_ok = METRICS_TOKEN and request.headers.get('Authorization') == f'Bearer {METRICS_TOKEN}'
+    if not token_ok and (not session.get('loggedin') or session.get('grade') != 'Administrateur'):
+        abort(403)
+    return Response(METRICS.render(_metrics_gauges()), mimetype='text/plain; version=0.0.4')
+
+
+# --- ROUTES ADMIN (LIVRAISONS EN JEU) ---
+
+@app.route('/admin/livraisons', methods=['GET', 'POST'])
+def gestion_livraisons():
+    if not session.get('loggedin') or session.get('grade') != 'Administrateur':
+        flash('⛔ Accès refusé. Seuls les Administrateurs peuvent suivre les livraisons.', 'error')
+        return redirect(url_for('accueil'))
+
+    if request.method == 'POST' and request.form.get('action') == 'retry':
+        delivery_id = request.form.get('delivery_id', type=int)
+        if delivery_id is not None and STORE.retry_delivery(delivery_id):
+            flash(f'✅ La livraison #{delivery_id} est de nouveau en attente.', 'success')
+        else:
+            flash('❌ Seule une livraison en échec peut être relancée.', 'error')
+        return redirect(url_for('gestion_livraisons', **request.args))
+
+    current_status = request.args.get('statut') if request.args.get('statut') in DELIVERY_STATUSES else None
+    deliveries = []
+    for delivery in STORE.recent_deliveries(current_status):
+        user = get_user_by_id(delivery.user_id)
+        deliveries.append((delivery, user.pseudo if user else 'Compte supprimé'))
+    counts = [(status, len(STORE.deliveries_by_status.get(status, ()))) for status in DELIVERY_STATUSES]
+    return render_template('gestion_livraisons.html', deliveries=deliveries, counts=counts, current_status=current_status,
+                           transport=bool(DELIVERY_TRANSPORT or DELIVERIES.transport), page_id='gestion_livraisons')
+
+
+# --- ROUTES ADMIN (SESSIONS) ---
+
+@app.route('/admin/sessions', methods=['GET', 'POST'])
+def gestion_sessions():
+    if not session.get('loggedin') or session.get('grade') != 'Administrateur':
+        flash('⛔ Accès refusé. Seuls les Administrateurs peuvent gérer les sessions.', 'error')
+        return redirect(url_for('accueil'))
+
+    if request.method == 'POST':
+        action = request.form.get('action')
+        user_id = request.form.get('user_id', type=int)
+        if action == 'close':
+            if SESSIONS.close(request.form.get('session_id')):
+                flash('✅ Session fermée.', 'success')
+            else:
+                flash('❌ Cette session est déjà fermée.', 'error')
+        elif action == 'close_user' and user_id is not None:
+            SESSIONS.close_user(user_id)
+            if STORE.revoke_sessions(user_id):
+                flash(f'✅ {get_user_by_id(user_id).pseudo} est déconnecté de toutes ses sessions.', 'success')
+            else:
+                flash('❌ Utilisateur introuvable.', 'error')
+        return redirect(url_for('gestion_sessions'))
+
+    sessions = [(session_id, state, get_user_by_id(state['user_id'])) for session_id, state in SESSIONS.recent()]
+    return render_template('sessions.html', sessions=sessions, total=len(SESSIONS), page_id='gestion_sessions')
+
+
 # --- ROUTES ADMIN (SHOP - Fonction inchangée) ---
 
 @app.route('/admin/ajouter_article_shop', methods=['GET', 'POST'])
@@ -1069,26 +4250,28 @@ def ajouter_article_shop():
         except ValueError:
             flash('❌ Le prix des Gemmes doit être un nombre entier valide.', 'error')
             return redirect(url_for('ajouter_article_shop'))
+
+        commande = request.form.get('commande', '').strip()
+        try:
+            commande.format(pseudo='', item_id=0, nom='', delivery_id=0)
+        except (KeyError, IndexError, ValueError):
+            flash('❌ Commande de livraison invalide : seules {pseudo}, {item_id}, {nom} et {delivery_id} sont reconnues.', 'error')
+            return redirect(url_for('ajouter_article_shop'))
             
-        data = load_data()
-        data['last_shop_item_id'] += 1
-        new_id = data['last_shop_item_id']
+        new_item = ShopItem(
+            nom=nom,
+            description=description,
+            prix_gemmes=prix_gemmes,
+            date_ajout=current_time(),
+            commande=commande or None
+        )
         
-        new_item = {
-            "id": new_id,
-            "nom": nom,
-            "description": description,
-            "prix_gemmes": prix_gemmes,
-            "date_ajout": datetime.now().strftime(DATE_FORMAT)
-        }
-        
-        data['shop_items'].append(new_item)
-        save_data(data)
+        insert_record('shop_items', new_item, 'last_shop_item_id')
         
         flash(f'✅ Article {nom} ajouté à la boutique pour {prix_gemmes} 💎.', 'success')
         return redirect(url_for('shop'))
         
-    return render_template('ajouter_article_shop.html', page_id='ajouter_article_shop')
+    return render_template('ajouter_article_shop.html', default_command=DELIVERY_COMMAND, page_id='ajouter_article_shop')
 
 # --- ROUTES ADMIN (GRANDS ET MOT DE PASSE - Fonctions inchangées) ---
 
@@ -1098,10 +4281,7 @@ def gestion_utilisateurs():
         flash('⛔ Accès refusé. Seuls les Administrateurs peuvent gérer les utilisateurs.', 'error')
         return redirect(url_for('accueil'))
     
-    data = load_data()
-    users_list = [u for u in data['users'] if u['id'] != session.get('id')]
-    
-    return render_template('gestion_utilisateurs.html', users=users_list, page_id='gestion_utilisateurs')
+    return render_template('gestion_utilisateurs.html', page_id='gestion_utilisateurs', **admin_user_listing())
 
 @app.route('/admin/modifier_utilisateur/<int:user_id>', methods=['GET', 'POST'])
 def modifier_utilisateur(user_id):
@@ -1110,28 +4290,25 @@ def modifier_utilisateur(user_id):
         return redirect(url_for('accueil'))
 
     user_to_modify = get_user_by_id(user_id)
-    if not user_to_modify or user_to_modify['id'] == session.get('id'):
+    if not user_to_modify or user_to_modify.id == session.get('id'):
         flash('❌ Utilisateur non trouvé ou vous ne pouvez pas modifier votre propre grade/mdp via cette page.', 'error')
         return redirect(url_for('gestion_utilisateurs'))
 
     if request.method == 'POST':
         action = request.form.get('action')
-        data = load_data()
-        
-        user_index = next((i for i, user in enumerate(data['users']) if user['id'] == user_id), -1)
-        user = data['users'][user_index]
+        user = edit_record(user_to_modify)
         
         if action == 'update_grade':
             new_grade = request.form.get('grade')
             
-            if new_grade not in ['Membre', 'Administrateur']:
+            if new_grade not in USER_GRADES:
                 flash('❌ Grade invalide.', 'error')
                 return redirect(url_for('modifier_utilisateur', user_id=user_id))
             
-            user['grade'] = new_grade
-            save_data(data)
+            user.grade = Grade(new_grade)
+            update_record('users', user)
             
-            flash(f'✅ Le grade de {user_to_modify["pseudo"]} a été mis à jour à {new_grade}.', 'success')
+            flash(f'✅ Le grade de {user_to_modify.pseudo} a été mis à jour à {new_grade}.', 'success')
             return redirect(url_for('gestion_utilisateurs'))
             
         elif action == 'reset_password':
@@ -1142,11 +4319,11 @@ def modifier_utilisateur(user_id):
                 flash('❌ Les nouveaux mots de passe ne correspondent pas.', 'error')
                 return redirect(url_for('modifier_utilisateur', user_id=user_id))
 
-            hashed_new_password = generate_password_hash(new_password)
-            user['password_hash'] = hashed_new_password
-            save_data(data)
+            hashed_new_password = hash_password(new_password)
+            user.password_hash = hashed_new_password
+            update_record('users', user)
 
-            flash(f'⚠️ Le mot de passe de {user_to_modify["pseudo"]} a été réinitialisé avec succès par l\'administrateur.', 'error') 
+            flash(f'⚠️ Le mot de passe de {user_to_modify.pseudo} a été réinitialisé avec succès par l\'administrateur.', 'error') 
             return redirect(url_for('modifier_utilisateur', user_id=user_id))
         
         else:
@@ -1163,10 +4340,7 @@ def gerer_comptes_admin():
         flash('⛔ Accès refusé. Seuls les Administrateurs peuvent gérer les comptes.', 'error')
         return redirect(url_for('accueil'))
     
-    data = load_data()
-    users_list = data['users']
-    
-    return render_template('gerer_comptes_admin.html', users=users_list, page_id='gerer_comptes_admin')
+    return render_template('gerer_comptes_admin.html', page_id='gerer_comptes_admin', **admin_user_listing())
 
 @app.route('/admin/gerer_compte/<int:user_id>', methods=['GET', 'POST'])
 def gerer_compte_detail(user_id):
@@ -1179,24 +4353,20 @@ def gerer_compte_detail(user_id):
         flash('❌ Utilisateur non trouvé.', 'error')
         return redirect(url_for('gerer_comptes_admin'))
     
-    if user_to_modify['id'] == session.get('id') and request.method == 'POST':
+    if user_to_modify.id == session.get('id') and request.method == 'POST':
         flash('❌ Vous ne pouvez pas modifier votre propre statut ou supprimer votre compte via cette page.', 'error')
         return redirect(url_for('gerer_comptes_admin'))
 
 
     if request.method == 'POST':
         action = request.form.get('action')
-        data = load_data()
-        
-        user_index = next((i for i, user in enumerate(data['users']) if user['id'] == user_id), -1)
-        user = data['users'][user_index] 
+        user = edit_record(user_to_modify)
 
         if action == 'delete_account':
-            data['articles'] = [a for a in data['articles'] if a['auteur_id'] != user_id]
-            del data['users'][user_index]
-            save_data(data)
+            delete_records('articles', [a.id for a in get_articles_by_author(user_id)])
+            delete_records('users', [user_id])
             
-            flash(f'🗑️ Le compte de {user["pseudo"]} a été supprimé définitivement.', 'success')
+            flash(f'🗑️ Le compte de {user.pseudo} a été supprimé définitivement.', 'success')
             return redirect(url_for('gerer_comptes_admin'))
 
         elif action == 'update_status':
@@ -1205,28 +4375,31 @@ def gerer_compte_detail(user_id):
             
             suspension_end = None
             
+            if new_status not in USER_STATUSES:
+                flash('❌ Statut invalide.', 'error')
+                return redirect(url_for('gerer_compte_detail', user_id=user_id))
+
             if new_status == 'Suspendu':
                 date_part = request.form.get('suspension_date')
                 time_part = request.form.get('suspension_time', '00:00:00')
                 if date_part:
                     try:
-                        suspension_end = datetime.strptime(f"{date_part} {time_part}", "%Y-%m-%d %H:%M:%S").strftime(DATE_FORMAT)
+                        suspension_end = datetime.strptime(f"{date_part} {time_part}", "%Y-%m-%d %H:%M:%S")
                     except ValueError:
                         flash('❌ Format de date ou d\'heure invalide pour la suspension.', 'error')
                         return redirect(url_for('gerer_compte_detail', user_id=user_id))
             
-            user['status'] = new_status
-            user['suspension_reason'] = reason if new_status != 'Actif' else None 
-            user['suspension_end_date'] = suspension_end
-            save_data(data)
+            user.status = UserStatus(new_status)
+            user.suspension_reason = reason if new_status != 'Actif' else None 
+            user.suspension_end_date = suspension_end
+            update_record('users', user)
             
-            flash(f'✅ Le statut de {user["pseudo"]} est maintenant {new_status}.', 'success')
+            flash(f'✅ Le statut de {user.pseudo} est maintenant {new_status}.', 'success')
             return redirect(url_for('gerer_compte_detail', user_id=user_id))
         
         else:
             flash('❌ Action inconnue.', 'error')
 
-    user_to_modify = get_user_by_id(user_id)
     return render_template('gerer_compte_detail.html', user=user_to_modify, page_id='gerer_compte_detail')
 
 
@@ -1236,10 +4409,37 @@ def gestion_gemmes():
         flash('⛔ Accès refusé. Seuls les Administrateurs peuvent gérer les gemmes.', 'error')
         return redirect(url_for('accueil'))
     
-    data = load_data()
-    users_list = data['users'] 
-    
-    return render_template('gestion_gemmes.html', users=users_list, page_id='gestion_gemmes')
+    return render_template('gestion_gemmes.html', page_id='gestion_gemmes', **admin_user_listing())
+
+@app.route('/admin/gemmes_en_masse', methods=['GET', 'POST'])
+def gemmes_en_masse():
+    if not session.get('loggedin') or session.get('grade') != 'Administrateur':
+        flash('⛔ Accès refusé. Seuls les Administrateurs peuvent gérer les gemmes.', 'error')
+        return redirect(url_for('accueil'))
+
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('fichier')
+        if upload and upload.filename:
+            content, filename = upload.read().decode('utf-8-sig'), upload.filename
+        else:
+            content, filename = request.form.get('contenu', ''), ''
+        try:
+            rows = read_gem_adjustments(content, filename)
+        except (ValueError, csv.Error) as e:
+            flash(f'❌ Fichier illisible : {e}', 'error')
+            return redirect(url_for('gemmes_en_masse'))
+
+        applied, report = apply_gem_adjustments(rows, dry_run=bool(request.form.get('simulation')))
+        errors = sum(1 for line in report if line['erreur'])
+        if applied:
+            flash(f'💎 Lot appliqué : {len(report)} ajustements enregistrés.', 'success')
+        elif errors:
+            flash(f'❌ Lot refusé : {errors} ligne(s) invalide(s), aucun solde n\'a été modifié.', 'error')
+        else:
+            flash(f'✅ Simulation : les {len(report)} lignes sont valides.', 'success')
+
+    return render_template('gemmes_en_masse.html', report=report, page_id='gemmes_en_masse')
 
 @app.route('/admin/gerer_gemmes/<int:user_id>', methods=['GET', 'POST'])
 def gerer_gemmes_detail(user_id):
@@ -1256,9 +4456,7 @@ def gerer_gemmes_detail(user_id):
         action = request.form.get('action')
         
         if action == 'update_gemmes':
-            data = load_data()
-            user_index = next((i for i, user in enumerate(data['users']) if user['id'] == user_id), -1)
-            user = data['users'][user_index] 
+            user = user_to_modify
             
             try:
                 gemmes_amount = int(request.form.get('gemmes_amount'))
@@ -1269,16 +4467,14 @@ def gerer_gemmes_detail(user_id):
                     return redirect(url_for('gerer_gemmes_detail', user_id=user_id))
 
                 if operation == 'add':
-                    user['gemmes'] += gemmes_amount
-                    flash(f'💎 {gemmes_amount} Gemmes ajoutées à {user["pseudo"]}. Nouveau solde : {user["gemmes"]}.', 'success')
+                    balance = credit_gemmes(user_id, gemmes_amount)
+                    flash(f'💎 {gemmes_amount} Gemmes ajoutées à {user.pseudo}. Nouveau solde : {balance}.', 'success')
                 elif operation == 'remove':
-                    user['gemmes'] = max(0, user['gemmes'] - gemmes_amount) 
-                    flash(f'💎 {gemmes_amount} Gemmes retirées de {user["pseudo"]}. Nouveau solde : {user["gemmes"]}.', 'success')
+                    _, balance = debit_gemmes(user_id, gemmes_amount, clamp=True)
+                    flash(f'💎 {gemmes_amount} Gemmes retirées de {user.pseudo}. Nouveau solde : {balance}.', 'success')
                 else:
                     flash('❌ Opération de gemmes invalide.', 'error')
                     return redirect(url_for('gerer_gemmes_detail', user_id=user_id))
-
-                save_data(data)
             except ValueError:
                 flash('❌ Le montant des gemmes doit être un nombre entier valide.', 'error')
             
@@ -1287,12 +4483,1226 @@ def gerer_gemmes_detail(user_id):
     return render_template('gerer_gemmes_detail.html', user=user_to_modify, page_id='gerer_gemmes_detail')
 
 
+# --- SERVEUR ASYNCHRONE (ASGI) ---
+
+class AsgiAdapter:
+    """Expose l'application Flask (WSGI) en ASGI.
+
+    Le corps de la requête est lu et la réponse envoyée sur la boucle d'événements ;
+    l'appel à Flask, donc tout ce qui bloque (fichiers de données, SQLite, hachage,
+    rendu), s'exécute dans un pool de ASYNC_WORKERS threads. Un client lent n'occupe
+    ainsi un thread que le temps du traitement, pas celui de la connexion.
+    """
+
+    def __init__(self, wsgi_app, workers=ASYNC_WORKERS, background_tasks=True):
+        self.wsgi_app = wsgi_app
+        self.workers = workers
+        self.background_tasks = background_tasks
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='asgi')
+        return self._executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        body = bytearray()
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+        environ = self._environ(scope, bytes(body))
+        loop = asyncio.get_running_loop()
+        status, headers, content = await loop.run_in_executor(self.executor, self._run_wsgi, environ)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': content})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def startup(self):
+        await asyncio.get_running_loop().run_in_executor(self.executor, load_data)
+        if self.background_tasks:
+            start_background_tasks()
+
+    async def shutdown(self):
+        if self.background_tasks:
+            SUSPENSIONS.stop()
+            DELIVERIES.stop()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    @staticmethod
+    def _environ(scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0], 'SERVER_PORT': str(server[1]),
+            'REMOTE_ADDR': client[0], 'REMOTE_PORT': str(client[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'wsgi.version': (1, 0), 'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': BytesIO(body), 'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+            if key in environ:
+                value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+            environ[key] = value
+        return environ
+
+    def _run_wsgi(self, environ):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], content
+
+asgi_app = AsgiAdapter(app)
+
+
+class AsyncHttpServer:
+    """Petit serveur HTTP/1.1 asyncio qui sert une application ASGI (quand uvicorn n'est pas installé).
+
+    Connexions persistantes, corps de requête avec Content-Length uniquement ; un
+    client qui met plus de ASYNC_HEADER_TIMEOUT secondes à envoyer ses en-têtes est
+    déconnecté.
+    """
+
+    def __init__(self, asgi, host='127.0.0.1', port=5000):
+        self.asgi = asgi
+        self.host = host
+        self.port = port
+        self._loop = None
+        self._stopping = None
+
+    async def serve(self, ready=None):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        server = await asyncio.start_server(self._handle, self.host, self.port, limit=64 * 1024)
+        self.port = server.sockets[0].getsockname()[1]
+        if hasattr(self.asgi, 'startup'):
+            await self.asgi.startup()
+        if ready is not None:
+            ready.set()
+        async with server:
+            await self._stopping.wait()
+        if hasattr(self.asgi, 'shutdown'):
+            await self.asgi.shutdown()
+
+    def start_in_thread(self):
+        """Démarre le serveur dans un thread (bancs d'essai) ; renvoie le port d'écoute."""
+        ready = threading.Event()
+        self._thread = threading.Thread(target=lambda: asyncio.run(self.serve(ready)), name='serveur-async', daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self.port
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._stopping.set)
+        self._thread.join()
+
+    async def _handle(self, reader, writer):
+        peer = writer.get_extra_info('peername') or ('', 0)
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), ASYNC_HEADER_TIMEOUT)
+                except asyncio.IncompleteReadError:
+                    return
+                lines = head.decode('latin-1').split('\r\n')
+                method, target, version = lines[0].split(' ')
+                headers = [line.split(':', 1) for line in lines[1:] if line]
+                headers = [(name.strip().lower(), value.strip()) for name, value in headers]
+                fields = dict(headers)
+                if 'chunked' in fields.get('transfer-encoding', ''):
+                    await self._reply(writer, 411, b'Length Required', keep_alive=False)
+                    return
+                length = int(fields.get('content-length', 0))
+                if length > ASYNC_MAX_BODY:
+                    await self._reply(writer, 413, b'Payload Too Large', keep_alive=False)
+                    return
+                body = await reader.readexactly(length) if length else b''
+                path, _, query = target.partition('?')
+                scope = {
+                    'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': version.split('/')[-1],
+                    'method': method, 'scheme': 'http', 'path': unquote(path), 'raw_path': path.encode('latin-1'),
+                    'query_string': query.encode('latin-1'), 'root_path': '',
+                    'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+                    'server': (self.host, self.port), 'client': peer[:2],
+                }
+                keep_alive = version == 'HTTP/1.1' and fields.get('connection', '').lower() != 'close'
+                response = {}
+                received = False
+
+                async def receive():
+                    nonlocal received
+                    if received:
+                        return {'type': 'http.disconnect'}
+                    received = True
+                    return {'type': 'http.request', 'body': body, 'more_body': False}
+
+                async def send(message):
+                    if message['type'] == 'http.response.start':
+                        response['status'], response['headers'] = message['status'], message.get('headers', [])
+                    else:
+                        response.setdefault('body', []).append(message.get('body', b''))
+
+                await self.asgi(scope, receive, send)
+                await self._reply(writer, response['status'], b''.join(response.get('body', [])), response['headers'], keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.TimeoutError, asyncio.LimitOverrunError, ValueError, ConnectionError):
+            return
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _reply(writer, status, body, headers=(), keep_alive=True):
+        lines = [f"HTTP/1.1 {status} {HTTP_STATUS_CODES.get(status, '')}".encode('latin-1')]
+        lines += [name + b': ' + value for name, value in headers if name not in (b'content-length', b'connection')]
+        lines.append(b'Content-Length: ' + str(len(body)).encode())
+        lines.append(b'Connection: ' + (b'keep-alive' if keep_alive else b'close'))
+        writer.write(b'\r\n'.join(lines) + b'\r\n\r\n' + body)
+        await writer.drain()
+
+
+def serve_workers(workers=2, host='127.0.0.1', port=5000):
+    """Lance `workers` processus (serveur WSGI à threads) sur le même port, en mode MULTIPROCESS.
+
+    Le port est ouvert une fois puis partagé par fork ; seul le premier processus
+    lance les tâches de fond (suspensions, livraisons).
+    """
+    global MULTIPROCESS
+    from werkzeug.serving import make_server
+    MULTIPROCESS = True
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+    children = []
+    for number in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                server = make_server(host, port, app, threaded=True, fd=listener.fileno())
+                if number == 0:
+                    start_background_tasks()
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.append(pid)
+    print(f"{workers} processus à l'écoute sur http://{host}:{port}/ (pid {', '.join(map(str, children))})")
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+def serve_async(host='127.0.0.1', port=5000):
+    """Sert l'application en mode asynchrone : avec uvicorn s'il est installé, sinon avec AsyncHttpServer."""
+    try:
+        import uvicorn
+    except ImportError:
+        uvicorn = None
+    if uvicorn is not None:
+        uvicorn.run(asgi_app, host=host, port=port)
+        return
+    print(f"Serveur asynchrone intégré à l'écoute sur http://{host}:{port}/")
+    asyncio.run(AsyncHttpServer(asgi_app, host, port).serve())
+
+
+# #################################################################
+# 3. OUTILS D'ADMINISTRATION (LIGNE DE COMMANDE)
+# #################################################################
+
+def import_json_to_sqlite(source, destination):
+    """Importe un fichier data.json (utilisateurs, articles, boutique et compteurs) dans une base SQLite."""
+    with open(source, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    apply_migrations(data)
+    SQLiteStorage(destination).write_all(data)
+    print(f"✅ {len(data['users'])} utilisateurs, {len(data['articles'])} articles et "
+          f"{len(data['shop_items'])} articles de boutique importés dans {destination}.")
+
+def export_sqlite_to_json(source, destination):
+    """Exporte une base SQLite vers un fichier au format data.json."""
+    data = SQLiteStorage(source).read_all()
+    with open(destination, 'w') as f:
+        json.dump(data, f, indent=2)
+    print(f"✅ Base {source} exportée dans {destination}.")
+
+def _open_lines(path, mode='r'):
+    """Ouvre un fichier JSON Lines en texte, compressé en gzip si son nom contient '.gz'."""
+    if '.gz' in os.path.basename(path):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+class _BackupWriter:
+    """Fichier JSON Lines d'une collection, écrit sous un nom .part puis renommé une fois complet."""
+
+    def __init__(self, directory, collection, compress):
+        self.path = os.path.join(directory, f"{collection}.jsonl{'.gz' if compress else ''}")
+        self.file = _open_lines(self.path + '.part', 'w')
+        self.digest = hashlib.sha256()
+        self.records = 0
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        self.digest.update(line.encode('utf-8'))
+        self.file.write(line)
+        self.records += 1
+
+    def close(self):
+        self.file.close()
+        _fsync_path(self.path + '.part')
+        os.replace(self.path + '.part', self.path)
+        return {'file': os.path.basename(self.path), 'records': self.records, 'sha256': self.digest.hexdigest()}
+
+def backup_data(destination, compress=False, resume=False, storage=None):
+    """Sauvegarde les données dans un dossier, en JSON Lines (un fichier par collection), sans les charger.
+
+    Les enregistrements sont lus au fil de l'eau sur le support (stream()) : la
+    mémoire utilisée ne dépend pas de la taille des données. Chaque collection
+    terminée est notée dans progress.json ; avec resume=True, un export interrompu
+    reprend à la première collection incomplète si les données n'ont pas changé
+    entre-temps. manifest.json (compteurs, nombre d'enregistrements et empreinte
+    SHA-256 de chaque fichier) est écrit en dernier.
+    """
+    storage = storage or _create_storage()
+    signature = json.loads(json.dumps(storage.signature()))
+    os.makedirs(destination, exist_ok=True)
+    progress_path = os.path.join(destination, 'progress.json')
+    manifest_path = os.path.join(destination, 'manifest.json')
+    progress = None
+    if resume and os.path.exists(progress_path):
+        with open(progress_path, 'r', encoding='utf-8') as f:
+            progress = json.load(f)
+        if progress['signature'] != signature or progress['compress'] != compress:
+            print("⚠️ Les données ont changé depuis l'export interrompu : export complet.")
+            progress = None
+    if progress is None:
+        progress = {'signature': signature, 'compress': compress, 'collections': {}}
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    done = progress['collections']
+    start = time.perf_counter()
+    meta, writer, current = {}, None, None
+    for entry in storage.stream():
+        if entry['op'] == 'set':
+            meta[entry['k']] = entry['v']
+            continue
+        if entry['c'] != current:
+            if writer is not None:
+                done[current] = writer.close()
+                _write_json_file(progress_path, progress)
+            current = entry['c']
+            writer = _BackupWriter(destination, current, compress) if current not in done else None
+        if writer is not None:
+            writer.write(entry['r'])
+    if writer is not None:
+        done[current] = writer.close()
+    for collection in COLLECTIONS:
+        if collection not in done:
+            done[collection] = _BackupWriter(destination, collection, compress).close()
+    _write_json_file(manifest_path, {'format': 1, 'created': datetime.now().strftime(DATE_FORMAT), 'mode': STORAGE_MODE,
+                                     'meta': meta, 'collections': done})
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
+    total = sum(info['records'] for info in done.values())
+    print(f"✅ Sauvegarde de {total} enregistrements dans {destination} en {time.perf_counter() - start:.1f}s.")
+    return True
+
+class _JsonRestoreTarget:
+    """Restauration vers DATA_FILE : le fichier est écrit au fil de l'eau sous un nom temporaire."""
+
+    def __init__(self):
+        self.path = DATA_FILE + '.restauration'
+
+    def open(self, offset):
+        if offset is None:
+            self.file = open(self.path, 'wb')
+            self.file.write(b'{')
+        else:
+            # Reprise : tout ce qui suit le dernier point de reprise est réécrit
+            self.file = open(self.path, 'r+b')
+            self.file.truncate(offset)
+            self.file.seek(offset)
+
+    def begin(self, index, collection):
+        self.file.write(f"{',' if index else ''}\n{json.dumps(collection)}: [".encode('utf-8'))
+
+    def write(self, collection, records, written):
+        self.file.write(''.join(f"{',' if written or i else ''}\n{json.dumps(record)}"
+                                for i, record in enumerate(records)).encode('utf-8'))
+
+    def end(self):
+        self.file.write(b'\n]')
+
+    def checkpoint(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def finish(self, meta):
+        self.file.write(''.join(f",\n{json.dumps(key)}: {json.dumps(value)}" for key, value in meta.items()).encode('utf-8'))
+        self.file.write(b'\n}\n')
+        self.checkpoint()
+        self.file.close()
+        # Le journal des anciennes données ne doit pas être rejoué sur les données restaurées
+        if os.path.exists(JOURNAL_FILE):
+            os.remove(JOURNAL_FILE)
+        os.replace(self.path, DATA_FILE)
+
+class _SQLiteRestoreTarget:
+    """Restauration vers SQLITE_FILE, par lots d'INSERT dans une base temporaire."""
+
+    def __init__(self):
+        self.path = SQLITE_FILE + '.restauration'
+        self.storage = SQLiteStorage(self.path)
+
+    def open(self, offset):
+        if offset is None:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+
+    def begin(self, index, collection):
+        pass
+
+    def write(self, collection, records, written):
+        self.storage._transaction(lambda conn: conn.executemany(
+            self.storage._upsert_sql(collection), (self.storage._to_row(SQLITE_COLUMNS[collection], r) for r in records)))
+
+    def end(self):
+        pass
+
+    def checkpoint(self):
+        return 0
+
+    def finish(self, meta):
+        self.storage._transaction(lambda conn: conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", ((key, json.dumps(value)) for key, value in meta.items())))
+        conn = self.storage._connect()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(SQLITE_FILE + suffix):
+                os.remove(SQLITE_FILE + suffix)
+        os.replace(self.path, SQLITE_FILE)
+
+class _ShardRestoreTarget:
+    """Restauration vers SHARD_DIR : chaque fichier est écrit au fil de l'eau dans un dossier temporaire."""
+
+    def __init__(self):
+        self.path = SHARD_DIR + '.restauration'
+        self.storage = ShardedStorage()
+        self.files = {}
+
+    def open(self, offset):
+        if offset is None:
+            if os.path.isdir(self.path):
+                shutil.rmtree(self.path)
+            os.makedirs(self.path)
+            return
+        # Reprise : les fichiers de la collection en cours sont tronqués au dernier point de reprise
+        for name, position in offset.items():
+            self.files[name] = open(os.path.join(self.path, name + '.json'), 'r+b')
+            self.files[name].truncate(position)
+            self.files[name].seek(position)
+
+    def begin(self, index, collection):
+        for name in self.storage.shard_names(collection):
+            self.files[name] = open(os.path.join(self.path, name + '.json'), 'wb')
+            self.files[name].write(b'[')
+
+    def write(self, collection, records, written):
+        for record in records:
+            f = self.files[self.storage.shard_of(collection, record['id'])]
+            f.write(f"{',' if f.tell() > 1 else ''}\n{json.dumps(record, ensure_ascii=False)}".encode('utf-8'))
+
+    def end(self):
+        for f in self.files.values():
+            f.write(b'\n]')
+        self.checkpoint()
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+    def checkpoint(self):
+        for f in self.files.values():
+            f.flush()
+            os.fsync(f.fileno())
+        return {name: f.tell() for name, f in self.files.items()}
+
+    def finish(self, meta):
+        _write_json_file(os.path.join(self.path, ShardedStorage.COUNTERS + '.json'), meta)
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        names = [entry[:-5] for entry in os.listdir(self.path) if entry.endswith('.json')]
+        self.storage._commit([(os.path.join(self.path, name + '.json'), self.storage._path(name)) for name in names],
+                             [self.storage._path(name) for name in self.storage._present() - set(names)])
+        shutil.rmtree(self.path)
+
+def restore_data(source, resume=False):
+    """Restaure une sauvegarde de backup_data dans le stockage configuré, en mémoire constante.
+
+    Chaque ligne est validée (Record.validate) : les enregistrements invalides sont
+    signalés et ignorés. Les autres sont écrits par lots de BACKUP_BATCH_SIZE dans un
+    fichier temporaire, avec un point de reprise après chaque lot ; le nombre de lignes
+    et l'empreinte de chaque fichier sont comparés au manifeste. Les données en place
+    ne sont remplacées qu'à la fin. À lancer serveur arrêté.
+    """
+    manifest_path = os.path.join(source, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        print(f"❌ {manifest_path} absent : sauvegarde incomplète ou dossier invalide.")
+        return False
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    missing = [collection for collection in COLLECTIONS if collection not in manifest['collections']]
+    if missing:
+        print(f"❌ Collections absentes du manifeste : {', '.join(missing)}.")
+        return False
+    target = {'sqlite': _SQLiteRestoreTarget, 'shards': _ShardRestoreTarget}.get(STORAGE_MODE, _JsonRestoreTarget)()
+    progress_path = target.path + '.progress'
+    state = None
+    if resume and os.path.exists(progress_path):
+        with open(progress_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state['source'] != os.path.abspath(source) or state['created'] != manifest['created']:
+            print("⚠️ Le point de reprise concerne une autre sauvegarde : restauration complète.")
+            state = None
+        else:
+            print(f"Reprise : {COLLECTIONS[min(state['collection'], len(COLLECTIONS) - 1)]}, ligne {state['lines'] + 1}.")
+    if state is None:
+        state = {'source': os.path.abspath(source), 'created': manifest['created'], 'collection': 0, 'lines': 0,
+                 'written': 0, 'rejected': 0, 'max_ids': {}, 'offset': None}
+    target.open(state['offset'])
+
+    def checkpoint():
+        state['offset'] = target.checkpoint()
+        _write_json_file(progress_path, state)
+
+    start = time.perf_counter()
+    for index, collection in enumerate(COLLECTIONS):
+        if index < state['collection']:
+            continue
+        info = manifest['collections'][collection]
+        if state['lines'] == 0:
+            target.begin(index, collection)
+        record_type = RECORD_TYPES[collection]
+        digest, lines, batch = hashlib.sha256(), 0, []
+        with _open_lines(os.path.join(source, info['file'])) as f:
+            for line in f:
+                digest.update(line.encode('utf-8'))
+                lines += 1
+                if lines <= state['lines']:
+                    continue
+                try:
+                    values = json.loads(line)
+                except json.JSONDecodeError:
+                    values = None
+                if collection == 'users' and isinstance(values, dict):
+                    _upgrade_legacy_user(values)
+                error = record_type.validate(values) if values is not None else "JSON illisible"
+                if error:
+                    state['rejected'] += 1
+                    print(f"❌ {collection}, ligne {lines} : {error}, enregistrement ignoré.")
+                    continue
+                batch.append(values)
+                state['max_ids'][collection] = max(state['max_ids'].get(collection, 0), values['id'])
+                if len(batch) >= BACKUP_BATCH_SIZE:
+                    target.write(collection, batch, state['written'])
+                    state['written'] += len(batch)
+                    state['lines'], batch = lines, []
+                    checkpoint()
+        if batch:
+            target.write(collection, batch, state['written'])
+        if lines != info['records'] or digest.hexdigest() != info['sha256']:
+            problem = f"{lines} lignes au lieu de {info['records']}" if lines != info['records'] else "empreinte SHA-256 différente"
+            print(f"❌ {info['file']} ne correspond pas au manifeste ({problem}) : sauvegarde corrompue, données en place inchangées.")
+            if os.path.exists(progress_path):
+                os.remove(progress_path)
+            return False
+        target.end()
+        state.update(collection=index + 1, lines=0, written=0)
+        checkpoint()
+    meta = dict(manifest['meta'])
+    for collection, counter in ID_COUNTERS.items():
+        meta[counter] = max(meta.get(counter, 0), state['max_ids'].get(collection, 0))
+    target.finish(meta)
+    os.remove(progress_path)
+    total = sum(info['records'] for info in manifest['collections'].values())
+    print(f"✅ {total - state['rejected']} enregistrements restaurés depuis {source} en {time.perf_counter() - start:.1f}s.")
+    if state['rejected']:
+        print(f"❌ {state['rejected']} enregistrements invalides ont été ignorés (voir ci-dessus).")
+        return False
+    return True
+
+def bulk_gemmes_command(path, dry_run=False):
+    """Applique un fichier d'ajustements de gemmes (CSV ou JSON) et affiche le rapport ligne par ligne."""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        rows = read_gem_adjustments(f.read(), path)
+    applied, report = apply_gem_adjustments(rows, dry_run)
+    for line in report:
+        if line['erreur']:
+            print(f"❌ Ligne {line['ligne']} ({line['utilisateur']}) : {line['erreur']}")
+        elif applied:
+            print(f"✅ Ligne {line['ligne']} : {line['pseudo']} {line['avant']} → {line['apres']}")
+    if applied:
+        print(f"💎 {len(report)} ajustements appliqués en une seule écriture.")
+    elif dry_run and not any(line['erreur'] for line in report):
+        print(f"✅ Simulation : les {len(report)} lignes sont valides.")
+    else:
+        print("❌ Lot refusé, aucun solde n'a été modifié.")
+    return applied
+
+def write_assets(destination):
+    """Écrit les fichiers statiques (et leurs variantes .gz) pour un serveur frontal (nginx...)."""
+    os.makedirs(destination, exist_ok=True)
+    for asset in ASSETS.values():
+        with open(os.path.join(destination, asset['filename']), 'wb') as f:
+            f.write(asset['body'])
+        with open(os.path.join(destination, asset['filename'] + '.gz'), 'wb') as f:
+            f.write(asset['gzip'])
+        print(f"✅ {asset['filename']} ({len(asset['body'])} octets, {len(asset['gzip'])} en gzip)")
+
+@contextmanager
+def _temporary_store(mode):
+    """Redirige le stockage (fichiers et STORE) vers un répertoire temporaire le temps d'un test."""
+    global DATA_FILE, JOURNAL_FILE, SQLITE_FILE, SHARD_DIR, STORAGE_MODE, STORE
+    saved = (DATA_FILE, JOURNAL_FILE, SQLITE_FILE, SHARD_DIR, STORAGE_MODE, STORE)
+    with tempfile.TemporaryDirectory() as tmp:
+        DATA_FILE = os.path.join(tmp, 'data.json')
+        JOURNAL_FILE = DATA_FILE + '.wal'
+        SQLITE_FILE = os.path.join(tmp, 'data.sqlite3')
+        SHARD_DIR = os.path.join(tmp, 'data')
+        STORAGE_MODE = mode
+        STORE = DataStore()
+        PAGE_CACHE.clear()
+        try:
+            yield tmp
+        finally:
+            DATA_FILE, JOURNAL_FILE, SQLITE_FILE, SHARD_DIR, STORAGE_MODE, STORE = saved
+
+def _test_user(user_id, gemmes=0, password_hash="", grade="Membre", status="Actif", suspension_reason=None,
+               suspension_end_date=None):
+    """Utilisateur des jeux de test, sous forme stockée : pseudo joueur{id}, email joueur{id}@example.com."""
+    return {
+        "id": user_id, "pseudo": f"joueur{user_id}", "email": f"joueur{user_id}@example.com",
+        "password_hash": password_hash, "grade": grade, "status": status,
+        "suspension_reason": suspension_reason, "suspension_end_date": suspension_end_date, "gemmes": gemmes
+    }
+
+def _data_with_players(users, gemmes=0, password_hash=""):
+    """Données initiales plus `users` joueurs actifs (ids 2 à users + 1) ayant chacun `gemmes` gemmes."""
+    data = create_initial_data()
+    data['users'].extend(_test_user(user_id, gemmes, password_hash) for user_id in range(2, users + 2))
+    data['last_user_id'] = users + 1
+    return data
+
+def stress_test_gemmes(users=50, purchases=5000, threads=32, mode='json'):
+    """Lance des achats et crédits concurrents puis vérifie que chaque solde final est exact."""
+    price = 10
+    with _temporary_store(mode):
+        data = _data_with_players(users, gemmes=price * 20)
+        save_data(data)
+        initial = {u.id: u.gemmes for u in data['users']}
+
+        # Un crédit pour quatre achats : une partie des achats doit échouer faute de solde
+        operations = [(2 + i % users, 'credit' if i % 5 == 0 else 'debit') for i in range(purchases)]
+        successes = {user_id: 0 for user_id in initial}
+        credits = {user_id: 0 for user_id in initial}
+        counters_lock = threading.Lock()
+
+        def run(operation):
+            user_id, kind = operation
+            if kind == 'credit':
+                credit_gemmes(user_id, price)
+                with counters_lock:
+                    credits[user_id] += 1
+            else:
+                success, balance = debit_gemmes(user_id, price)
+                if balance < 0:
+                    raise AssertionError(f"Solde négatif pour {user_id}")
+                if success:
+                    with counters_lock:
+                        successes[user_id] += 1
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(run, operations))
+        elapsed = time.perf_counter() - start
+
+        # Relecture depuis le support pour vérifier aussi ce qui a été persisté
+        STORE.invalidate()
+        errors = 0
+        for user_id, balance in initial.items():
+            expected = balance + price * (credits[user_id] - successes[user_id])
+            actual = get_user_by_id(user_id).gemmes
+            if actual != expected:
+                errors += 1
+                print(f"❌ Utilisateur {user_id} : solde {actual}, attendu {expected}.")
+
+    print(f"{purchases} opérations sur {users} joueurs avec {threads} threads ({mode}) en {elapsed:.2f}s, "
+          f"{sum(successes.values())} achats réussis.")
+    if errors:
+        print(f"❌ {errors} soldes incorrects.")
+        return False
+    print("✅ Tous les soldes sont exacts.")
+    return True
+
+def check_deliveries(purchases=200, threads=8, failure_rate=0.2, mode='journal', timeout=60):
+    """Achats concurrents livrés à un faux serveur RCON qui coupe une partie des connexions.
+
+    Vérifie que chaque achat a débité le solde, que chaque livraison est arrivée au
+    serveur de jeu et que l'état persisté est cohérent.
+    """
+    global DELIVERY_RETRY_BASE
+    saved_retry = DELIVERY_RETRY_BASE
+    DELIVERY_RETRY_BASE = 0.2
+    server = FakeRconServer(failure_rate=failure_rate, seed=1).start()
+    workers = DeliveryWorkers(create_delivery_transport(server.url))
+    try:
+        with _temporary_store(mode):
+            users = max(purchases // 10, 1)
+            save_data(_data_with_players(users, gemmes=1000))
+            item = get_shop_item_by_id(1)
+            workers.start()
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                outcomes = list(pool.map(lambda i: STORE.purchase(2 + i % users, item), range(purchases)))
+            response_time = time.perf_counter() - start
+            while STORE.deliveries_by_status.get('En attente') and time.perf_counter() - start < timeout:
+                time.sleep(0.05)
+            elapsed = time.perf_counter() - start
+            workers.stop()
+
+            STORE.invalidate()
+            errors = []
+            expected = {f"{d.id}" for _, _, d in outcomes if d}
+            received = {command.rsplit(' ', 1)[-1] for command in server.commands}
+            if expected - received:
+                errors.append(f"{len(expected - received)} livraisons jamais reçues par le serveur de jeu")
+            statuses = {status: len(ids) for status, ids in STORE.deliveries_by_status.items()}
+            if statuses != {'Livrée': len(expected)}:
+                errors.append(f"statuts persistés inattendus : {statuses}")
+            spent = sum(1000 - get_user_by_id(user_id).gemmes for user_id in range(2, users + 2))
+            if spent != item.prix_gemmes * len(expected):
+                errors.append(f"{spent} gemmes débitées pour {len(expected)} achats")
+    finally:
+        workers.stop()
+        server.stop()
+        DELIVERY_RETRY_BASE = saved_retry
+
+    print(f"{purchases} achats ({mode}) enregistrés en {response_time:.2f}s, tous livrés en {elapsed:.2f}s "
+          f"malgré {failure_rate:.0%} de connexions coupées ({len(server.commands) - len(received)} doublons reçus).")
+    for error in errors:
+        print(f"❌ {error}")
+    if not errors:
+        print("✅ Chaque achat a été débité une fois et livré en jeu.")
+    return not errors
+
+def _multiprocess_worker(number, operations, users, results):
+    """Opérations d'un processus de stress_test_multiprocess : crédits, débits, modifications admin et articles."""
+    rng = random.Random(number)
+    credited, debited, articles = defaultdict(int), defaultdict(int), []
+    for _ in range(operations):
+        user_id = rng.randint(2, users + 1)
+        roll = rng.random()
+        if roll < 0.35:
+            credit_gemmes(user_id, 7)
+            credited[user_id] += 7
+        elif roll < 0.7:
+            success, _ = debit_gemmes(user_id, 5)
+            if success:
+                debited[user_id] += 5
+        elif roll < 0.85:
+            # Comme une page admin : l'utilisateur est lu, modifié sur place puis enregistré
+            user = get_user_by_id(user_id)
+            user.suspension_reason = f"Note du processus {number}"
+            update_record('users', user)
+        else:
+            article = insert_record('articles', Article(titre=f"Processus {number}", contenu="Test multi-processus.",
+                                                        auteur_id=1, date_publication=current_time()), 'last_article_id')
+            articles.append(article.id)
+    results.put((dict(credited), dict(debited), articles))
+
+def stress_test_multiprocess(workers=4, operations=500, users=20, mode='journal', lock=True):
+    """Lance `workers` processus qui modifient les mêmes données puis vérifie qu'aucune écriture n'est perdue.
+
+    Avec lock=False (MULTIPROCESS désactivé), montre les écritures perdues sans coordination.
+    """
+    global MULTIPROCESS
+    saved = MULTIPROCESS
+    MULTIPROCESS = lock
+    try:
+        with _temporary_store(mode):
+            save_data(_data_with_players(users, gemmes=100))
+
+            context = multiprocessing.get_context('fork')
+            results = context.Queue()
+            processes = [context.Process(target=_multiprocess_worker, args=(number, operations, users, results))
+                         for number in range(workers)]
+            start = time.perf_counter()
+            for process in processes:
+                process.start()
+            outcomes = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - start
+
+            STORE.invalidate()
+            data = load_data()
+            errors = []
+            for user_id in range(2, users + 2):
+                expected = 100 + sum(credited.get(user_id, 0) - debited.get(user_id, 0) for credited, debited, _ in outcomes)
+                actual = get_user_by_id(user_id).gemmes
+                if actual != expected:
+                    errors.append(f"utilisateur {user_id} : solde {actual}, attendu {expected}")
+            inserted = [article_id for _, _, articles in outcomes for article_id in articles]
+            if len(set(inserted)) != len(inserted):
+                errors.append(f"{len(inserted) - len(set(inserted))} ids d'articles attribués deux fois")
+            missing = set(inserted) - {article.id for article in data['articles']}
+            if missing:
+                errors.append(f"{len(missing)} articles perdus")
+    finally:
+        MULTIPROCESS = saved
+
+    print(f"{workers} processus x {operations} opérations ({mode}, verrou {'activé' if lock else 'désactivé'}) en {elapsed:.2f}s.")
+    for error in errors[:10]:
+        print(f"❌ {error}")
+    if errors:
+        print(f"❌ {len(errors)} incohérences : des écritures ont été perdues.")
+        return False
+    print("✅ Aucune écriture perdue : soldes et articles exacts.")
+    return True
+
+def _synthetic_user(rng, user_id, now, password_hash):
+    roll = rng.random()
+    status, reason, end_date = 'Actif', None, None
+    if roll < 0.01:
+        status, reason = 'Banni', 'Triche'
+    elif roll < 0.03:
+        status, reason = 'Suspendu', 'Langage inapproprié'
+        end_date = (now + timedelta(days=rng.randint(-10, 30))).strftime(DATE_FORMAT)
+    grade = 'Administrateur' if rng.random() < 0.001 else 'Membre'
+    return _test_user(user_id, rng.randint(0, 5000), password_hash, grade, status, reason, end_date)
+
+def generate_synthetic_data(users=1000, articles=10000, shop_items=500, seed=42):
+    """Construit un jeu de données réaliste de grande taille (même mot de passe 'motdepasse' pour tous les joueurs)."""
+    rng = random.Random(seed)
+    data = create_initial_data()
+    now = datetime.now()
+    password_hash = generate_password_hash('motdepasse', PASSWORD_HASH_METHOD)
+    for user_id in range(2, users + 1):
+        data['users'].append(_synthetic_user(rng, user_id, now, password_hash))
+    admin_ids = [u['id'] for u in data['users'] if u['grade'] == 'Administrateur']
+    for article_id in range(2, articles + 1):
+        data['articles'].append({
+            "id": article_id, "titre": f"Actualité n°{article_id}",
+            "contenu": " ".join(rng.choice(("Événement", "mise à jour", "serveur", "joueurs", "récompenses", "boutique", "guilde"))
+                                for _ in range(rng.randint(20, 120))),
+            "auteur_id": rng.choice(admin_ids),
+            "date_publication": (now - timedelta(minutes=rng.randint(0, 3 * 365 * 24 * 60))).strftime(DATE_FORMAT)
+        })
+    for item_id in range(2, shop_items + 1):
+        data['shop_items'].append({
+            "id": item_id, "nom": f"Objet n°{item_id}", "description": "Un objet de la boutique généré pour les tests.",
+            "prix_gemmes": rng.randint(1, 500), "date_ajout": now.strftime(DATE_FORMAT)
+        })
+    data['last_user_id'], data['last_article_id'], data['last_shop_item_id'] = users, max(articles, 1), max(shop_items, 1)
+    return data
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(math.ceil(percent / 100 * len(sorted_values)) - 1, 0)]
+
+def _bench_scenarios(data):
+    """Scénarios du banc d'essai : nom -> (session du client, fonction qui envoie la requête)."""
+    players = [u.id for u in data['users'] if u.status == 'Actif' and u.grade == 'Membre'] or [1]
+    item_ids = [item.id for item in data['shop_items']]
+    # Session déjà ouverte : absente de SESSIONS, elle est réadmise à la première requête (version 0 : données générées)
+    signed_in = lambda user_id, grade: {'loggedin': True, 'id': user_id, 'grade': grade, 'sid': secrets.token_urlsafe(24), 'version': 0}
+    admin = lambda i: signed_in(1, 'Administrateur')
+    player = lambda i: signed_in(players[i % len(players)], 'Membre')
+    return {
+        'GET /accueil': (None, lambda c, i: c.get('/accueil')),
+        'GET /accueil?page=5': (None, lambda c, i: c.get('/accueil?page=5')),
+        'GET /wiki': (None, lambda c, i: c.get('/wiki')),
+        'GET /shop (anonyme)': (None, lambda c, i: c.get('/shop')),
+        'GET /shop (connecté)': (player, lambda c, i: c.get('/shop')),
+        'POST /connexion': (None, lambda c, i: c.post('/connexion', data={
+            'pseudo': f"joueur{players[i % len(players)]}", 'mot_de_passe': 'motdepasse'})),
+        'POST /inscription': (None, lambda c, i: c.post('/inscription', data={
+            'pseudo': f"bench{i}_{time.monotonic_ns()}", 'email': f"bench{i}_{time.monotonic_ns()}@example.com",
+            'mot_de_passe': 'motdepasse'})),
+        'GET /shop/acheter/<id>': (player, lambda c, i: c.get(f"/shop/acheter/{item_ids[i % len(item_ids)]}")),
+        'GET /admin/gestion_utilisateurs': (admin, lambda c, i: c.get('/admin/gestion_utilisateurs')),
+        'GET /admin/gerer_comptes_admin': (admin, lambda c, i: c.get('/admin/gerer_comptes_admin')),
+        'GET /admin/gestion_gemmes': (admin, lambda c, i: c.get('/admin/gestion_gemmes')),
+    }
+
+def run_benchmark(users=1000, articles=10000, shop_items=500, requests=200, concurrency=8, mode=None, routes=None):
+    """Génère un jeu de données synthétique puis mesure débit et latences (p50/p95/p99) de chaque route."""
+    mode = mode or STORAGE_MODE
+    print(f"Génération : {users} utilisateurs, {articles} articles, {shop_items} objets de boutique...")
+    data = generate_synthetic_data(users, articles, shop_items)
+    results = []
+    with _temporary_store(mode):
+        save_data(data)
+        scenarios = _bench_scenarios(data)
+        for name, (session_for, send) in scenarios.items():
+            if routes and not any(route in name for route in routes):
+                continue
+
+            def timed(i):
+                client = app.test_client()
+                if session_for:
+                    with client.session_transaction() as sess:
+                        sess.update(session_for(i))
+                start = time.perf_counter()
+                response = send(client, i)
+                return time.perf_counter() - start, response.status_code < 500
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                samples = list(pool.map(timed, range(requests)))
+            elapsed = time.perf_counter() - start
+            latencies = sorted(latency * 1000 for latency, _ in samples)
+            errors = sum(1 for _, ok in samples if not ok)
+            results.append((name, requests / elapsed, _percentile(latencies, 50), _percentile(latencies, 95),
+                            _percentile(latencies, 99), errors))
+            print(f"{name:<34} {requests / elapsed:>9.1f} req/s  p50 {results[-1][2]:>8.2f} ms  "
+                  f"p95 {results[-1][3]:>8.2f} ms  p99 {results[-1][4]:>8.2f} ms  {errors} erreurs")
+    return results
+
+async def _slow_request(port, method, path, body, delay):
+    """Envoie une requête ligne par ligne (client lent) et renvoie (latence après envoi, code HTTP)."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        lines = [f"{method} {path} HTTP/1.1", "Host: 127.0.0.1", "Connection: close"]
+        if body:
+            lines += ["Content-Type: application/x-www-form-urlencoded", f"Content-Length: {len(body)}"]
+        for line in lines:
+            writer.write(line.encode('latin-1') + b'\r\n')
+            await writer.drain()
+            await asyncio.sleep(delay)
+        writer.write(b'\r\n' + body)
+        await writer.drain()
+        sent = time.perf_counter()
+        response = await reader.read()
+        return time.perf_counter() - sent, int(response.split(b' ', 2)[1]) if response else 0
+    finally:
+        writer.close()
+
+def benchmark_async(connections=200, requests=1000, delay=0.02, mode='journal', logins=0.05):
+    """Compare le serveur WSGI à threads (comme app.run) et le mode asynchrone face à des clients lents.
+
+    `connections` clients envoient en parallèle `requests` requêtes au total, chacune
+    ligne par ligne avec `delay` secondes entre deux lignes ; une part `logins` sont
+    des connexions (hachage du mot de passe), le reste des pages publiques.
+    """
+    global SLOW_REQUEST_THRESHOLD
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args):
+            pass
+
+    data = generate_synthetic_data(1000, 2000, 100)
+    paths = [('GET', '/', b''), ('GET', '/shop', b''), ('GET', '/recherche?q=serveur', b''), ('GET', '/wiki', b'')]
+    login = ('POST', '/connexion', b'pseudo=joueur2&mot_de_passe=motdepasse')
+    requests_list = [login if random.Random(i).random() < logins else paths[i % len(paths)] for i in range(requests)]
+    results = []
+    saved_threshold, SLOW_REQUEST_THRESHOLD = SLOW_REQUEST_THRESHOLD, float('inf')
+    with _temporary_store(mode):
+        save_data(data)
+        for name in ('wsgi', 'async'):
+            if name == 'wsgi':
+                server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+                port = server.server_port
+                thread = threading.Thread(target=server.serve_forever, daemon=True)
+                thread.start()
+                stop = lambda: (server.shutdown(), thread.join())
+            else:
+                server = AsyncHttpServer(AsgiAdapter(app, background_tasks=False), port=0)
+                port = server.start_in_thread()
+                stop = server.stop
+
+            peak_threads = threading.active_count()
+
+            async def run_all():
+                nonlocal peak_threads
+                semaphore = asyncio.Semaphore(connections)
+
+                async def one(request):
+                    async with semaphore:
+                        try:
+                            return await _slow_request(port, *request, delay)
+                        except OSError:
+                            return None, 0
+                tasks = asyncio.gather(*(one(request) for request in requests_list))
+                while not tasks.done():
+                    peak_threads = max(peak_threads, threading.active_count())
+                    await asyncio.sleep(0.05)
+                return tasks.result()
+
+            start = time.perf_counter()
+            samples = asyncio.run(run_all())
+            elapsed = time.perf_counter() - start
+            stop()
+            latencies = sorted(latency * 1000 for latency, status in samples if latency is not None)
+            errors = sum(1 for _, status in samples if not 200 <= status < 400)
+            results.append((name, requests / elapsed, _percentile(latencies, 50), _percentile(latencies, 95),
+                            _percentile(latencies, 99), errors))
+            print(f"{name:<6} {requests / elapsed:>8.1f} req/s  p50 {results[-1][2]:>8.2f} ms  p95 {results[-1][3]:>8.2f} ms  "
+                  f"p99 {results[-1][4]:>8.2f} ms  {errors} erreurs  ({connections} clients lents, jusqu'à {peak_threads} threads)")
+    SLOW_REQUEST_THRESHOLD = saved_threshold
+    return results
+
+def benchmark_password_pool(pool_sizes=(1, 2, 4, 8), logins=200, concurrency=32):
+    """Mesure le débit de connexions sur /connexion selon la taille du pool de hachage."""
+    global PASSWORDS
+    saved = PASSWORDS
+    with _temporary_store('json'):
+        save_data(_data_with_players(100, password_hash=generate_password_hash('motdepasse', PASSWORD_HASH_METHOD)))
+
+        def login(i):
+            client = app.test_client()
+            response = client.post('/connexion', data={'pseudo': f"joueur{2 + i % 100}", 'mot_de_passe': 'motdepasse'})
+            # Un échec redirige vers /connexion, un succès vers l'accueil
+            return response.status_code == 302 and 'connexion' not in response.headers['Location']
+
+        print(f"{logins} connexions, {concurrency} clients simultanés, méthode {PASSWORD_HASH_METHOD}")
+        try:
+            for workers in pool_sizes:
+                PASSWORDS = PasswordHasher(workers=workers)
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    results = list(pool.map(login, range(logins)))
+                elapsed = time.perf_counter() - start
+                PASSWORDS.shutdown()
+                print(f"pool de {workers:>2} threads : {logins / elapsed:8.1f} connexions/s "
+                      f"({results.count(False)} échecs)")
+        finally:
+            PASSWORDS = saved
+
+def benchmark_memory(users=1000000, seed=42):
+    """Compare la mémoire occupée par `users` utilisateurs sous forme de dict et d'enregistrements User."""
+    now = datetime.now()
+    password_hash = generate_password_hash('motdepasse', PASSWORD_HASH_METHOD)
+    sizes = {}
+    print(f"{users} utilisateurs synthétiques (hachages distincts, ~3% de suspensions datées) :")
+    for label, build in (('dict', dict), ('User', lambda values: User(**values))):
+        rng = random.Random(seed)
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        # Chaque utilisateur a son propre hachage, comme en production
+        records = [build(_synthetic_user(rng, user_id, now, f"{password_hash[:-8]}{user_id:08x}"))
+                   for user_id in range(1, users + 1)]
+        elapsed = time.perf_counter() - start
+        sizes[label] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del records
+        print(f"{label:<5} {sizes[label] / 2 ** 20:9.1f} Mio  {sizes[label] / users:6.0f} octets/utilisateur  "
+              f"(construits en {elapsed:.1f}s)")
+    print(f"Gain des enregistrements typés : {(sizes['dict'] - sizes['User']) / 2 ** 20:.1f} Mio "
+          f"({1 - sizes['User'] / sizes['dict']:.0%}).")
+    return sizes
+
+
 # #################################################################
-# 3. LANCEMENT
+# 4. LANCEMENT
 # #################################################################
 
 if __name__ == '__main__':
-    load_data() 
+    parser = argparse.ArgumentParser(description="Site HeraCraft (sans commande : lance le serveur de développement).")
+    commands = parser.add_subparsers(dest='command')
+
+    cmd = commands.add_parser('import-json', help="Importe un data.json dans la base SQLite.")
+    cmd.add_argument('source', nargs='?', default=DATA_FILE)
+    cmd.add_argument('--sqlite', default=SQLITE_FILE)
+
+    cmd = commands.add_parser('export-json', help="Exporte la base SQLite au format data.json.")
+    cmd.add_argument('destination')
+    cmd.add_argument('--sqlite', default=SQLITE_FILE)
+
+    cmd = commands.add_parser('backup', help="Sauvegarde les données en JSON Lines (un fichier par collection), en mémoire constante.")
+    cmd.add_argument('destination', help="Dossier de la sauvegarde.")
+    cmd.add_argument('--gzip', action='store_true', help="Compresse chaque fichier.")
+    cmd.add_argument('--reprendre', action='store_true', help="Reprend un export interrompu.")
+    cmd.add_argument('--mode', choices=STORAGE_MODES, default=STORAGE_MODE)
+
+    cmd = commands.add_parser('restore', help="Restaure une sauvegarde (serveur arrêté), en mémoire constante.")
+    cmd.add_argument('source', help="Dossier de la sauvegarde.")
+    cmd.add_argument('--reprendre', action='store_true', help="Reprend une restauration interrompue.")
+    cmd.add_argument('--mode', choices=STORAGE_MODES, default=STORAGE_MODE)
+
+    cmd = commands.add_parser('migrate', help="Migre les données au schéma courant, après une sauvegarde (serveur arrêté).")
+    cmd.add_argument('--mode', choices=STORAGE_MODES, default=STORAGE_MODE)
+
+    cmd = commands.add_parser('bulk-gemmes', help="Crédite/débite des gemmes en masse depuis un CSV ou JSON.")
+    cmd.add_argument('fichier')
+    cmd.add_argument('--dry-run', action='store_true', help="Valide le fichier sans rien appliquer.")
+
+    cmd = commands.add_parser('build-assets', help="Écrit les CSS/JS versionnés et leurs variantes gzip dans un dossier.")
+    cmd.add_argument('destination')
+
+    cmd = commands.add_parser('generate-data', help="Écrit un data.json synthétique de grande taille.")
+    cmd.add_argument('destination')
+    cmd.add_argument('--users', type=int, default=1000)
+    cmd.add_argument('--articles', type=int, default=10000)
+    cmd.add_argument('--shop-items', type=int, default=500)
+
+    cmd = commands.add_parser('bench', help="Banc d'essai de toutes les routes sur des données synthétiques.")
+    cmd.add_argument('--users', type=int, default=1000)
+    cmd.add_argument('--articles', type=int, default=10000)
+    cmd.add_argument('--shop-items', type=int, default=500)
+    cmd.add_argument('--requests', type=int, default=200, help="Requêtes par route.")
+    cmd.add_argument('--concurrency', type=int, default=8)
+    cmd.add_argument('--mode', choices=STORAGE_MODES)
+    cmd.add_argument('--routes', nargs='*', help="Filtre sur le nom des routes (ex. accueil admin).")
+
+    cmd = commands.add_parser('bench-passwords', help="Débit de connexions selon la taille du pool de hachage.")
+    cmd.add_argument('--pool-sizes', default='1,2,4,8')
+    cmd.add_argument('--logins', type=int, default=200)
+    cmd.add_argument('--concurrency', type=int, default=32)
+
+    cmd = commands.add_parser('bench-memory', help="Compare l'empreinte mémoire des utilisateurs en dict et en enregistrements typés.")
+    cmd.add_argument('--users', type=int, default=1000000)
+
+    cmd = commands.add_parser('stress-gemmes', help="Vérifie les soldes après des milliers d'achats concurrents.")
+    cmd.add_argument('--users', type=int, default=50)
+    cmd.add_argument('--purchases', type=int, default=5000)
+    cmd.add_argument('--threads', type=int, default=32)
+    cmd.add_argument('--mode', choices=STORAGE_MODES, default='journal')
+
+    cmd = commands.add_parser('serve-workers', help="Lance plusieurs processus serveurs sur le même port (mode MULTIPROCESS).")
+    cmd.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    cmd.add_argument('--host', default='127.0.0.1')
+    cmd.add_argument('--port', type=int, default=5000)
+
+    cmd = commands.add_parser('stress-multiprocess', help="Vérifie qu'aucune écriture n'est perdue avec plusieurs processus.")
+    cmd.add_argument('--workers', type=int, default=4)
+    cmd.add_argument('--operations', type=int, default=500)
+    cmd.add_argument('--mode', choices=STORAGE_MODES, default='journal')
+    cmd.add_argument('--sans-verrou', action='store_true', help="Désactive MULTIPROCESS pour montrer les écritures perdues.")
+
+    cmd = commands.add_parser('fake-rcon', help="Lance un faux serveur de jeu RCON qui affiche les livraisons reçues.")
+    cmd.add_argument('--port', type=int, default=25575)
+    cmd.add_argument('--password', default='test')
+    cmd.add_argument('--failure-rate', type=float, default=0.0)
+
+    cmd = commands.add_parser('check-deliveries', help="Vérifie la livraison en jeu d'achats concurrents malgré des coupures.")
+    cmd.add_argument('--purchases', type=int, default=200)
+    cmd.add_argument('--threads', type=int, default=8)
+    cmd.add_argument('--failure-rate', type=float, default=0.2)
+    cmd.add_argument('--mode', choices=STORAGE_MODES, default='journal')
+
+    cmd = commands.add_parser('serve-async', help="Lance le serveur en mode asynchrone (ASGI).")
+    cmd.add_argument('--host', default='127.0.0.1')
+    cmd.add_argument('--port', type=int, default=5000)
+
+    cmd = commands.add_parser('bench-async', help="Compare les modes WSGI et asynchrone face à des clients lents.")
+    cmd.add_argument('--connections', type=int, default=200)
+    cmd.add_argument('--requests', type=int, default=1000)
+    cmd.add_argument('--delay', type=float, default=0.02, help="Pause (s) entre deux lignes envoyées par un client.")
+    cmd.add_argument('--logins', type=float, default=0.05, help="Part des requêtes qui sont des connexions.")
+    cmd.add_argument('--mode', choices=STORAGE_MODES, default='journal')
+
+    args = parser.parse_args()
+
+    if args.command == 'import-json':
+        import_json_to_sqlite(args.source, args.sqlite)
+    elif args.command == 'export-json':
+        export_sqlite_to_json(args.sqlite, args.destination)
+    elif args.command == 'backup':
+        STORAGE_MODE = args.mode
+        backup_data(args.destination, args.gzip, args.reprendre)
+    elif args.command == 'restore':
+        STORAGE_MODE = args.mode
+        ok = restore_data(args.source, args.reprendre)
+        raise SystemExit(0 if ok else 1)
+    elif args.command == 'migrate':
+        STORAGE_MODE = args.mode
+        load_data()
+        print(f"✅ Données au schéma version {SCHEMA_VERSION}.")
+    elif args.command == 'bulk-gemmes':
+        ok = bulk_gemmes_command(args.fichier, args.dry_run)
+        raise SystemExit(0 if ok or args.dry_run else 1)
+    elif args.command == 'build-assets':
+        write_assets(args.destination)
+    elif args.command == 'generate-data':
+        with open(args.destination, 'w') as f:
+            json.dump(generate_synthetic_data(args.users, args.articles, args.shop_items), f, indent=2)
+        print(f"✅ Données synthétiques écrites dans {args.destination}.")
+    elif args.command == 'bench':
+        run_benchmark(args.users, args.articles, args.shop_items, args.requests, args.concurrency, args.mode, args.routes)
+    elif args.command == 'bench-passwords':
+        benchmark_password_pool([int(size) for size in args.pool_sizes.split(',')], args.logins, args.concurrency)
+    elif args.command == 'bench-memory':
+        benchmark_memory(args.users)
+    elif args.command == 'stress-gemmes':
+        ok = stress_test_gemmes(args.users, args.purchases, args.threads, args.mode)
+        raise SystemExit(0 if ok else 1)
+    elif args.command == 'serve-async':
+        serve_async(args.host, args.port)
+    elif args.command == 'bench-async':
+        benchmark_async(args.connections, args.requests, args.delay, args.mode, args.logins)
+    elif args.command == 'serve-workers':
+        load_data()
+        serve_workers(args.workers, args.host, args.port)
+    elif args.command == 'stress-multiprocess':
+        ok = stress_test_multiprocess(args.workers, args.operations, mode=args.mode, lock=not args.sans_verrou)
+        raise SystemExit(0 if ok else 1)
+    elif args.command == 'fake-rcon':
+        fake = FakeRconServer(args.password, port=args.port, failure_rate=args.failure_rate)
+        print(f"Faux serveur de jeu à l'écoute : DELIVERY_TRANSPORT = '{fake.url}'")
+        fake.serve_forever()
+    elif args.command == 'check-deliveries':
+        ok = check_deliveries(args.purchases, args.threads, args.failure_rate, args.mode)
+        raise SystemExit(0 if ok else 1)
+    else:
+        load_data() 
+        # Avec le rechargeur du mode debug, seul le processus qui sert les requêtes lance les tâches de fond
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            start_background_tasks()
 
-    app.run(debug=True)
+        app.run(debug=True)
 